@@ -0,0 +1,134 @@
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+
+from cosmos_client import save_chats_to_cosmos
+
+# Write-behind persistence for chat history. /chat enqueues the entry and
+# returns immediately; a background task drains the queue on an interval,
+# groups pending entries per user and inserts them as separate chat_history
+# records in one transactional batch per user (execute_item_batch). Record ids
+# are fixed when an entry is queued and written as upserts, so retrying a
+# write that timed out after committing cannot duplicate the chat.
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "1000"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "2.0"))
+CHAT_WRITE_FLUSH_THRESHOLD = int(os.getenv("CHAT_WRITE_FLUSH_THRESHOLD", "100"))  # flush early at this depth
+CHAT_WRITE_CONCURRENCY = int(os.getenv("CHAT_WRITE_CONCURRENCY", "8"))
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", "2"))
+
+_queue = None
+_wakeup = None
+_flusher = None
+_stopping = False
+stats = {"enqueued": 0, "dropped": 0, "written_entries": 0, "written_batches": 0, "failed_entries": 0, "retried_entries": 0}
+
+def enqueue(user_id, user_role, question, answer):
+    """Queue a chat entry for persistence; returns False if it had to be dropped"""
+    if _queue is None:
+        logging.error("Chat writer not started, dropping chat entry")
+        stats["dropped"] += 1
+        return False
+
+    item = {
+        "user_id": user_id,
+        "user_role": user_role,
+        "entry": {
+            "id": str(uuid.uuid4()),
+            "question": question,
+            "answer": answer,
+            "timestamp": datetime.utcnow().isoformat()
+        },
+        "attempts": 0
+    }
+    try:
+        _queue.put_nowait(item)
+    except asyncio.QueueFull:
+        stats["dropped"] += 1
+        logging.warning(f"Chat write queue full, dropped chat for {user_id}")
+        return False
+
+    stats["enqueued"] += 1
+    if _queue.qsize() >= CHAT_WRITE_FLUSH_THRESHOLD:
+        _wakeup.set()
+    return True
+
+async def _write_user(user_id, user_role, items, semaphore):
+    async with semaphore:
+        saved = await save_chats_to_cosmos(user_id, user_role, [item["entry"] for item in items], upsert=True)
+    if saved:
+        stats["written_entries"] += len(items)
+        stats["written_batches"] += 1
+        return
+
+    lost = 0
+    for item in items:
+        item["attempts"] += 1
+        if item["attempts"] < CHAT_WRITE_MAX_ATTEMPTS:
+            try:
+                _queue.put_nowait(item)
+                stats["retried_entries"] += 1
+                continue
+            except asyncio.QueueFull:
+                pass
+        lost += 1
+    if lost:
+        stats["failed_entries"] += lost
+        logging.error(f"Gave up on {lost} chat entries for {user_id} after {CHAT_WRITE_MAX_ATTEMPTS} attempts")
+
+async def flush():
+    """Write everything currently queued, one batch per user"""
+    pending = {}
+    while not _queue.empty():
+        item = _queue.get_nowait()
+        pending.setdefault((item["user_role"], item["user_id"]), []).append(item)
+    if not pending:
+        return
+
+    semaphore = asyncio.Semaphore(CHAT_WRITE_CONCURRENCY)
+    await asyncio.gather(*(
+        _write_user(user_id, user_role, items, semaphore)
+        for (user_role, user_id), items in pending.items()
+    ))
+    logging.info(f"Flushed chat writes for {len(pending)} users")
+
+async def _flush_loop():
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), CHAT_WRITE_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await flush()
+        except Exception as e:
+            logging.error(f"Chat write flush failed: {str(e)}")
+
+async def start():
+    """Start the background flusher (called once at startup)"""
+    global _queue, _wakeup, _flusher, _stopping
+    if _flusher is not None:
+        return
+    _stopping = False
+    _queue = asyncio.Queue(maxsize=CHAT_WRITE_QUEUE_SIZE)
+    _wakeup = asyncio.Event()
+    _flusher = asyncio.create_task(_flush_loop())
+
+async def stop():
+    """Stop the flusher and write whatever is still queued (called at shutdown)"""
+    global _flusher, _stopping
+    if _flusher is None:
+        return
+    # Let an in-progress flush finish instead of cancelling it mid-write
+    _stopping = True
+    _wakeup.set()
+    await _flusher
+    _flusher = None
+    # Failed writes are re-queued for another attempt; keep flushing until each
+    # entry is written or out of attempts
+    while not _queue.empty():
+        await flush()
+
+def get_stats():
+    return dict(stats, queue_depth=_queue.qsize() if _queue is not None else 0, queue_size=CHAT_WRITE_QUEUE_SIZE)
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+import openai_client
+from cosmos_client import get_container
+
+# Exact-match cache of chat completions keyed on
+# (deployment, final prompt, temperature, max_tokens).
+# Tier 1 is a bounded in-process LRU; tier 2 is an optional Cosmos container
+# shared by all workers, whose items expire through Cosmos TTL.
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "1000"))
+COMPLETION_CACHE_SHARED = os.getenv("COMPLETION_CACHE_SHARED", "").lower()  # "" or "cosmos"
+COMPLETION_CACHE_CONTAINER = os.getenv("COMPLETION_CACHE_CONTAINER", "completion_cache")
+
+# Per-role TTLs in seconds. Parent summaries track changing progress data, so
+# they expire quickly; teacher lesson summaries are stable for much longer.
+ROLE_TTLS = {
+    "student": int(os.getenv("COMPLETION_CACHE_TTL_STUDENT", "3600")),
+    "teacher": int(os.getenv("COMPLETION_CACHE_TTL_TEACHER", "86400")),
+    "parent": int(os.getenv("COMPLETION_CACHE_TTL_PARENT", "600")),
+}
+DEFAULT_TTL = int(os.getenv("COMPLETION_CACHE_TTL_DEFAULT", "600"))
+
+_memory = OrderedDict()  # key -> (expires_at, reply)
+stats = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+
+def cache_key(deployment, prompt, temperature, max_tokens):
+    raw = json.dumps([deployment, prompt, temperature, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def ttl_for_role(role):
+    return ROLE_TTLS.get(role, DEFAULT_TTL)
+
+def _memory_get(key):
+    entry = _memory.get(key)
+    if entry is None:
+        return None
+    expires_at, reply = entry
+    if expires_at < time.time():
+        _memory.pop(key, None)
+        return None
+    _memory.move_to_end(key)
+    return reply
+
+def _memory_put(key, reply, ttl):
+    _memory[key] = (time.time() + ttl, reply)
+    _memory.move_to_end(key)
+    while len(_memory) > COMPLETION_CACHE_MAX_ENTRIES:
+        _memory.popitem(last=False)
+        stats["evictions"] += 1
+
+async def _shared_get(key):
+    container = get_container(COMPLETION_CACHE_CONTAINER)
+    try:
+        item = await container.read_item(item=key, partition_key=key)
+    except Exception:
+        return None
+    # Cosmos TTL deletes lazily, so double-check the expiry ourselves
+    if item.get("expiresAt", 0) < time.time():
+        return None
+    return item.get("reply"), item["expiresAt"] - time.time()
+
+async def _shared_put(key, reply, ttl):
+    container = get_container(COMPLETION_CACHE_CONTAINER)
+    await container.upsert_item({
+        "id": key,
+        "reply": reply,
+        "expiresAt": time.time() + ttl,
+        "ttl": ttl
+    })
+
+async def get(role, key):
+    """Look up a cached reply in memory, then in the shared tier"""
+    reply = _memory_get(key)
+    if reply is not None:
+        stats["memory_hits"] += 1
+        return reply
+
+    if COMPLETION_CACHE_SHARED == "cosmos":
+        try:
+            found = await _shared_get(key)
+        except Exception as e:
+            logging.warning(f"Shared completion cache read failed: {str(e)}")
+            found = None
+        if found:
+            reply, remaining_ttl = found
+            _memory_put(key, reply, min(remaining_ttl, ttl_for_role(role)))
+            stats["shared_hits"] += 1
+            return reply
+
+    stats["misses"] += 1
+    return None
+
+async def put(role, key, reply):
+    ttl = ttl_for_role(role)
+    if ttl <= 0 or not reply:
+        return
+    _memory_put(key, reply, ttl)
+    if COMPLETION_CACHE_SHARED == "cosmos":
+        try:
+            await _shared_put(key, reply, ttl)
+        except Exception as e:
+            logging.warning(f"Shared completion cache write failed: {str(e)}")
+
+async def cached_completion(role, prompt, temperature=0.7, max_tokens=500, bypass=False):
+    """Return (reply, cache_hit), calling Azure OpenAI only on a miss"""
+    if not COMPLETION_CACHE_ENABLED:
+        return await openai_client.complete_chat(prompt, temperature=temperature, max_tokens=max_tokens, role=role), False
+
+    key = cache_key(openai_client.AZURE_OPENAI_DEPLOYMENT, prompt, temperature, max_tokens)
+    if bypass:
+        stats["bypassed"] += 1
+    else:
+        reply = await get(role, key)
+        if reply is not None:
+            return reply, True
+
+    # A bypassed request still refreshes the cache with the new answer
+    reply = await openai_client.complete_chat(prompt, temperature=temperature, max_tokens=max_tokens, role=role)
+    await put(role, key, reply)
+    return reply, False
+
+def get_stats():
+    hits = stats["memory_hits"] + stats["shared_hits"]
+    lookups = hits + stats["misses"]
+    return dict(
+        stats,
+        entries=len(_memory),
+        hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+        enabled=COMPLETION_CACHE_ENABLED,
+        shared_tier=COMPLETION_CACHE_SHARED or None
+    )
@@ -0,0 +1,173 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from collections import OrderedDict, deque
+
+import openai_client
+import cosmos_client
+from prompt_router import count_tokens, trim_to_budget
+from cosmos_client import get_chat_history, read_conversation_summary, save_conversation_summary
+
+# Server-side conversation memory for /chat. Turns not yet summarized go into
+# the prompt verbatim; once MEMORY_FOLD_BATCH of them are older than the last
+# MEMORY_RECENT_TURNS, they are folded into a rolling summary stored next to
+# the chat records in chat_history. Folding runs in the background from the
+# turns already loaded for the prompt plus the one just answered (which may
+# still be in the chat write queue), and the verbatim part is capped at
+# MEMORY_RECENT_TOKENS, so the prompt stays the same size however long the
+# conversation gets.
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() == "true"
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+MEMORY_FOLD_BATCH = int(os.getenv("MEMORY_FOLD_BATCH", "4"))  # fold once this many turns are past the recent window
+MEMORY_RECENT_TOKENS = int(os.getenv("MEMORY_RECENT_TOKENS", "800"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+MEMORY_TURN_TOKENS = 300  # cap on one side of a turn, verbatim or while folding
+MEMORY_LOCAL_USERS = 1000
+
+FOLD_PROMPT = (
+    "You keep a running summary of a conversation between a {role} and an education assistant. "
+    "Update the summary with the new exchanges below. Keep what matters for later turns: "
+    "topics covered, the learner's goals, difficulties and progress, and anything the assistant promised. "
+    "Answer with the updated summary only, in under 200 words.\n\n"
+    "Current summary:\n{summary}\n\nNew exchanges:\n{exchanges}"
+)
+
+# Turns that may still be sitting in the chat write-behind queue, per user
+_local_turns = OrderedDict()
+_folding = set()
+_tasks = set()
+stats = {"loads": 0, "load_failures": 0, "folds": 0, "turns_folded": 0, "fold_failures": 0}
+
+def _empty():
+    return {"summary": "", "turns": [], "summarized_through": "", "turns_summarized": 0}
+
+def remember_turn(user_id, question, answer):
+    """Keep a just-answered turn in process until the chat writer has persisted it; returns the turn"""
+    turns = _local_turns.get(user_id)
+    if turns is None:
+        turns = _local_turns[user_id] = deque(maxlen=MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH)
+    turns.append({"question": question, "answer": answer, "timestamp": datetime.utcnow().isoformat()})
+    _local_turns.move_to_end(user_id)
+    while len(_local_turns) > MEMORY_LOCAL_USERS:
+        _local_turns.popitem(last=False)
+    return turns[-1]
+
+async def load(user_id):
+    """Rolling summary plus the turns not yet folded into it, oldest first"""
+    if not MEMORY_ENABLED or not user_id or user_id == "unknown":
+        return _empty()
+
+    stats["loads"] += 1
+    records, summary_doc = [], None
+    if cosmos_client.database is not None:
+        try:
+            records, summary_doc = await asyncio.gather(
+                get_chat_history(user_id, limit=MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH),
+                read_conversation_summary(user_id)
+            )
+        except Exception as e:
+            # Fall back to the turns this process remembers
+            stats["load_failures"] += 1
+            logging.warning(f"Could not load conversation memory for {user_id}: {str(e)}")
+
+    summarized_through = summary_doc.get("summarizedThrough", "") if summary_doc else ""
+    turns = [
+        {"question": record.get("userMessage"), "answer": record.get("aiResponse"), "timestamp": record.get("timestamp")}
+        for record in reversed(records)
+    ]
+    persisted = {(turn["question"], turn["answer"]) for turn in turns}
+    turns += [turn for turn in _local_turns.get(user_id, ()) if (turn["question"], turn["answer"]) not in persisted]
+    turns = [turn for turn in turns if (turn["timestamp"] or "") > summarized_through]
+
+    return {
+        "summary": summary_doc.get("summary", "") if summary_doc else "",
+        "turns": turns[-(MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH):],
+        "summarized_through": summarized_through,
+        "turns_summarized": summary_doc.get("turnsSummarized", 0) if summary_doc else 0
+    }
+
+def _format_turn(turn, deployment=None):
+    question = trim_to_budget(turn["question"] or "", MEMORY_TURN_TOKENS, deployment)
+    answer = trim_to_budget(turn["answer"] or "", MEMORY_TURN_TOKENS, deployment)
+    return f"User: {question}\nAssistant: {answer}"
+
+def format_history(memory, deployment=None):
+    """Prompt text for a loaded memory, newest turns kept first when over MEMORY_RECENT_TOKENS"""
+    sections = []
+    if memory["summary"]:
+        sections.append(f"Summary of the conversation so far: {memory['summary']}")
+
+    kept = []
+    used = 0
+    for turn in reversed(memory["turns"]):
+        text = _format_turn(turn, deployment)
+        cost = count_tokens(text, deployment) + 1
+        if used + cost > MEMORY_RECENT_TOKENS:
+            break
+        kept.insert(0, text)
+        used += cost
+    if kept:
+        sections.append("Recent conversation:\n" + "\n".join(kept))
+    return "\n\n".join(sections)
+
+async def _fold(user_id, user_role, memory, to_fold):
+    exchanges = "\n\n".join(_format_turn(turn) for turn in to_fold)
+    summary = await openai_client.complete_chat(
+        FOLD_PROMPT.format(
+            role=user_role,
+            summary=memory["summary"] or "(none yet)",
+            exchanges=exchanges
+        ),
+        temperature=0.3,
+        max_tokens=MEMORY_SUMMARY_TOKENS,
+        role=user_role
+    )
+    await save_conversation_summary(
+        user_id,
+        summary,
+        summarized_through=to_fold[-1]["timestamp"],
+        turns_summarized=memory["turns_summarized"] + len(to_fold)
+    )
+    stats["folds"] += 1
+    stats["turns_folded"] += len(to_fold)
+    logging.info(f"Folded {len(to_fold)} turns into the conversation summary for {user_id}")
+
+async def _run_fold(user_id, user_role, memory, to_fold):
+    try:
+        await _fold(user_id, user_role, memory, to_fold)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        stats["fold_failures"] += 1
+        logging.warning(f"Conversation summary update failed for {user_id}: {str(e)}")
+    finally:
+        _folding.discard(user_id)
+
+def schedule_fold(user_id, user_role, memory, turn):
+    """Fold older turns into the summary in the background (one fold per user at a time).
+
+    memory is what load() returned for the turn just answered and turn is
+    that turn (from remember_turn); the fold works from them alone, without
+    re-reading Cosmos, once they add up to a full batch past the recent window.
+    """
+    if not MEMORY_ENABLED or not user_id or user_id == "unknown" or user_id in _folding:
+        return
+    turns = memory["turns"] + [turn]
+    if len(turns) < MEMORY_RECENT_TURNS + MEMORY_FOLD_BATCH:
+        return
+    if cosmos_client.database is None:
+        return
+    _folding.add(user_id)
+    task = asyncio.create_task(_run_fold(user_id, user_role, memory, turns[:len(turns) - MEMORY_RECENT_TURNS]))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+async def stop():
+    """Cancel background folds (called at shutdown); they are redone on a later turn"""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+
+def get_stats():
+    return dict(stats, enabled=MEMORY_ENABLED, folds_in_progress=len(_folding), local_users=len(_local_turns))
@@ -1,73 +1,296 @@
 import os
-from azure.cosmos import CosmosClient, PartitionKey
+import time
+import asyncio
+from azure.cosmos.aio import CosmosClient
+from azure.cosmos import PartitionKey
+from azure.cosmos.partition_key import NonePartitionKeyValue
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
 import logging
 from datetime import datetime
 import uuid
+from urllib.parse import urlparse
+
+import metrics
 
 COSMOS_ENDPOINT = os.getenv("COSMOS_ENDPOINT")
 COSMOS_KEY = os.getenv("COSMOS_KEY")
 COSMOS_DB_NAME = os.getenv("COSMOS_DB_NAME")
 
-# Add validation
-if not all([COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DB_NAME]):
-    logging.warning("Cosmos DB environment variables not fully configured")
-    client = None
-    database = None
-else:
+# One async client per process, opened and closed by the app lifespan.
+# Container proxies are cached so every request reuses the same objects.
+client = None
+database = None
+_containers = {}
+
+# Partition key path of each container, read once from the container properties.
+# It is published only after the container's legacy keys are indexed; callers
+# that arrive meanwhile wait on the same lookup.
+_partition_key_paths = {}
+_partition_key_lookups = {}
+PROFILE_CONTAINERS = ("students", "teachers", "parents")
+# Legacy documents a point read by (id, id) cannot address, indexed once per
+# container by the startup scan so nothing is looked up per request:
+# (container, id) -> partition key value, when the key is missing or not the id,
+# (container, userId) -> (document id, partition key), when a profile is stored
+# under another id than its userId (read only if the id itself misses).
+_legacy_partition_keys = {}
+_legacy_user_ids = {}
+PROFILE_READ_CONCURRENCY = int(os.getenv("PROFILE_READ_CONCURRENCY", "10"))
+
+def _cosmos_operation(http_request):
+    """(container, operation) of a Cosmos REST request, for metrics labels"""
+    headers = {name.lower(): str(value).lower() for name, value in http_request.headers.items()}
+    # /dbs/{db}/colls/{container}/docs[/{id}]
+    parts = urlparse(http_request.url).path.strip("/").split("/")
+    container = parts[3] if len(parts) > 3 and parts[2] == "colls" else "-"
+    resource = parts[-1] if len(parts) % 2 else parts[-2]
+    if resource != "docs":
+        return container, "metadata"
+    if headers.get("x-ms-documentdb-isquery") == "true" or "query+json" in headers.get("content-type", ""):
+        return container, "query"
+    if headers.get("x-ms-cosmos-is-batch-request") == "true":
+        return container, "batch"
+    method = http_request.method.upper()
+    if method == "POST":
+        return container, "upsert" if headers.get("x-ms-documentdb-is-upsert") == "true" else "create"
+    if method == "GET":
+        return container, "read" if len(parts) % 2 == 0 else "read_feed"
+    return container, {"PUT": "replace", "PATCH": "patch", "DELETE": "delete"}.get(method, method.lower())
+
+def _on_cosmos_request(pipeline_request):
+    pipeline_request.context["metrics_started"] = time.perf_counter()
+
+def _on_cosmos_response(pipeline_response):
+    """Record latency and request charge (RU) of every Cosmos HTTP call"""
+    started = pipeline_response.context.get("metrics_started")
+    if started is None:
+        return
+    http_response = pipeline_response.http_response
+    try:
+        charge = float(http_response.headers.get("x-ms-request-charge"))
+    except (TypeError, ValueError):
+        charge = None
+    container, operation = _cosmos_operation(pipeline_response.http_request)
+    metrics.observe_cosmos(container, operation, http_response.status_code, time.perf_counter() - started, charge)
+
+async def init_cosmos():
+    """Create the shared async Cosmos client (called once at startup)"""
+    global client, database
+    if client is not None:
+        return client
+
+    # Add validation
+    if not all([COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DB_NAME]):
+        logging.warning("Cosmos DB environment variables not fully configured")
+        return None
+
     try:
-        client = CosmosClient(COSMOS_ENDPOINT, COSMOS_KEY)
+        # The hooks see every HTTP call the SDK makes, retries included
+        client = CosmosClient(
+            COSMOS_ENDPOINT, COSMOS_KEY,
+            raw_request_hook=_on_cosmos_request,
+            raw_response_hook=_on_cosmos_response
+        )
         database = client.get_database_client(COSMOS_DB_NAME)
         logging.info("Cosmos DB client initialized successfully")
     except Exception as e:
         logging.error(f"Failed to initialize Cosmos DB client: {e}")
         client = None
         database = None
+    return client
+
+async def close_cosmos():
+    """Close the shared Cosmos client and its connection pool (called at shutdown)"""
+    global client, database
+    if client is not None:
+        await client.close()
+        logging.info("Cosmos DB client closed")
+    client = None
+    database = None
+    _containers.clear()
+    _partition_key_paths.clear()
+    for lookup in _partition_key_lookups.values():
+        lookup.cancel()
 
 def get_container(container_name):
     if not database:
         raise Exception("Cosmos DB not properly configured. Check environment variables.")
-    return database.get_container_client(container_name)
+    container = _containers.get(container_name)
+    if container is None:
+        container = database.get_container_client(container_name)
+        _containers[container_name] = container
+    return container
 
-# Chat storage functions
-def save_chat_message(user_id, user_role, user_message, ai_response, context=None):
-    """Save a chat interaction to Cosmos DB"""
+async def get_partition_key_path(container_name):
+    """Partition key path of a container (e.g. "/id"), cached after the first lookup"""
+    path = _partition_key_paths.get(container_name)
+    if path is not None:
+        return path
+    lookup = _partition_key_lookups.get(container_name)
+    if lookup is None:
+        lookup = _partition_key_lookups[container_name] = asyncio.ensure_future(_read_partition_key_path(container_name))
+        lookup.add_done_callback(lambda _: _partition_key_lookups.pop(container_name, None))
+    return await asyncio.shield(lookup)
+
+async def _read_partition_key_path(container_name):
+    properties = await get_container(container_name).read()
+    path = properties["partitionKey"]["paths"][0]
+    logging.info(f"Container {container_name} is partitioned by {path}")
+    await _load_legacy_partition_keys(container_name, path)
+    _partition_key_paths[container_name] = path
+    return path
+
+async def load_partition_keys(container_names=PROFILE_CONTAINERS):
+    """Resolve partition key paths and legacy indexes up front (called once at startup)"""
+    results = await asyncio.gather(
+        *(get_partition_key_path(container_name) for container_name in container_names),
+        return_exceptions=True
+    )
+    for container_name, result in zip(container_names, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Could not read partition key of {container_name}, will retry on first use: {str(result)}")
+
+async def _load_legacy_partition_keys(container_name, path):
+    """One-time scan for documents a point read by id cannot address"""
+    field = "c" + "".join(f'["{part}"]' for part in path.strip("/").split("/"))
+    query = (
+        f"SELECT c.id, c.userId, {field} AS pk FROM c "
+        f"WHERE NOT IS_DEFINED({field}) OR {field} != c.id OR (IS_DEFINED(c.userId) AND c.userId != c.id)"
+    )
     try:
-        chat_container = get_container("chat_history")
-        
-        chat_record = {
-            "id": str(uuid.uuid4()),
-            "userId": user_id,
-            "userRole": user_role,
-            "timestamp": datetime.utcnow().isoformat(),
-            "userMessage": user_message,
-            "aiResponse": ai_response,
-            "context": context,
-            "sessionId": f"{user_id}_{datetime.utcnow().strftime('%Y%m%d')}"
-        }
-        
-        result = chat_container.create_item(chat_record)
-        logging.info(f"Chat message saved successfully for user {user_id}")
-        return result
-        
+        container = get_container(container_name)
+        count = 0
+        async for row in container.query_items(query):
+            # Documents without the partition key field live in the "none" partition
+            partition_key = row["pk"] if "pk" in row else NonePartitionKeyValue
+            if partition_key != row["id"]:
+                _legacy_partition_keys[(container_name, row["id"])] = partition_key
+            if row.get("userId") and row["userId"] != row["id"]:
+                _legacy_user_ids[(container_name, row["userId"])] = (row["id"], partition_key)
+            count += 1
+        logging.info(f"Indexed {count} legacy profile documents for {container_name}")
     except Exception as e:
-        logging.error(f"Failed to save chat message: {str(e)}")
-        raise Exception(f"Failed to save chat message: {str(e)}")
+        logging.warning(f"Could not index legacy partition keys for {container_name}: {str(e)}")
+
+# Returned by read_profile when If-None-Match matched the current _etag
+NOT_MODIFIED = object()
+
+async def read_profile(container_name, item_id, if_none_match=None):
+    """Point-read a profile document by id (1 RU); returns None if it does not exist.
+
+    Profile documents are partitioned by /id or /userId, and both equal the id,
+    so the id is the partition key unless the legacy index says otherwise.
+    A miss is never retried as a cross-partition query.
+    With if_none_match set to a known _etag, returns NOT_MODIFIED on a 304.
+    """
+    container = get_container(container_name)
+    await get_partition_key_path(container_name)
+    locations = [(item_id, _legacy_partition_keys.get((container_name, item_id), item_id))]
+    if (container_name, item_id) in _legacy_user_ids:
+        locations.append(_legacy_user_ids[(container_name, item_id)])
+    kwargs = {"initial_headers": {"If-None-Match": if_none_match}} if if_none_match else {}
+    for document_id, partition_key in locations:
+        try:
+            item = await container.read_item(item=document_id, partition_key=partition_key, **kwargs)
+            break
+        except CosmosResourceNotFoundError:
+            pass
+    else:
+        return None
+    # A 304 does not raise; it comes back with an empty body
+    if if_none_match and not item.get("id"):
+        return NOT_MODIFIED
+    return item
+
+async def read_profiles(container_name, item_ids):
+    """Batch point-read several profiles; returns {id: doc} for the ids that exist.
+
+    Uses read_items (one batched call) when the SDK has it, otherwise concurrent
+    point reads capped at PROFILE_READ_CONCURRENCY.
+    """
+    unique_ids = list(dict.fromkeys(item_ids))
+    if not unique_ids:
+        return {}
+
+    container = get_container(container_name)
+    await get_partition_key_path(container_name)
+
+    semaphore = asyncio.Semaphore(PROFILE_READ_CONCURRENCY)
+
+    async def read_one(item_id):
+        async with semaphore:
+            return await read_profile(container_name, item_id)
+
+    if hasattr(container, "read_items"):
+        items = [(item_id, _legacy_partition_keys.get((container_name, item_id), item_id)) for item_id in unique_ids]
+        docs = await container.read_items(items=items, max_concurrency=PROFILE_READ_CONCURRENCY)
+        found = {doc["id"]: doc for doc in docs}
+        # Profiles stored under another id than their userId: one more batched read
+        stored_as = {
+            item_id: _legacy_user_ids[(container_name, item_id)]
+            for item_id in unique_ids
+            if item_id not in found and (container_name, item_id) in _legacy_user_ids
+        }
+        if stored_as:
+            docs = await container.read_items(items=list(stored_as.values()), max_concurrency=PROFILE_READ_CONCURRENCY)
+            by_document_id = {doc["id"]: doc for doc in docs}
+            found.update(
+                (item_id, by_document_id[document_id])
+                for item_id, (document_id, _) in stored_as.items()
+                if document_id in by_document_id
+            )
+        return found
+
+    docs = await asyncio.gather(*(read_one(item_id) for item_id in unique_ids))
+    return {item_id: doc for item_id, doc in zip(unique_ids, docs) if doc}
+
+# Chat storage functions
+# Chats live in the append-only chat_history container, partitioned by /userId.
+# Each chat is one small insert; old chats expire through the container TTL.
+CHAT_HISTORY_CONTAINER = "chat_history"
+CHAT_HISTORY_TTL = int(os.getenv("CHAT_HISTORY_TTL", str(180 * 24 * 3600)))  # seconds, -1 keeps chats forever
+CHAT_HISTORY_LIMIT = 20  # chats returned by default, matching the old embedded chatHistory trim
+CHAT_BATCH_MAX_OPERATIONS = 100  # Cosmos transactional batch limit
+
+def build_chat_record(user_id, user_role, user_message, ai_response, timestamp=None, context=None, record_id=None):
+    timestamp = timestamp or datetime.utcnow().isoformat()
+    return {
+        "id": record_id or str(uuid.uuid4()),
+        "type": "chat",
+        "userId": user_id,
+        "userRole": user_role,
+        "timestamp": timestamp,
+        "userMessage": user_message,
+        "aiResponse": ai_response,
+        "context": context,
+        "sessionId": f"{user_id}_{timestamp[:10].replace('-', '')}"
+    }
 
-def get_chat_history(user_id, limit=10):
+async def save_chat_records(user_id, records, upsert=False):
+    """Write several chat records for one user as transactional batches"""
+    chat_container = get_container(CHAT_HISTORY_CONTAINER)
+    operation = "upsert" if upsert else "create"
+    for start in range(0, len(records), CHAT_BATCH_MAX_OPERATIONS):
+        batch = [(operation, (record,)) for record in records[start:start + CHAT_BATCH_MAX_OPERATIONS]]
+        await chat_container.execute_item_batch(batch_operations=batch, partition_key=user_id)
+
+async def get_chat_history(user_id, limit=10):
     """Get recent chat history for a user"""
     try:
-        chat_container = get_container("chat_history")
+        chat_container = get_container(CHAT_HISTORY_CONTAINER)
         
-        query = f"""
-        SELECT TOP {limit} * FROM c 
-        WHERE c.userId = '{user_id}' 
-        ORDER BY c.timestamp DESC
-        """
+        # Single-partition, parameterized, newest first
+        query = (
+            "SELECT TOP @limit * FROM c "
+            "WHERE c.userId = @userId AND c.type = 'chat' "
+            "ORDER BY c.timestamp DESC"
+        )
+        parameters = [
+            {"name": "@limit", "value": int(limit)},
+            {"name": "@userId", "value": user_id}
+        ]
         
-        items = list(chat_container.query_items(
-            query, 
-            enable_cross_partition_query=True
-        ))
+        items = [item async for item in chat_container.query_items(query, parameters=parameters, partition_key=user_id)]
         
         logging.info(f"Retrieved {len(items)} chat messages for user {user_id}")
         return items
@@ -76,122 +299,80 @@ def get_chat_history(user_id, limit=10):
         logging.error(f"Failed to get chat history: {str(e)}")
         return []
 
-def update_user_chat_history(user_id, user_role, new_message):
-    """Update user's chat history in their main record"""
+def conversation_summary_id(user_id):
+    return f"summary_{user_id}"
+
+async def read_conversation_summary(user_id):
+    """The user's rolling conversation summary document, or None"""
+    chat_container = get_container(CHAT_HISTORY_CONTAINER)
     try:
-        logging.info(f"=== UPDATE USER CHAT HISTORY START ===")
-        logging.info(f"user_id: {user_id}, user_role: {user_role}")
-        
-        container_name = f"{user_role}s"  # students, teachers, parents
-        logging.info(f"Container name: {container_name}")
-        
-        container = get_container(container_name)
-        logging.info("Container retrieved successfully")
-        
-        # Get user record
-        query = f"SELECT * FROM c WHERE c.userId = '{user_id}' OR c.id = '{user_id}'"
-        logging.info(f"Query: {query}")
-        
-        items = list(container.query_items(query, enable_cross_partition_query=True))
-        logging.info(f"Query returned {len(items)} items")
-        
-        if items:
-            user_record = items[0]
-            logging.info(f"Found user record for {user_id}")
-            logging.info(f"Current chatHistory length: {len(user_record.get('chatHistory', []))}")
-            
-            # Initialize chatHistory if it doesn't exist
-            if "chatHistory" not in user_record:
-                user_record["chatHistory"] = []
-                logging.info("Initialized empty chatHistory")
-            
-            # Add new message (keep last 20 messages)
-            new_entry = {
-                "timestamp": datetime.utcnow().isoformat(),
-                "message": new_message["userMessage"],
-                "response": new_message["aiResponse"]
-            }
-            user_record["chatHistory"].append(new_entry)
-            logging.info(f"Added new message. New chatHistory length: {len(user_record['chatHistory'])}")
-            
-            # Keep only last 20 messages
-            user_record["chatHistory"] = user_record["chatHistory"][-20:]
-            logging.info(f"Trimmed to last 20. Final length: {len(user_record['chatHistory'])}")
-            
-            # Update the record
-            update_result = container.replace_item(user_record["id"], user_record)
-            logging.info(f"Record updated successfully: {update_result['id']}")
-            logging.info("=== UPDATE USER CHAT HISTORY SUCCESS ===")
-            
-        else:
-            logging.warning(f"User {user_id} not found for chat history update")
-            
-    except Exception as e:
-        logging.error(f"Failed to update user chat history: {str(e)}")
-        logging.error(f"Error type: {type(e).__name__}")
-        import traceback
-        logging.error(f"Traceback: {traceback.format_exc()}")
-        raise e  # Re-raise to see the error in main.py
+        return await chat_container.read_item(item=conversation_summary_id(user_id), partition_key=user_id)
+    except CosmosResourceNotFoundError:
+        return None
 
-def create_chat_container_if_not_exists():
+async def save_conversation_summary(user_id, summary, summarized_through, turns_summarized):
+    """Upsert the rolling summary that sits next to the user's chat records"""
+    chat_container = get_container(CHAT_HISTORY_CONTAINER)
+    return await chat_container.upsert_item({
+        "id": conversation_summary_id(user_id),
+        "type": "summary",
+        "userId": user_id,
+        "summary": summary,
+        "summarizedThrough": summarized_through,
+        "turnsSummarized": turns_summarized,
+        "updatedAt": datetime.utcnow().isoformat()
+    })
+
+async def create_chat_container_if_not_exists():
     """Create chat_history container if it doesn't exist"""
     try:
         if not database:
             logging.error("Database not initialized")
             return False
             
-        try:
-            # Try to get the container
-            database.get_container_client("chat_history")
-            logging.info("chat_history container already exists")
-            return True
-            
-        except Exception:
-            # Container doesn't exist, create it
-            container = database.create_container(
-                id="chat_history",
-                partition_key=PartitionKey(path="/userId"),
-                offer_throughput=400
-            )
-            logging.info("chat_history container created successfully")
-            return True
+        # default_ttl only applies when the container is created; change it
+        # on an existing container in the portal or with replace_container
+        await database.create_container_if_not_exists(
+            id=CHAT_HISTORY_CONTAINER,
+            partition_key=PartitionKey(path="/userId"),
+            default_ttl=CHAT_HISTORY_TTL,
+            offer_throughput=400
+        )
+        logging.info("chat_history container ready")
+        return True
             
     except Exception as e:
         logging.error(f"Failed to create chat_history container: {str(e)}")
         return False
 
-def save_chat_to_cosmos(user_id: str, user_role: str, question: str, answer: str):
-    """Simple function to save chat directly to user's document"""
+async def save_chat_to_cosmos(user_id: str, user_role: str, question: str, answer: str):
+    """Append one chat to the user's history in the chat_history container"""
+    chat_entry = {
+        "question": question,
+        "answer": answer,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    return await save_chats_to_cosmos(user_id, user_role, [chat_entry])
+
+async def save_chats_to_cosmos(user_id: str, user_role: str, chat_entries: list, upsert: bool = False):
+    """Append several chats for one user as small inserts (no profile rewrite).
+
+    An entry may carry its record "id"; with upsert, writing it again is a no-op.
+    """
     try:
         logging.info(f"=== SAVING CHAT TO COSMOS ===")
-        logging.info(f"user_id: {user_id}, user_role: {user_role}")
-        
-        # Determine container name based on role
-        container_name = f"{user_role}s"  # student -> students, teacher -> teachers, etc.
-        container = get_container(container_name)
+        logging.info(f"user_id: {user_id}, user_role: {user_role}, entries: {len(chat_entries)}")
         
-        # Read the user's document
-        user_doc = container.read_item(item=user_id, partition_key=user_id)
-        logging.info(f"Found user document: {user_doc.get('name', user_id)}")
-        
-        # Create chat entry with timestamp
-        from datetime import datetime
-        chat_entry = {
-            "question": question,
-            "answer": answer,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        # Initialize chatHistory if it doesn't exist, then append
-        user_doc.setdefault("chatHistory", []).append(chat_entry)
-        
-        # Keep only last 20 chats
-        user_doc["chatHistory"] = user_doc["chatHistory"][-20:]
-        
-        # Update document in Cosmos
-        container.replace_item(item=user_id, body=user_doc)
+        records = [
+            build_chat_record(
+                user_id, user_role, entry["question"], entry["answer"],
+                timestamp=entry["timestamp"], record_id=entry.get("id")
+            )
+            for entry in chat_entries
+        ]
+        await save_chat_records(user_id, records, upsert=upsert)
         
-        logging.info(f"Chat saved successfully. Total chats: {len(user_doc['chatHistory'])}")
+        logging.info(f"Chat saved successfully. Entries written: {len(records)}")
         return True
         
     except Exception as e:
@@ -199,18 +380,54 @@ def save_chat_to_cosmos(user_id: str, user_role: str, question: str, answer: str
         logging.error(f"Error type: {type(e).__name__}")
         return False
 
-def get_chat_history_from_user(user_id: str, user_role: str):
-    """Get chat history directly from user's document"""
+def chat_record_to_entry(record):
+    """Shape a chat_history record like an embedded chatHistory entry"""
+    return {
+        "question": record.get("userMessage"),
+        "answer": record.get("aiResponse"),
+        "timestamp": record.get("timestamp")
+    }
+
+def chat_history_entries(records, user_doc=None, limit=CHAT_HISTORY_LIMIT):
+    """Entries from chat_history records, or from the embedded array if there are none"""
+    if records:
+        return [chat_record_to_entry(record) for record in records]
+    chat_history = user_doc.get("chatHistory", []) if user_doc else []
+    # Return in reverse order (newest first)
+    return list(reversed(chat_history))[:limit]
+
+async def get_chat_history_from_user(user_id: str, user_role: str, limit: int = CHAT_HISTORY_LIMIT, user_doc=None):
+    """Get a user's recent chats, newest first.
+
+    Reads the chat_history container. Users whose embedded chatHistory has not
+    been migrated yet fall back to the array on their profile document
+    (pass user_doc when it has already been fetched).
+    """
     try:
-        container_name = f"{user_role}s"
-        container = get_container(container_name)
-        
-        user_doc = container.read_item(item=user_id, partition_key=user_id)
-        chat_history = user_doc.get("chatHistory", [])
-        
-        # Return in reverse order (newest first)
-        return list(reversed(chat_history))
+        records = await get_chat_history(user_id, limit=limit)
+        if not records and user_doc is None:
+            user_doc = await read_profile(f"{user_role}s", user_id)
+        return chat_history_entries(records, user_doc, limit)
         
     except Exception as e:
         logging.error(f"Error getting chat history: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+async def create_cache_container_if_not_exists(container_name: str):
+    """Create a /id-partitioned container with per-item TTL enabled"""
+    try:
+        if not database:
+            logging.error("Database not initialized")
+            return False
+
+        await database.create_container_if_not_exists(
+            id=container_name,
+            partition_key=PartitionKey(path="/id"),
+            default_ttl=-1  # items opt in to expiry through their own "ttl" field
+        )
+        logging.info(f"{container_name} container ready")
+        return True
+
+    except Exception as e:
+        logging.error(f"Failed to create {container_name} container: {str(e)}")
+        return False
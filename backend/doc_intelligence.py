@@ -0,0 +1,75 @@
+import os
+import time
+import asyncio
+import logging
+
+import metrics
+import http_client
+from retry_after import retry_after_seconds
+
+DOC_INTELLIGENCE_ENDPOINT = os.getenv("DOC_INTELLIGENCE_ENDPOINT")
+DOC_INTELLIGENCE_KEY = os.getenv("DOC_INTELLIGENCE_KEY")
+DOC_INTELLIGENCE_API_VERSION = os.getenv("DOC_INTELLIGENCE_API_VERSION", "2023-07-31")
+
+# Polling: wait as long as the service's Retry-After asks; without one, start
+# fast and slow down for long documents. Give up after OCR_TIMEOUT
+OCR_POLL_INITIAL = float(os.getenv("OCR_POLL_INITIAL", "1.0"))
+OCR_POLL_MAX = float(os.getenv("OCR_POLL_MAX", "8.0"))
+OCR_POLL_FACTOR = float(os.getenv("OCR_POLL_FACTOR", "1.5"))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "120"))
+
+def is_configured():
+    return bool(DOC_INTELLIGENCE_ENDPOINT and DOC_INTELLIGENCE_KEY)
+
+def extract_lines_text(analyze_result):
+    """Join the OCR'd lines of every page into one string"""
+    return " ".join([line['content'] for page in analyze_result['pages'] for line in page['lines']])
+
+async def analyze_document(document, content_type="application/pdf"):
+    """OCR a document with prebuilt-layout on the shared HTTP client.
+
+    document is bytes or an uploads.Upload, which is streamed to the service
+    instead of being read into memory.
+    """
+    if not is_configured():
+        raise Exception("Document Intelligence not configured")
+
+    ocr_url = f"{DOC_INTELLIGENCE_ENDPOINT.rstrip('/')}/formrecognizer/documentModels/prebuilt-layout:analyze?api-version={DOC_INTELLIGENCE_API_VERSION}"
+    headers = {
+        "Content-Type": content_type,
+        "Ocp-Apim-Subscription-Key": DOC_INTELLIGENCE_KEY
+    }
+
+    started = time.perf_counter()
+    response = await http_client.request("POST", ocr_url, document=document, headers=headers)
+    metrics.observe_ocr("submit", time.perf_counter() - started)
+    response.raise_for_status()
+    result_url = response.headers.get("operation-location")
+    if not result_url:
+        raise Exception("OCR submit did not return an operation-location")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + OCR_TIMEOUT
+    # The service says when to poll next (Retry-After); back off on our own when it doesn't
+    delay = retry_after_seconds(response.headers, default=OCR_POLL_INITIAL)
+    backoff = OCR_POLL_INITIAL
+    started = time.perf_counter()
+    while loop.time() < deadline:
+        await asyncio.sleep(min(delay, max(0.0, deadline - loop.time())))
+        poll_response = await http_client.request(
+            "GET", result_url, headers={"Ocp-Apim-Subscription-Key": DOC_INTELLIGENCE_KEY}
+        )
+        metrics.count_ocr_poll()
+        poll_response.raise_for_status()
+        poll = poll_response.json()
+        status = poll.get("status")
+        if status == "succeeded":
+            metrics.observe_ocr("poll", time.perf_counter() - started)
+            return extract_lines_text(poll['analyzeResult'])
+        if status == "failed":
+            metrics.observe_ocr("poll", time.perf_counter() - started)
+            raise Exception(f"OCR failed: {poll.get('error')}")
+        backoff = min(backoff * OCR_POLL_FACTOR, OCR_POLL_MAX)
+        delay = retry_after_seconds(poll_response.headers, default=backoff)
+
+    raise TimeoutError("OCR timed out")
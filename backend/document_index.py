@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import embeddings
+from prompt_router import chunk_text, count_tokens
+
+# Per-user retrieval index over uploaded documents. Each document's OCR text
+# is split into token-bounded chunks whose embeddings are stored as one
+# float32 matrix (.npy) next to the chunk texts (.json), so a follow-up /chat
+# about the document needs one query embedding and one matrix-vector product
+# instead of another upload and OCR pass. Files are read and written in a
+# worker thread so a large index never holds up the event loop.
+DOCUMENT_INDEX_DIR = os.getenv("DOCUMENT_INDEX_DIR", os.path.join(tempfile.gettempdir(), "gaief_document_index"))
+DOCUMENT_CHUNK_TOKENS = int(os.getenv("DOCUMENT_CHUNK_TOKENS", "300"))
+DOCUMENT_TOP_K = int(os.getenv("DOCUMENT_TOP_K", "4"))
+DOCUMENT_CONTEXT_TOKENS = int(os.getenv("DOCUMENT_CONTEXT_TOKENS", "1200"))
+DOCUMENT_INDEX_TTL = int(os.getenv("DOCUMENT_INDEX_TTL", str(30 * 24 * 3600)))  # seconds
+DOCUMENT_INDEX_MAX_PER_USER = int(os.getenv("DOCUMENT_INDEX_MAX_PER_USER", "50"))
+DOCUMENT_INDEX_CACHED_DOCUMENTS = 100  # loaded documents kept in memory
+
+_DOCUMENT_ID = re.compile(r"^[0-9a-f]{32}$")
+_loaded = OrderedDict()  # (user_id, document_id) -> (meta, matrix)
+_lock = threading.Lock()
+stats = {"indexed": 0, "searches": 0, "memory_hits": 0, "not_found": 0}
+
+class DocumentNotFound(Exception):
+    pass
+
+def _user_dir(user_id):
+    # Hash the user id so it can never escape the index directory
+    return os.path.join(DOCUMENT_INDEX_DIR, hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:24])
+
+def _paths(user_id, document_id):
+    base = os.path.join(_user_dir(user_id), document_id)
+    return base + ".json", base + ".npy"
+
+def _remove(user_id, document_id):
+    _loaded.pop((user_id, document_id), None)
+    for path in _paths(user_id, document_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _enforce_user_limit(user_id):
+    documents = _list_documents(user_id)
+    for document in documents[DOCUMENT_INDEX_MAX_PER_USER:]:
+        _remove(user_id, document["document_id"])
+
+def make_document_id(content_key):
+    """Document id for an uploaded file, from its OCR cache key"""
+    return content_key[:32]
+
+async def index_document(user_id, document_id, text, filename=None):
+    """Chunk, embed and store a document's text for user_id"""
+    chunks = chunk_text(text, DOCUMENT_CHUNK_TOKENS)
+    if not chunks:
+        raise ValueError("Document has no text to index")
+    matrix = await embeddings.embed(chunks)
+
+    meta = {
+        "document_id": document_id,
+        "filename": filename,
+        "chunks": chunks,
+        "provider": embeddings.EMBEDDING_PROVIDER,
+        "created_at": time.time()
+    }
+    await asyncio.to_thread(_save, user_id, document_id, meta, matrix)
+
+    stats["indexed"] += 1
+    logging.info(f"Indexed document {document_id} for {user_id}: {len(chunks)} chunks")
+    return len(chunks)
+
+def _save(user_id, document_id, meta, matrix):
+    meta_path, matrix_path = _paths(user_id, document_id)
+    with _lock:
+        os.makedirs(_user_dir(user_id), exist_ok=True)
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, matrix.astype(np.float32))
+        os.replace(matrix_path + ".tmp", matrix_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        _loaded.pop((user_id, document_id), None)
+        _enforce_user_limit(user_id)
+
+def _load(user_id, document_id):
+    if not _DOCUMENT_ID.match(document_id or ""):
+        raise DocumentNotFound(document_id)
+    key = (user_id, document_id)
+    with _lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            stats["memory_hits"] += 1
+            return _loaded[key]
+
+        meta_path, matrix_path = _paths(user_id, document_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(matrix_path)
+        except FileNotFoundError:
+            raise DocumentNotFound(document_id)
+        if time.time() - meta["created_at"] > DOCUMENT_INDEX_TTL or meta.get("provider") != embeddings.EMBEDDING_PROVIDER:
+            # Expired, or embedded by a different model and not comparable
+            _remove(user_id, document_id)
+            raise DocumentNotFound(document_id)
+
+        _loaded[key] = (meta, matrix)
+        while len(_loaded) > DOCUMENT_INDEX_CACHED_DOCUMENTS:
+            _loaded.popitem(last=False)
+        return meta, matrix
+
+async def search(user_id, document_id, query, top_k=DOCUMENT_TOP_K):
+    """The top_k chunks of a user's document most similar to query, best first"""
+    stats["searches"] += 1
+    try:
+        meta, matrix = await asyncio.to_thread(_load, user_id, document_id)
+    except DocumentNotFound:
+        stats["not_found"] += 1
+        raise
+    vector = await embeddings.embed_one(query)
+    similarities = matrix @ vector
+    top_k = min(top_k, len(similarities))
+    best = np.argpartition(-similarities, top_k - 1)[:top_k]
+    best = best[np.argsort(-similarities[best])]
+    return [(int(row), float(similarities[row]), meta["chunks"][row]) for row in best]
+
+def pack_excerpts(results, max_tokens=DOCUMENT_CONTEXT_TOKENS):
+    """Context text from search results: best chunks that fit max_tokens, in document order"""
+    kept = []
+    used = 0
+    for row, _, chunk in results:
+        cost = count_tokens(chunk) + 1
+        if used + cost > max_tokens:
+            continue
+        kept.append((row, chunk))
+        used += cost
+    return "\n\n".join(chunk for _, chunk in sorted(kept))
+
+async def relevant_excerpts(user_id, document_id, question):
+    """Packed excerpts of a user's document for answering question"""
+    return pack_excerpts(await search(user_id, document_id, question))
+
+async def list_documents(user_id):
+    """A user's indexed documents, newest first"""
+    return await asyncio.to_thread(_list_documents, user_id)
+
+def _list_documents(user_id):
+    documents = []
+    try:
+        names = os.listdir(_user_dir(user_id))
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(_user_dir(user_id), name), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception as e:
+            logging.warning(f"Skipping unreadable document index entry {name}: {str(e)}")
+            continue
+        documents.append({
+            "document_id": meta["document_id"],
+            "filename": meta.get("filename"),
+            "chunks": len(meta["chunks"]),
+            "created_at": meta["created_at"]
+        })
+    return sorted(documents, key=lambda document: document["created_at"], reverse=True)
+
+def get_stats():
+    return dict(stats, loaded_documents=len(_loaded), enabled=embeddings.is_available())
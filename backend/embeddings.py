@@ -0,0 +1,66 @@
+import os
+import re
+import hashlib
+import logging
+
+import numpy as np
+
+import openai_client
+
+# Text embeddings for the semantic caches and document retrieval. "azure"
+# uses AZURE_OPENAI_EMBEDDING_DEPLOYMENT; "local" is a deterministic hashing
+# embedding (word and character trigram features) that needs no network, for
+# tests and offline development. It captures word overlap, not meaning.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "azure").lower()
+LOCAL_EMBEDDING_DIM = int(os.getenv("LOCAL_EMBEDDING_DIM", "256"))
+EMBEDDING_BATCH_SIZE = 16  # inputs per embeddings request
+
+# Filler words carry no topic, so the local embedding ignores them
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "what", "whats", "how", "why", "when", "who",
+    "which", "do", "does", "did", "can", "could", "you", "me", "i", "my", "of", "to", "in", "on", "for",
+    "and", "or", "it", "this", "that", "please", "pls", "plz", "explain", "tell", "about", "give"
+}
+
+def is_available():
+    if EMBEDDING_PROVIDER == "local":
+        return True
+    return openai_client.is_configured() and bool(openai_client.AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
+
+def _features(text):
+    """(feature, weight) pairs: whole content words, plus their trigrams to absorb typos"""
+    words = [word for word in re.findall(r"\w+", text.lower()) if word not in _STOPWORDS]
+    for word in words:
+        yield word, 2.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3], 1.0
+
+def local_embedding(text, dim=LOCAL_EMBEDDING_DIM):
+    """Signed feature hashing into dim buckets; stable across processes"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(text):
+        digest = hashlib.md5(feature.encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vector[bucket] += weight if digest[4] & 1 else -weight
+    return vector
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+async def embed(texts):
+    """L2-normalized float32 embeddings, one row per text"""
+    if not texts:
+        return np.zeros((0, LOCAL_EMBEDDING_DIM), dtype=np.float32)
+    if EMBEDDING_PROVIDER == "local":
+        return _normalize(np.stack([local_embedding(text) for text in texts]))
+
+    rows = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        rows.extend(await openai_client.embed(texts[start:start + EMBEDDING_BATCH_SIZE]))
+    return _normalize(np.asarray(rows, dtype=np.float32))
+
+async def embed_one(text):
+    return (await embed([text]))[0]
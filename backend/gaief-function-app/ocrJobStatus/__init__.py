@@ -0,0 +1,24 @@
+import json
+import logging
+import azure.functions as func
+
+from ..shared_code import job_store
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    job_id = req.route_params.get("job_id")
+    try:
+        job = job_store.get_job(job_id)
+    except Exception as e:
+        logging.error(f"Could not read OCR job {job_id}: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": f"Could not read job: {str(e)}"}),
+            mimetype="application/json",
+            status_code=500
+        )
+    if job is None:
+        return func.HttpResponse(
+            json.dumps({"error": f"Job {job_id} not found"}),
+            mimetype="application/json",
+            status_code=404
+        )
+    return func.HttpResponse(json.dumps(job), mimetype="application/json", status_code=200)
\ No newline at end of file
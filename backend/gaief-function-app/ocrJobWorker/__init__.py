@@ -0,0 +1,46 @@
+import json
+import logging
+import azure.functions as func
+
+from ..shared_code import job_store
+from ..shared_code import uploads
+from ..uploadOcrSummary import iter_text_ranges, summarize_ranges
+
+# Queue-triggered worker of the OCR pipeline: one message per uploaded file.
+# The host runs several messages at once (host.json queues.batchSize) and
+# scales out across instances, so a batch's files are processed in parallel.
+# Failed attempts go back on the queue; after the last one the file is
+# marked failed instead of landing silently in the poison queue.
+OCR_JOB_MAX_ATTEMPTS = 3  # host.json queues.maxDequeueCount
+
+def main(msg: func.QueueMessage) -> None:
+    work = msg.get_json()
+    job_id, index, blob_name = work["job_id"], work["file_index"], work["blob_name"]
+    logging.info(f"OCR job {job_id} file {index}: attempt {msg.dequeue_count}")
+    job_store.update_file(job_id, index, status="running", attempts=msg.dequeue_count)
+
+    try:
+        upload = uploads.receive_chunks(job_store.download_chunks(blob_name))
+        try:
+            extracted_text, summary = summarize_ranges(iter_text_ranges(upload))
+        finally:
+            upload.close()
+    except Exception as e:
+        logging.error(f"OCR job {job_id} file {index} failed: {str(e)}")
+        if msg.dequeue_count < OCR_JOB_MAX_ATTEMPTS:
+            job_store.update_file(job_id, index, status="queued", error=f"Attempt {msg.dequeue_count} failed: {str(e)}")
+            raise
+        job_store.update_file(job_id, index, status="failed", error=f"Processing failed: {str(e)}")
+        job_store.delete_upload(blob_name)
+        return
+
+    job_store.update_file(
+        job_id, index,
+        status="succeeded",
+        summary=summary,
+        extracted_text_length=len(extracted_text),
+        extracted_text_preview=extracted_text[:200] + "..." if len(extracted_text) > 200 else extracted_text,
+        error=""
+    )
+    job_store.delete_upload(blob_name)
+    logging.info(f"OCR job {job_id} file {index} completed")
\ No newline at end of file
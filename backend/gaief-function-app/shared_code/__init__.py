@@ -0,0 +1 @@
+# Helpers shared by the functions in this app
@@ -0,0 +1,153 @@
+import os
+import re
+import uuid
+import threading
+from datetime import datetime
+
+# Blob and table storage for the queued OCR pipeline: submitOcrJob writes the
+# uploaded files to a blob container and creates the job's status rows,
+# ocrJobWorker updates one row per file, ocrJobStatus reads them back. A job
+# is one table partition: a "job" row plus a "file-NNNN" row per file.
+# Everything lives in the AzureWebJobsStorage account, so the pipeline runs
+# locally against Azurite with AzureWebJobsStorage=UseDevelopmentStorage=true.
+OCR_JOB_CONTAINER = os.getenv("OCR_JOB_CONTAINER", "ocr-uploads")
+OCR_JOB_TABLE = os.getenv("OCR_JOB_TABLE", "ocrjobs")
+
+# Azurite's well-known development account; the storage SDKs don't all
+# understand the UseDevelopmentStorage shorthand
+DEVELOPMENT_STORAGE = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+    "QueueEndpoint=http://127.0.0.1:10001/devstoreaccount1;"
+    "TableEndpoint=http://127.0.0.1:10002/devstoreaccount1;"
+)
+
+_container = None
+_table = None
+_lock = threading.Lock()
+
+def _connection_string():
+    connection = os.getenv("AzureWebJobsStorage")
+    if not connection:
+        raise Exception("AzureWebJobsStorage is not configured")
+    if connection.strip().rstrip(";").lower() == "usedevelopmentstorage=true":
+        return DEVELOPMENT_STORAGE
+    return connection
+
+def _get_container():
+    """The upload container client, created (with the container) on first use"""
+    global _container
+    if _container is None:
+        with _lock:
+            if _container is None:
+                from azure.storage.blob import BlobServiceClient
+                from azure.core.exceptions import ResourceExistsError
+                container = BlobServiceClient.from_connection_string(_connection_string()).get_container_client(OCR_JOB_CONTAINER)
+                try:
+                    container.create_container()
+                except ResourceExistsError:
+                    pass
+                _container = container
+    return _container
+
+def _get_table():
+    """The job status table client, created (with the table) on first use"""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                from azure.data.tables import TableServiceClient
+                _table = TableServiceClient.from_connection_string(_connection_string()).create_table_if_not_exists(OCR_JOB_TABLE)
+    return _table
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+def _file_row(index):
+    return f"file-{index:04d}"
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+def save_upload(job_id, index, upload):
+    """Stream an uploads.Upload to blob storage and return its blob name"""
+    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", upload.filename or "upload")[-100:]
+    blob_name = f"{job_id}/{index:04d}-{safe_name}"
+    with upload.open() as stream:
+        _get_container().upload_blob(blob_name, stream, length=upload.size, overwrite=True)
+    return blob_name
+
+def download_chunks(blob_name):
+    """An uploaded file's contents as a stream of chunks"""
+    return _get_container().download_blob(blob_name).chunks()
+
+def delete_upload(blob_name):
+    from azure.core.exceptions import ResourceNotFoundError
+    try:
+        _get_container().delete_blob(blob_name)
+    except ResourceNotFoundError:
+        pass
+
+def create_job(job_id, files):
+    """Write the job row and a queued row per file in one transaction"""
+    now = _now()
+    operations = [("upsert", {
+        "PartitionKey": job_id,
+        "RowKey": "job",
+        "file_count": len(files),
+        "created_at": now
+    })]
+    for file in files:
+        operations.append(("upsert", {
+            "PartitionKey": job_id,
+            "RowKey": _file_row(file["file_index"]),
+            "file_index": file["file_index"],
+            "filename": file["filename"],
+            "blob_name": file["blob_name"],
+            "size": file["size"],
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now
+        }))
+    _get_table().submit_transaction(operations)
+
+def update_file(job_id, index, **fields):
+    """Merge fields into a file's status row"""
+    from azure.data.tables import UpdateMode
+    entity = {"PartitionKey": job_id, "RowKey": _file_row(index), "updated_at": _now()}
+    entity.update({key: value for key, value in fields.items() if value is not None})
+    _get_table().upsert_entity(entity, mode=UpdateMode.MERGE)
+
+def _job_status(statuses):
+    if any(status in ("queued", "running") for status in statuses):
+        return "running" if any(status != "queued" for status in statuses) else "queued"
+    if all(status == "succeeded" for status in statuses):
+        return "succeeded"
+    return "partially_failed" if "succeeded" in statuses else "failed"
+
+def get_job(job_id):
+    """Job view with per-file status and results, or None for an unknown job"""
+    entities = list(_get_table().query_entities("PartitionKey eq @job_id", parameters={"job_id": job_id}))
+    job = next((entity for entity in entities if entity["RowKey"] == "job"), None)
+    if job is None:
+        return None
+
+    files = []
+    for entity in sorted(entities, key=lambda entity: entity["RowKey"]):
+        if entity["RowKey"] == "job":
+            continue
+        files.append({
+            key: entity.get(key) for key in (
+                "file_index", "filename", "size", "status", "attempts", "summary",
+                "extracted_text_length", "extracted_text_preview", "error", "updated_at"
+            )
+        })
+    return {
+        "job_id": job_id,
+        "status": _job_status([file["status"] for file in files]),
+        "created_at": job["created_at"],
+        "file_count": job["file_count"],
+        "completed": sum(1 for file in files if file["status"] in ("succeeded", "failed")),
+        "files": files
+    }
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+# OCR result cache for the function app, keyed by the SHA-256 of the file
+# bytes. The default directory is the instance's temp storage, so entries
+# survive across invocations on a warm instance; point OCR_CACHE_DIR at a
+# mounted share to keep them across scale-out and restarts.
+# Same store as backend/ocr_cache.py (the function app is deployed on its own
+# and cannot import it); that copy only adds asyncio.to_thread wrappers.
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gaief_ocr_cache"))
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "500"))
+OCR_CACHE_TTL = int(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+
+_index = None  # key -> last use timestamp, ordered least to most recently used
+_lock = threading.Lock()
+stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+def _path(key):
+    return os.path.join(OCR_CACHE_DIR, f"{key}.json")
+
+def _load_index():
+    """Rebuild the LRU index from the files on disk (least recently used first).
+
+    Each hit sets its file's mtime, so the order survives restarts; atime is
+    not used since noatime/relatime mounts do not keep it up to date.
+    """
+    global _index
+    _index = OrderedDict()
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        entries = []
+        for name in os.listdir(OCR_CACHE_DIR):
+            if name.endswith(".json"):
+                entries.append((os.stat(os.path.join(OCR_CACHE_DIR, name)).st_mtime, name[:-5]))
+        for last_used, key in sorted(entries):
+            _index[key] = last_used
+    except Exception as e:
+        logging.error(f"Failed to load OCR cache index: {str(e)}")
+
+def _remove(key):
+    _index.pop(key, None)
+    try:
+        os.remove(_path(key))
+    except FileNotFoundError:
+        pass
+
+def get(key):
+    """Return cached OCR text for a document key, or None"""
+    if not OCR_CACHE_ENABLED:
+        return None
+    with _lock:
+        if _index is None:
+            _load_index()
+
+        if key not in _index:
+            stats["misses"] += 1
+            return None
+
+        try:
+            with open(_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            text = entry["text"]
+        except Exception as e:
+            logging.warning(f"Dropping unreadable OCR cache entry {key}: {str(e)}")
+            _remove(key)
+            stats["misses"] += 1
+            return None
+
+        if time.time() - entry.get("created_at", 0) > OCR_CACHE_TTL:
+            _remove(key)
+            stats["expired"] += 1
+            stats["misses"] += 1
+            return None
+
+        now = time.time()
+        try:
+            os.utime(_path(key), (now, now))
+        except OSError:
+            pass
+        _index[key] = now
+        _index.move_to_end(key)
+        stats["hits"] += 1
+        return text
+
+def put(key, text):
+    """Store OCR text for a document key, evicting least recently used entries"""
+    if not OCR_CACHE_ENABLED:
+        return
+    with _lock:
+        if _index is None:
+            _load_index()
+        try:
+            tmp_path = _path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"text": text, "created_at": time.time()}, f)
+            os.replace(tmp_path, _path(key))
+        except Exception as e:
+            logging.error(f"Failed to write OCR cache entry {key}: {str(e)}")
+            return
+
+        _index[key] = time.time()
+        _index.move_to_end(key)
+        while len(_index) > OCR_CACHE_MAX_ENTRIES:
+            oldest_key = next(iter(_index))
+            _remove(oldest_key)
+            stats["evictions"] += 1
+
+def get_stats():
+    with _lock:
+        lookups = stats["hits"] + stats["misses"]
+        return dict(
+            stats,
+            entries=len(_index) if _index is not None else 0,
+            hit_rate=round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            enabled=OCR_CACHE_ENABLED
+        )
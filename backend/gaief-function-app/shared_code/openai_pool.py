@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Pool of Azure OpenAI endpoints/deployments for the function app, with the
+# same routing rules as the web API's openai_pool: EWMA latency and error rate
+# ranking, a circuit breaker per backend and failover to the next backend.
+# Clients are created once per worker process instead of once per call, and
+# the openai SDK is only imported when the first client is.
+#
+# AZURE_OPENAI_POOL is a JSON list like
+#   [{"name": "eastus", "endpoint": "https://...", "api_key": "...", "deployment": "gpt-35-turbo"}]
+# Without it (or when it has no usable entries) the pool is
+# AZURE_OPENAI_ENDPOINT/AZURE_OPENAI_KEY/AZURE_OPENAI_DEPLOYMENT.
+AZURE_OPENAI_API_VERSION = "2024-02-15-preview"
+POOL_EWMA_ALPHA = float(os.getenv("AZURE_OPENAI_EWMA_ALPHA", "0.3"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("AZURE_OPENAI_CIRCUIT_FAILURES", "3"))
+CIRCUIT_COOLDOWN = float(os.getenv("AZURE_OPENAI_CIRCUIT_COOLDOWN", "30"))
+MAX_ATTEMPTS_PER_BACKEND = 2
+ERROR_RATE_PENALTY = 4.0
+
+_configs = None
+_backends = None
+_lock = threading.Lock()
+
+class Backend:
+    def __init__(self, name, endpoint, api_key, deployment):
+        from openai import AzureOpenAI
+
+        self.name = name
+        self.deployment = deployment
+        self.client = AzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=endpoint,
+            api_version=AZURE_OPENAI_API_VERSION,
+            max_retries=0
+        )
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.throttled_until = 0.0
+        self.failures = 0
+        self.throttles = 0
+
+    def available(self, now):
+        return self.consecutive_failures < CIRCUIT_FAILURE_THRESHOLD or now >= self.open_until
+
+    def score(self):
+        if self.ewma_latency is None:
+            return 0.0 if self.failures == 0 else float("inf")
+        return self.ewma_latency * (1 + ERROR_RATE_PENALTY * self.error_rate)
+
+    def record_success(self, latency):
+        with _lock:
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency += POOL_EWMA_ALPHA * (latency - self.ewma_latency)
+            self.error_rate *= 1 - POOL_EWMA_ALPHA
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with _lock:
+            self.failures += 1
+            self.error_rate += POOL_EWMA_ALPHA * (1 - self.error_rate)
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                self.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+                logging.warning(f"Azure OpenAI backend {self.name} failing, circuit open for {CIRCUIT_COOLDOWN}s")
+
+    def record_throttle(self, delay):
+        """A 429 parks the backend for retry-after; it is out of quota, not failing, so
+        the error rate and circuit breaker are left alone"""
+        with _lock:
+            self.throttles += 1
+            self.throttled_until = max(self.throttled_until, time.monotonic() + delay)
+
+def _retry_after(headers, default=1.0):
+    """Delay a 429 asks for (Azure sends retry-after-ms as well as retry-after)"""
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name) if headers is not None else None
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    return default
+
+def _pool_configs(pool, default_key, default_deployment):
+    try:
+        entries = json.loads(pool)
+    except json.JSONDecodeError as e:
+        logging.error(f"AZURE_OPENAI_POOL is not valid JSON: {e}")
+        return []
+    if not isinstance(entries, list):
+        logging.error("AZURE_OPENAI_POOL must be a JSON list of endpoints")
+        return []
+
+    configs = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            logging.error(f"AZURE_OPENAI_POOL entry {index} is not an object, skipping it")
+            continue
+        api_key = entry.get("api_key") or default_key
+        deployment = entry.get("deployment") or default_deployment
+        if not (entry.get("endpoint") and api_key and deployment):
+            logging.error(f"AZURE_OPENAI_POOL entry {index} needs an endpoint, api_key and deployment, skipping it")
+            continue
+        configs.append((entry.get("name") or f"{deployment}-{index}", entry["endpoint"], api_key, deployment))
+    return configs
+
+def _backend_configs():
+    """(name, endpoint, api_key, deployment) of each usable backend, validated once per worker"""
+    global _configs
+    if _configs is None:
+        pool = os.getenv("AZURE_OPENAI_POOL")
+        default_key = os.getenv("AZURE_OPENAI_KEY")
+        default_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        configs = _pool_configs(pool, default_key, default_deployment) if pool else []
+        if not configs:
+            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+            if pool:
+                logging.error("AZURE_OPENAI_POOL has no usable entries, falling back to AZURE_OPENAI_ENDPOINT")
+            if all([default_key, endpoint, default_deployment]):
+                configs = [(default_deployment, endpoint, default_key, default_deployment)]
+        _configs = configs
+    return _configs
+
+def get_backends():
+    """The worker's backends, created on first use"""
+    global _backends
+    if _backends is None:
+        with _lock:
+            if _backends is None:
+                _backends = [Backend(*config) for config in _backend_configs()]
+                logging.info(f"Azure OpenAI pool created: {[backend.name for backend in _backends]}")
+    return _backends
+
+def is_configured():
+    return bool(_backend_configs())
+
+def _ranked(backends):
+    now = time.monotonic()
+    candidates = [backend for backend in backends if backend.available(now)] or backends
+    return sorted(candidates, key=lambda backend: (backend.throttled_until > now, backend.score()))
+
+def complete(messages, temperature=0.7, max_tokens=300):
+    """Chat completion on the best backend, failing over to the others"""
+    from openai import RateLimitError, APIConnectionError, InternalServerError
+
+    backends = get_backends()
+    if not backends:
+        raise Exception("Azure OpenAI credentials missing")
+
+    last_error = None
+    for _ in range(MAX_ATTEMPTS_PER_BACKEND * len(backends)):
+        backend = _ranked(backends)[0]
+        wait = backend.throttled_until - time.monotonic()
+        if wait > 0:
+            # Every backend is throttled; honor the shortest retry-after
+            time.sleep(wait)
+        started = time.monotonic()
+        try:
+            response = backend.client.chat.completions.create(
+                model=backend.deployment,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        except RateLimitError as e:
+            retry_after = _retry_after(e.response.headers)
+            logging.warning(f"Azure OpenAI backend {backend.name} throttled for {retry_after}s")
+            backend.record_throttle(retry_after)
+            last_error = e
+            continue
+        except (APIConnectionError, InternalServerError) as e:
+            logging.warning(f"Azure OpenAI backend {backend.name} failed: {e}")
+            backend.record_failure()
+            last_error = e
+            continue
+        backend.record_success(time.monotonic() - started)
+        return response.choices[0].message.content or ""
+    raise last_error
\ No newline at end of file
@@ -0,0 +1,76 @@
+import re
+import math
+import logging
+
+# Token counting and sentence-boundary chunking for summarization input.
+# Falls back to a 4-characters-per-token estimate when tiktoken or its
+# encoding file is not available on the worker. tiktoken is imported on the
+# first count, not at function load.
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            pass
+        except Exception as e:
+            logging.warning(f"Could not load tiktoken encoding, estimating tokens instead: {e}")
+    return _encoding
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+def split_sentences(text):
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+|\n+", text) if sentence.strip()]
+
+def token_windows(text, max_tokens):
+    """Cut text into consecutive pieces of at most max_tokens, dropping none of it"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        windows = [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+    else:
+        # Estimated tokens: cut every max_tokens * 4 characters, on a space when there is one
+        size = max(1, max_tokens * 4)
+        windows = []
+        start = 0
+        while start < len(text):
+            end = start + size
+            if end < len(text):
+                space = text.rfind(" ", start + size // 2, end)
+                if space != -1:
+                    end = space
+            windows.append(text[start:end])
+            start = end
+    return [window.strip() for window in windows if window.strip()]
+
+def chunk_text(text, max_tokens):
+    """Split text into consecutive chunks of at most max_tokens, between sentences"""
+    chunks = []
+    current = []
+    used = 0
+    for sentence in split_sentences(text):
+        cost = count_tokens(sentence) + 1
+        if current and used + cost > max_tokens:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        if cost > max_tokens:
+            # OCR lines are joined with spaces, so a "sentence" can run for pages:
+            # split it into token windows instead of cutting it short
+            chunks.extend(token_windows(sentence, max_tokens))
+            continue
+        current.append(sentence)
+        used += cost
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
\ No newline at end of file
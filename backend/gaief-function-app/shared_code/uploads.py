@@ -0,0 +1,91 @@
+import os
+import hashlib
+import tempfile
+
+# Uploaded files are copied out of the parsed form in UPLOAD_CHUNK_BYTES
+# pieces into a temp file while their SHA-256 is computed. Oversize and
+# non-PDF files are rejected as soon as a chunk shows it, and requests whose
+# Content-Length is already too big before the form is parsed. The Functions
+# host hands the worker the whole HTTP body, so that copy can't be avoided,
+# but no further full copies are made: OCR and blob uploads read the temp file.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+MULTIPART_OVERHEAD = 64 * 1024  # form fields and part headers around each file
+PDF_MAGIC = b"%PDF-"
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+class Upload:
+    """A received file in a temp file, with its size and SHA-256"""
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.size = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+        self._writer = tempfile.NamedTemporaryFile(prefix="gaief_upload_", suffix=".pdf", delete=False)
+        self.path = self._writer.name
+
+    def write(self, chunk):
+        self._writer.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        self._writer.close()
+        self.sha256 = self._hash.hexdigest()
+
+    def open(self):
+        """A new reader, so concurrent page-range requests don't share a file position"""
+        return open(self.path, "rb")
+
+    def chunks(self):
+        with self.open() as stream:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+
+    def close(self):
+        self._writer.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def check_content_length(req, max_files=1):
+    """Reject a request whose declared size can't fit max_files acceptable uploads"""
+    try:
+        declared = int(req.headers.get("content-length") or 0)
+    except ValueError:
+        return
+    if declared > max_files * (UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD):
+        raise UploadRejected(f"Upload is larger than {UPLOAD_MAX_BYTES} bytes per file", 413)
+
+def receive_chunks(chunks, filename=None):
+    """Spool an iterable of byte chunks into an Upload, validating it on the way"""
+    upload = Upload(filename)
+    try:
+        header = b""
+        for chunk in chunks:
+            if len(header) < len(PDF_MAGIC):
+                header += chunk[:len(PDF_MAGIC) - len(header)]
+                if not PDF_MAGIC.startswith(header):
+                    raise UploadRejected("Only PDF documents are accepted", 415)
+            if upload.size + len(chunk) > UPLOAD_MAX_BYTES:
+                raise UploadRejected(f"File is larger than {UPLOAD_MAX_BYTES} bytes", 413)
+            upload.write(chunk)
+        if header != PDF_MAGIC:
+            raise UploadRejected("Only PDF documents are accepted", 415)
+    except BaseException:
+        upload.close()
+        raise
+    upload.finish()
+    return upload
+
+def receive(file):
+    """Spool an uploaded form file (werkzeug FileStorage) into an Upload"""
+    return receive_chunks(iter(lambda: file.stream.read(UPLOAD_CHUNK_BYTES), b""), file.filename)
\ No newline at end of file
@@ -0,0 +1,65 @@
+import os
+import json
+import logging
+import typing
+import azure.functions as func
+
+from ..shared_code import job_store
+from ..shared_code import uploads
+
+# Upload step of the queued OCR pipeline: store every uploaded file, record the
+# job and enqueue one message per file for ocrJobWorker. Returns 202 straight
+# away; the caller polls ocrJobStatus for the results.
+OCR_JOB_MAX_FILES = int(os.getenv("OCR_JOB_MAX_FILES", "20"))
+
+def _json_response(data, status_code):
+    return func.HttpResponse(json.dumps(data), mimetype="application/json", status_code=status_code)
+
+def main(req: func.HttpRequest, msg: func.Out[typing.List[str]]) -> func.HttpResponse:
+    logging.info("=== submitOcrJob function triggered ===")
+    try:
+        uploads.check_content_length(req, max_files=OCR_JOB_MAX_FILES)
+    except uploads.UploadRejected as e:
+        return _json_response({"error": str(e)}, e.status_code)
+
+    # Every file of a multi-file upload, including repeated form fields
+    files = [file for field in req.files for file in req.files.getlist(field)]
+    logging.info(f"Files in request: {len(files)}")
+    if not files:
+        return _json_response({"error": "No file uploaded"}, 400)
+    if len(files) > OCR_JOB_MAX_FILES:
+        return _json_response({"error": f"At most {OCR_JOB_MAX_FILES} files per job"}, 400)
+
+    job_id = job_store.new_job_id()
+    entries = []
+    try:
+        for index, file in enumerate(files):
+            upload = uploads.receive(file)
+            try:
+                blob_name = job_store.save_upload(job_id, index, upload)
+            finally:
+                upload.close()
+            entries.append({"file_index": index, "filename": file.filename, "blob_name": blob_name, "size": upload.size})
+            logging.info(f"Stored {file.filename} ({upload.size} bytes) as {blob_name}")
+        job_store.create_job(job_id, entries)
+    except Exception as e:
+        # One bad file rejects the whole job; drop what was already stored
+        for entry in entries:
+            job_store.delete_upload(entry["blob_name"])
+        if isinstance(e, uploads.UploadRejected):
+            return _json_response({"error": f"{files[len(entries)].filename}: {str(e)}", "status": "rejected"}, e.status_code)
+        logging.error(f"Could not store OCR job {job_id}: {str(e)}")
+        return _json_response({"error": f"Could not store upload: {str(e)}", "status": "failed"}, 500)
+
+    # Queue messages are written once the function returns successfully
+    msg.set([
+        json.dumps({"job_id": job_id, "file_index": entry["file_index"], "blob_name": entry["blob_name"]})
+        for entry in entries
+    ])
+    logging.info(f"OCR job {job_id} queued with {len(entries)} files")
+    return _json_response({
+        "job_id": job_id,
+        "status": "queued",
+        "file_count": len(entries),
+        "status_url": f"/api/ocr-jobs/{job_id}"
+    }, 202)
\ No newline at end of file
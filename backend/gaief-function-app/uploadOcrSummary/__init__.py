@@ -1,13 +1,91 @@
 import os
+import re
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import azure.functions as func
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
+
+from ..shared_code import ocr_cache
+from ..shared_code import uploads
+from ..shared_code import openai_pool
+from ..shared_code.text_budget import count_tokens, chunk_text
+
+# Input budget for one summarization call (the prompt plus up to 300 output
+# tokens must fit the deployment's context window)
+SUMMARY_MAX_INPUT_TOKENS = int(os.getenv("SUMMARY_MAX_INPUT_TOKENS", "3000"))
+# Longer documents are summarized chunk by chunk in parallel (map), then the
+# chunk summaries are combined into the final summary (reduce)
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+
+# Large PDFs are analyzed in page ranges (the service's `pages` parameter)
+# that run concurrently; 0 disables splitting
+OCR_PAGES_PER_RANGE = int(os.getenv("OCR_PAGES_PER_RANGE", "10"))
+OCR_MAX_PARALLEL_RANGES = int(os.getenv("OCR_MAX_PARALLEL_RANGES", "4"))
+
+SUMMARY_SYSTEM_PROMPT = "You are a helpful assistant that summarizes student uploads."
+CHUNK_SYSTEM_PROMPT = (
+    "You are summarizing one part of a longer student upload. "
+    "List its key facts, definitions and examples concisely."
+)
+
+# One Document Intelligence client per worker process, created by the first
+# upload and reused by later invocations along with its connection pool. The
+# SDK is imported there too, so GET requests and cold starts never load it.
+_document_client = None
+_document_client_lock = threading.Lock()
+
+def get_document_client(endpoint, key):
+    global _document_client
+    if _document_client is None:
+        with _document_client_lock:
+            if _document_client is None:
+                from azure.ai.formrecognizer import DocumentAnalysisClient
+                from azure.core.credentials import AzureKeyCredential
+                _document_client = DocumentAnalysisClient(
+                    endpoint=endpoint,
+                    credential=AzureKeyCredential(key)
+                )
+                logging.info("DocumentAnalysisClient created")
+    return _document_client
+
+_PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?!s)")
+_PAGE_SCAN_OVERLAP = 64  # bytes carried between chunks so no page object is split
+
+def _count_pdf_pages(upload):
+    """Page count from the PDF's page objects, or 0 when it cannot be told cheaply"""
+    # Page objects inside compressed object streams are not visible here;
+    # those files are simply analyzed in one call
+    count = 0
+    buffer = b""
+    for chunk in upload.chunks():
+        buffer += chunk
+        # Matches starting in the carried-over tail are counted with the next chunk
+        limit = len(buffer) - _PAGE_SCAN_OVERLAP
+        count += sum(1 for match in _PAGE_OBJECT.finditer(buffer) if match.start() < limit)
+        buffer = buffer[max(limit, 0):]
+    return count + len(_PAGE_OBJECT.findall(buffer))
+
+def _page_ranges(page_count):
+    if OCR_PAGES_PER_RANGE <= 0:
+        return []
+    return [
+        f"{start}-{min(start + OCR_PAGES_PER_RANGE - 1, page_count)}"
+        for start in range(1, page_count + 1, OCR_PAGES_PER_RANGE)
+    ]
+
+def _analyze(client, upload, pages=None):
+    # The file is streamed from disk; every range reads through its own handle
+    with upload.open() as stream:
+        poller = client.begin_analyze_document("prebuilt-document", document=stream, pages=pages)
+    result = poller.result()
+    logging.info(f"Document analysis completed for pages {pages or 'all'}. Pages found: {len(result.pages)}")
+    return "\n".join(line.content for page in result.pages for line in page.lines)
 
 # OCR Function using Azure Document Intelligence
-def extract_text_from_file(file_data):
+def iter_text_ranges(upload):
+    """Yield the OCR text of an uploads.Upload one page range at a time, in page order"""
     logging.info("Starting OCR text extraction")
     
     endpoint = os.getenv("FORM_RECOGNIZER_ENDPOINT")
@@ -20,75 +98,100 @@ def extract_text_from_file(file_data):
         logging.error("FORM_RECOGNIZER credentials missing")
         raise Exception("FORM_RECOGNIZER credentials missing")
 
+    document_key = upload.sha256
+    cached_text = ocr_cache.get(document_key)
+    if cached_text is not None:
+        logging.info(f"OCR cache hit for document {document_key[:12]}, stats: {ocr_cache.get_stats()}")
+        yield cached_text
+        return
+
     try:
-        client = DocumentAnalysisClient(
-            endpoint=endpoint,
-            credential=AzureKeyCredential(key)
-        )
-        logging.info("DocumentAnalysisClient created successfully")
+        client = get_document_client(endpoint, key)
 
-        poller = client.begin_analyze_document("prebuilt-document", document=file_data)
-        logging.info("Document analysis started")
-        
-        result = poller.result()
-        logging.info(f"Document analysis completed. Pages found: {len(result.pages)}")
-
-        full_text = ""
-        line_count = 0
-        for page_idx, page in enumerate(result.pages):
-            logging.info(f"Processing page {page_idx + 1}, lines: {len(page.lines)}")
-            for line in page.lines:
-                full_text += line.content + "\n"
-                line_count += 1
-
-        logging.info(f"Text extraction completed. Total lines: {line_count}, Total characters: {len(full_text)}")
-        return full_text
+        parts = []
+        ranges = _page_ranges(_count_pdf_pages(upload))
+        if len(ranges) < 2:
+            parts.append(_analyze(client, upload))
+            yield parts[-1]
+        else:
+            logging.info(f"Analyzing {len(ranges)} page ranges, up to {OCR_MAX_PARALLEL_RANGES} at a time")
+            with ThreadPoolExecutor(max_workers=OCR_MAX_PARALLEL_RANGES) as executor:
+                futures = [executor.submit(_analyze, client, upload, pages) for pages in ranges]
+                # Hand each range on as soon as it and every range before it are done
+                for future in futures:
+                    parts.append(future.result())
+                    yield parts[-1]
+
+        full_text = "\n".join(parts)
+        logging.info(f"Text extraction completed. Ranges: {len(parts)}, Total characters: {len(full_text)}")
+        ocr_cache.put(document_key, full_text)
         
     except Exception as e:
         logging.error(f"OCR extraction failed: {str(e)}")
         raise Exception(f"OCR extraction failed: {str(e)}")
 
+def extract_text_from_file(upload):
+    return "\n".join(iter_text_ranges(upload))
+
+def _complete(system_prompt, text, max_tokens=300):
+    return openai_pool.complete(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+        temperature=0.7,
+        max_tokens=max_tokens
+    )
+
+def _join_notes(summaries):
+    notes = "\n\n".join(summary for summary in summaries if summary)
+    if not notes:
+        raise Exception("Every chunk summary came back empty")
+    return notes
+
+def _reduce_to_budget(text):
+    """Map-reduce text down to SUMMARY_MAX_INPUT_TOKENS with parallel chunk summaries.
+
+    Rounds repeat until the notes fit; each one shrinks them (a chunk of up to
+    SUMMARY_CHUNK_TOKENS becomes at most 300 tokens), so nothing is cut off.
+    """
+    round_number = 0
+    tokens = count_tokens(text)
+    while tokens > SUMMARY_MAX_INPUT_TOKENS:
+        round_number += 1
+        chunks = chunk_text(text, SUMMARY_CHUNK_TOKENS)
+        logging.info(f"Map-reduce round {round_number}: summarizing {len(chunks)} chunks with {SUMMARY_MAX_WORKERS} workers")
+        with ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS) as executor:
+            # map() keeps the chunk summaries in document order
+            summaries = list(executor.map(
+                lambda chunk: _complete(CHUNK_SYSTEM_PROMPT, chunk), chunks
+            ))
+        text = _join_notes(summaries)
+        reduced_tokens = count_tokens(text)
+        if reduced_tokens >= tokens:
+            raise Exception(f"Map-reduce round {round_number} did not shrink the notes ({tokens} -> {reduced_tokens} tokens)")
+        tokens = reduced_tokens
+    return text
+
+def _require_openai():
+    logging.info(f"OpenAI pool configured: {openai_pool.is_configured()}")
+    if not openai_pool.is_configured():
+        logging.error("Azure OpenAI credentials missing")
+        raise Exception("Azure OpenAI credentials missing")
+
 # Azure OpenAI Summarization (New syntax for openai>=1.0.0)
 def summarize_text(text):
     logging.info("Starting text summarization")
-    
-    api_key = os.getenv("AZURE_OPENAI_KEY")
-    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-    
-    logging.info(f"OpenAI endpoint configured: {bool(endpoint)}")
-    logging.info(f"OpenAI key configured: {bool(api_key)}")
-    logging.info(f"OpenAI deployment configured: {bool(deployment)}")
     logging.info(f"Text length to summarize: {len(text)} characters")
 
-    if not all([api_key, endpoint, deployment]):
-        logging.error("Azure OpenAI credentials missing")
-        raise Exception("Azure OpenAI credentials missing")
-
     try:
-        client = AzureOpenAI(
-            api_key=api_key,
-            azure_endpoint=endpoint,
-            api_version="2024-02-15-preview"
-        )
-        logging.info("AzureOpenAI client created successfully")
-
-        # Truncate text if too long
-        max_chars = 4000
-        text_to_summarize = text[:max_chars] if len(text) > max_chars else text
-        logging.info(f"Text truncated to {len(text_to_summarize)} characters for summarization")
-
-        response = client.chat.completions.create(
-            model=deployment,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes student uploads."},
-                {"role": "user", "content": text_to_summarize}
-            ],
-            temperature=0.7,
-            max_tokens=300
-        )
-        
-        summary = response.choices[0].message.content
+        _require_openai()
+
+        # Condense long documents instead of dropping everything past the budget
+        text_to_summarize = _reduce_to_budget(text)
+        logging.info(f"Summarization input: {count_tokens(text_to_summarize)} tokens ({len(text_to_summarize)} of {len(text)} characters)")
+
+        summary = _complete(SUMMARY_SYSTEM_PROMPT, text_to_summarize)
         logging.info(f"Summarization completed. Summary length: {len(summary)} characters")
         return summary
         
@@ -96,38 +199,104 @@ def summarize_text(text):
         logging.error(f"Summarization failed: {str(e)}")
         raise Exception(f"Summarization failed: {str(e)}")
 
+def summarize_ranges(range_texts):
+    """Summarize OCR output while it is still arriving. Returns (full_text, summary)
+
+    Once the text seen so far is over the input budget, map-reduce is certain,
+    so chunk summaries start on the early ranges while later pages are still
+    being analyzed.
+    """
+    parts = []
+    note_futures = []
+    used_tokens = 0
+    mapping = False
+
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAX_WORKERS) as executor:
+        for text in range_texts:
+            parts.append(text)
+            used_tokens += count_tokens(text)
+            if not mapping and used_tokens <= SUMMARY_MAX_INPUT_TOKENS:
+                continue
+            if not mapping:
+                _require_openai()
+                logging.info("Document is over the summarization budget, summarizing ranges as they arrive")
+            to_map = parts if not mapping else [text]
+            mapping = True
+            for part in to_map:
+                for chunk in chunk_text(part, SUMMARY_CHUNK_TOKENS):
+                    note_futures.append(executor.submit(_complete, CHUNK_SYSTEM_PROMPT, chunk))
+
+        full_text = "\n".join(parts)
+        if not mapping:
+            return full_text, summarize_text(full_text)
+        notes = _join_notes(future.result() for future in note_futures)
+
+    try:
+        text_to_summarize = _reduce_to_budget(notes)
+        logging.info(f"Summarization input: {count_tokens(text_to_summarize)} tokens of notes from {len(note_futures)} chunks")
+        summary = _complete(SUMMARY_SYSTEM_PROMPT, text_to_summarize)
+        logging.info(f"Summarization completed. Summary length: {len(summary)} characters")
+        return full_text, summary
+    except Exception as e:
+        logging.error(f"Summarization failed: {str(e)}")
+        raise Exception(f"Summarization failed: {str(e)}")
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info("=== uploadOCRSummary function triggered ===")
     logging.info(f"Request method: {req.method}")
     logging.info(f"Request URL: {req.url}")
-    logging.info(f"Request headers: {dict(req.headers)}")
     
     try:
         if req.method == 'POST':
             logging.info("Processing POST request")
+
+            # Refuse oversize bodies before the multipart form is parsed
+            try:
+                uploads.check_content_length(req)
+            except uploads.UploadRejected as e:
+                return func.HttpResponse(json.dumps({"error": str(e)}), mimetype="application/json", status_code=e.status_code)
             
             # Handle file upload
-            files = req.files
-            logging.info(f"Files in request: {len(files) if files else 0}")
+            files = [file for field in req.files for file in req.files.getlist(field)] if req.files else []
+            logging.info(f"Files in request: {len(files)}")
+
+            if len(files) > 1:
+                # Several files would not finish within one synchronous call;
+                # refuse them instead of summarizing only the first
+                logging.warning(f"Rejected {len(files)} files, this endpoint takes one")
+                return func.HttpResponse(
+                    json.dumps({
+                        "error": "Upload one file per request, or submit several to /api/ocr-jobs",
+                        "status": "rejected"
+                    }),
+                    mimetype="application/json",
+                    status_code=400
+                )
             
             if files:
                 logging.info("File upload detected")
                 
                 # Process file
-                file = next(iter(files.values()))
+                file = files[0]
                 logging.info(f"Processing file: {file.filename}")
                 logging.info(f"File content type: {file.content_type}")
                 
-                file_content = file.read()
-                logging.info(f"File read successfully. Size: {len(file_content)} bytes")
+                try:
+                    upload = uploads.receive(file)
+                except uploads.UploadRejected as e:
+                    logging.warning(f"Upload rejected: {str(e)}")
+                    return func.HttpResponse(
+                        json.dumps({"error": str(e), "filename": file.filename, "status": "rejected"}),
+                        mimetype="application/json",
+                        status_code=e.status_code
+                    )
+                logging.info(f"File received. Size: {upload.size} bytes")
                 
                 try:
-                    # Extract text and summarize
-                    logging.info("Starting text extraction...")
-                    extracted_text = extract_text_from_file(file_content)
-                    
-                    logging.info("Starting summarization...")
-                    summary = summarize_text(extracted_text)
+                    # Extract text and summarize; summarization of long
+                    # documents overlaps with OCR of their later pages
+                    logging.info("Starting text extraction and summarization...")
+                    extracted_text, summary = summarize_ranges(iter_text_ranges(upload))
                     
                     response_data = {
                         "message": "Document processed successfully",
@@ -156,6 +325,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                         mimetype="application/json",
                         status_code=500
                     )
+                finally:
+                    upload.close()
             else:
                 logging.warning("No files found in POST request")
                 return func.HttpResponse(
@@ -172,9 +343,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 "description": "Upload documents for OCR and AI summarization",
                 "method": "POST",
                 "expected_content": "multipart/form-data with file",
+                "ocr_cache": ocr_cache.get_stats(),
                 "environment_check": {
                     "form_recognizer_configured": bool(os.getenv("FORM_RECOGNIZER_ENDPOINT") and os.getenv("FORM_RECOGNIZER_KEY")),
-                    "openai_configured": bool(os.getenv("AZURE_OPENAI_ENDPOINT") and os.getenv("AZURE_OPENAI_KEY") and os.getenv("AZURE_OPENAI_DEPLOYMENT"))
+                    "openai_configured": openai_pool.is_configured()
                 }
             }),
             mimetype="application/json",
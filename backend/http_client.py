@@ -0,0 +1,110 @@
+import os
+import asyncio
+import logging
+
+import httpx
+
+from retry_after import retry_after_seconds
+
+# One keep-alive async HTTP client for the Azure REST calls that don't go
+# through an SDK (Document Intelligence). It is created in the app lifespan and
+# shared by every request, so OCR submits and polls reuse pooled (HTTP/2 when
+# the server offers it) connections instead of a new TCP+TLS handshake each.
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+# A POST (e.g. Document Intelligence analyze) may already have been accepted
+# and billed when a timeout or 5xx comes back, so it is only retried when the
+# server certainly did not act on it: a 429, or a connection that never opened.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRY_BACKOFF = 0.5  # seconds, doubled per attempt when the server gives no Retry-After
+
+client = None
+http2_enabled = False
+stats = {"requests": 0, "retries": 0, "failures": 0}
+
+def init_http_client():
+    """Create the shared client (called once at startup)"""
+    global client, http2_enabled
+    if client is not None:
+        return client
+    try:
+        import h2  # noqa: F401  HTTP/2 support is an optional httpx extra
+        http2 = HTTP_HTTP2
+    except ImportError:
+        http2 = False
+        if HTTP_HTTP2:
+            logging.warning("h2 package not installed, shared HTTP client will use HTTP/1.1")
+    client = httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        # Failed connection attempts are retried inside the transport; statuses in request()
+        transport=httpx.AsyncHTTPTransport(
+            http2=http2,
+            retries=1,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    )
+    http2_enabled = http2
+    logging.info(f"Shared HTTP client initialized (http2: {http2})")
+    return client
+
+async def close_http_client():
+    """Close the shared client and its connection pool (called at shutdown)"""
+    global client
+    if client is not None:
+        await client.aclose()
+        logging.info("Shared HTTP client closed")
+    client = None
+
+async def _stream(document):
+    for chunk in document.chunks():
+        yield chunk
+
+async def request(method, url, document=None, headers=None, retries=HTTP_MAX_RETRIES):
+    """Send a request on the shared client, retrying throttling, 5xx and transport errors.
+
+    Non-idempotent methods are only retried on 429 and on errors raised
+    before the request was sent (see IDEMPOTENT_METHODS).
+
+    document is bytes or an uploads.Upload, which is streamed from its spool
+    (and re-streamed from the start on a retry). Waits honor Retry-After.
+    """
+    if client is None:
+        raise Exception("Shared HTTP client not initialized")
+    headers = dict(headers or {})
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    for attempt in range(retries + 1):
+        content = document
+        if hasattr(document, "chunks"):
+            headers["Content-Length"] = str(len(document))
+            content = _stream(document)
+        stats["requests"] += 1
+        try:
+            response = await client.request(method, url, content=content, headers=headers)
+        except httpx.TransportError as e:
+            if attempt == retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                stats["failures"] += 1
+                raise
+            delay = RETRY_BACKOFF * 2 ** attempt
+            logging.warning(f"{method} {url.split('?')[0]} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+        else:
+            retryable = response.status_code in RETRY_STATUSES if idempotent else response.status_code == 429
+            if not retryable or attempt == retries:
+                return response
+            delay = retry_after_seconds(response.headers, default=RETRY_BACKOFF * 2 ** attempt)
+            logging.warning(f"{method} {url.split('?')[0]} returned {response.status_code}, retrying in {delay:.1f}s")
+        stats["retries"] += 1
+        await asyncio.sleep(delay)
+
+def get_stats():
+    return dict(stats, http2=http2_enabled, initialized=client is not None)
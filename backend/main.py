@@ -1,44 +1,62 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 from pydantic import BaseModel
+from typing import Optional
 import os
-import requests
 import time
+import asyncio
 import logging
 import json
 
-from prompt_router import get_prompt
+import openai_client
+import doc_intelligence
+import ocr_jobs
+import ocr_cache
+import completion_cache
+import cosmos_client
+import chat_writer
+import rate_limiter
+import conversation_memory
+import semantic_cache
+import document_index
+import uploads
+import http_client
+import metrics
+import prompt_router
+from prompt_router import build_prompt
 from routes.student_routes import router as student_router
 from routes.teacher_routes import router as teacher_router
 from routes.parent_routes import router as parent_router
-from cosmos_client import save_chat_to_cosmos, get_chat_history_from_user, create_chat_container_if_not_exists
+from cosmos_client import get_chat_history_from_user, create_chat_container_if_not_exists, create_cache_container_if_not_exists
 
-# Initialize Azure OpenAI client with error handling
-try:
-    from openai import AzureOpenAI
-    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    api_key = os.getenv("AZURE_OPENAI_API_KEY")
-    
-    if azure_endpoint and api_key:
-        client = AzureOpenAI(
-            api_key=api_key,
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01"),
-            azure_endpoint=azure_endpoint
-        )
-        print("Azure OpenAI client initialized successfully")
-    else:
-        client = None
-        print("WARNING: Azure OpenAI credentials not configured")
-except Exception as e:
-    client = None
-    print(f"Error initializing Azure OpenAI client: {e}")
-
-doc_intel_endpoint = os.getenv("DOC_INTELLIGENCE_ENDPOINT")
-doc_intel_key = os.getenv("DOC_INTELLIGENCE_KEY")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled async OpenAI client, HTTP client and Cosmos client per worker,
+    # shared by all requests
+    openai_client.init_openai_client()
+    http_client.init_http_client()
+    await asyncio.to_thread(prompt_router.load_encodings)
+    if await cosmos_client.init_cosmos():
+        await create_chat_container_if_not_exists()
+        await cosmos_client.load_partition_keys()
+        if completion_cache.COMPLETION_CACHE_SHARED == "cosmos":
+            await create_cache_container_if_not_exists(completion_cache.COMPLETION_CACHE_CONTAINER)
+    await ocr_jobs.start_workers()
+    await chat_writer.start()
+    try:
+        yield
+    finally:
+        await ocr_jobs.stop_workers()
+        await conversation_memory.stop()
+        await chat_writer.stop()
+        await cosmos_client.close_cosmos()
+        await openai_client.close_openai_client()
+        await http_client.close_http_client()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,6 +66,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    """Refuse uploads whose Content-Length is over the limit before the body is parsed"""
+    if request.url.path in uploads.UPLOAD_PATHS and uploads.declared_too_large(request.headers):
+        return JSONResponse(status_code=413, content={"error": f"Upload is larger than {uploads.UPLOAD_MAX_BYTES} bytes"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    """Label downstream metrics with the matched route and time the request"""
+    endpoint = metrics.route_template(app.router.routes, request.scope)
+    token = metrics.current_endpoint.set(endpoint)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.current_endpoint.reset(token)
+    metrics.observe_request(endpoint, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
 # Include all API routes
 app.include_router(student_router, prefix="/api/v1")
 app.include_router(teacher_router, prefix="/api/v1")
@@ -57,111 +95,264 @@ class ChatRequest(BaseModel):
     user_role: str
     topic: str
     context: str
+    bypass_cache: bool = False
+    # An uploaded document (document_id from /upload-test or /upload-jobs) to answer from
+    document_id: Optional[str] = None
+
+def extract_user_id(context):
+    """Extract user_id from the chat context (JSON profile or raw id)"""
+    try:
+        context_data = json.loads(context)
+        return context_data.get("userId") or context_data.get("id", "unknown")
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return context if context else "unknown"
+
+async def with_document_excerpts(req, user_id):
+    """The request context plus the parts of its document relevant to the question"""
+    if not req.document_id:
+        return req.context
+    excerpts = await document_index.relevant_excerpts(user_id, req.document_id, req.topic)
+    return f"{req.context}\n\nRelevant excerpts from the uploaded document:\n{excerpts}"
+
+def sse_event(data, event=None):
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 @app.get("/health")
 async def health():
     return {
         "status": "healthy",
-        "azure_openai_configured": client is not None,
+        "azure_openai_configured": openai_client.is_configured(),
         "frontend_available": os.path.exists("frontend"),
-        "doc_intelligence_configured": bool(doc_intel_endpoint and doc_intel_key)
+        "doc_intelligence_configured": doc_intelligence.is_configured()
     }
 
 @app.post("/chat")
 async def chat_endpoint(req: ChatRequest):
+    metrics.set_role(req.user_role)
     logging.info(f"=== CHAT ENDPOINT CALLED ===")
     logging.info(f"user_role: {req.user_role}")
     logging.info(f"topic: {req.topic}")
     logging.info(f"context: {req.context}")
     
-    if not client:
+    if not openai_client.is_configured():
         return {"error": "Azure OpenAI client not configured - check environment variables"}
     
     try:
-        prompt = get_prompt(req.user_role, req.topic, req.context)
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=500
-        )
-        
-        ai_reply = response.choices[0].message.content
-        logging.info(f"AI Reply generated: {ai_reply[:100]}...")
-        
-        # Extract user_id from context
-        try:
-            context_data = json.loads(req.context)
-            user_id = context_data.get("userId") or context_data.get("id", "unknown")
-        except (json.JSONDecodeError, TypeError):
-            user_id = req.context if req.context else "unknown"
-        
+        user_id = extract_user_id(req.context)
         logging.info(f"Final user_id for saving: {user_id}")
-        
-        # Save chat using the simple function
-        try:
-            chat_saved = save_chat_to_cosmos(
-                user_id=user_id,
-                user_role=req.user_role,
-                question=req.topic,
-                answer=ai_reply
+
+        # Earlier turns: rolling summary plus the last few exchanges verbatim
+        memory, context = await asyncio.gather(
+            conversation_memory.load(user_id),
+            with_document_excerpts(req, user_id)
+        )
+        history = conversation_memory.format_history(memory, openai_client.AZURE_OPENAI_DEPLOYMENT)
+        prompt, prompt_info = build_prompt(
+            req.user_role, req.topic, context,
+            deployment=openai_client.AZURE_OPENAI_DEPLOYMENT, max_completion_tokens=500,
+            history=history
+        )
+        logging.info(f"Prompt tokens: {prompt_info['prompt_tokens']} (history: {prompt_info['history_tokens']}, context truncated: {prompt_info['context_truncated']})")
+
+        # Paraphrases of an earlier question reuse its answer; then the exact-prompt cache
+        namespace = semantic_cache.namespace_key(req.user_role, req.context, history, req.document_id)
+        question_vector, ai_reply = None, None
+        if semantic_cache.is_enabled() and not req.bypass_cache:
+            question_vector, ai_reply = await semantic_cache.lookup(namespace, req.topic)
+        cache_hit = ai_reply is not None
+        if not cache_hit:
+            ai_reply, cache_hit = await completion_cache.cached_completion(
+                req.user_role, prompt, temperature=0.7, max_tokens=500, bypass=req.bypass_cache
             )
-            logging.info(f"Chat save result: {chat_saved}")
-            
-        except Exception as save_error:
-            logging.error(f"FAILED TO SAVE CHAT: {save_error}")
-            chat_saved = False
+            semantic_cache.store(namespace, req.user_role, question_vector, req.topic, ai_reply)
+        logging.info(f"AI Reply generated (cache hit: {cache_hit}): {ai_reply[:100]}...")
+        
+        # Queue the chat for write-behind persistence; don't wait on Cosmos
+        chat_saved = chat_writer.enqueue(
+            user_id=user_id,
+            user_role=req.user_role,
+            question=req.topic,
+            answer=ai_reply
+        )
+        logging.info(f"Chat queued for saving: {chat_saved}")
+        turn = conversation_memory.remember_turn(user_id, req.topic, ai_reply)
+        conversation_memory.schedule_fold(user_id, req.user_role, memory, turn)
         
         return {
             "reply": ai_reply, 
             "user_id": user_id, 
-            "chat_saved": chat_saved
+            "chat_saved": chat_saved,
+            "cached": cache_hit,
+            "prompt_tokens": prompt_info["prompt_tokens"],
+            "history_tokens": prompt_info["history_tokens"],
+            "context_truncated": prompt_info["context_truncated"]
         }
         
+    except document_index.DocumentNotFound:
+        return {"error": f"Document {req.document_id} not found, upload it again"}
+    except rate_limiter.RateLimitTimeout as e:
+        logging.warning(f"Chat endpoint rate limited: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail="The AI service is busy, please try again shortly",
+            headers={"Retry-After": str(max(1, round(e.retry_after or 1)))}
+        )
     except Exception as e:
         logging.error(f"Chat endpoint error: {str(e)}")
         return {"error": f"Chat error: {str(e)}"}
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """Stream the reply as server-sent events, then save the full answer"""
+    metrics.set_role(req.user_role)
+    if not openai_client.is_configured():
+        return {"error": "Azure OpenAI client not configured - check environment variables"}
+
+    user_id = extract_user_id(req.context)
+    try:
+        memory, context = await asyncio.gather(
+            conversation_memory.load(user_id),
+            with_document_excerpts(req, user_id)
+        )
+    except document_index.DocumentNotFound:
+        return {"error": f"Document {req.document_id} not found, upload it again"}
+    history = conversation_memory.format_history(memory, openai_client.AZURE_OPENAI_DEPLOYMENT)
+    prompt, prompt_info = build_prompt(
+        req.user_role, req.topic, context,
+        deployment=openai_client.AZURE_OPENAI_DEPLOYMENT, max_completion_tokens=500,
+        history=history
+    )
+    namespace = semantic_cache.namespace_key(req.user_role, req.context, history, req.document_id)
+
+    cache_key = completion_cache.cache_key(openai_client.AZURE_OPENAI_DEPLOYMENT, prompt, 0.7, 500)
+
+    async def event_stream():
+        cached_reply = None
+        question_vector = None
+        if semantic_cache.is_enabled() and not req.bypass_cache:
+            question_vector, cached_reply = await semantic_cache.lookup(namespace, req.topic)
+        if cached_reply is None and completion_cache.COMPLETION_CACHE_ENABLED and not req.bypass_cache:
+            cached_reply = await completion_cache.get(req.user_role, cache_key)
+
+        parts = []
+        if cached_reply is not None:
+            parts.append(cached_reply)
+            yield sse_event({"delta": cached_reply})
+        else:
+            try:
+                async for delta in openai_client.stream_chat(prompt, temperature=0.7, max_tokens=500, role=req.user_role):
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            except Exception as e:
+                logging.error(f"Chat stream error: {str(e)}")
+                yield sse_event({"error": f"Chat error: {str(e)}"}, event="error")
+                return
+
+        ai_reply = "".join(parts)
+        if cached_reply is None:
+            if completion_cache.COMPLETION_CACHE_ENABLED:
+                await completion_cache.put(req.user_role, cache_key, ai_reply)
+            semantic_cache.store(namespace, req.user_role, question_vector, req.topic, ai_reply)
+        chat_saved = chat_writer.enqueue(
+            user_id=user_id,
+            user_role=req.user_role,
+            question=req.topic,
+            answer=ai_reply
+        )
+        turn = conversation_memory.remember_turn(user_id, req.topic, ai_reply)
+        conversation_memory.schedule_fold(user_id, req.user_role, memory, turn)
+
+        yield sse_event({
+            "user_id": user_id,
+            "chat_saved": chat_saved,
+            "cached": cached_reply is not None,
+            "prompt_tokens": prompt_info["prompt_tokens"],
+            "history_tokens": prompt_info["history_tokens"],
+            "context_truncated": prompt_info["context_truncated"]
+        }, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/upload-test")
-async def upload_test(file: UploadFile = File(...), role: str = Form(...), topic: str = Form(...)):
-    if not client:
+async def upload_test(file: UploadFile = File(...), role: str = Form(...), topic: str = Form(...), user_id: str = Form(None)):
+    metrics.set_role(role)
+    if not openai_client.is_configured():
         return {"error": "Azure OpenAI client not configured"}
     
-    if not (doc_intel_endpoint and doc_intel_key):
+    if not doc_intelligence.is_configured():
         return {"error": "Document Intelligence not configured"}
     
     try:
-        # Send to Azure Document Intelligence
-        ocr_url = f"{doc_intel_endpoint}/formrecognizer/documentModels/prebuilt-layout:analyze?api-version=2023-07-31"
-        headers = {
-            "Content-Type": "application/pdf",
-            "Ocp-Apim-Subscription-Key": doc_intel_key
-        }
-        content = await file.read()
-        response = requests.post(ocr_url, headers=headers, data=content)
-        result_url = response.headers.get("operation-location")
-
-        # Wait and fetch result
-        for _ in range(10):
-            time.sleep(2)
-            poll = requests.get(result_url, headers={"Ocp-Apim-Subscription-Key": doc_intel_key}).json()
-            if poll.get("status") == "succeeded":
-                full_text = " ".join([line['content'] for page in poll['analyzeResult']['pages'] for line in page['lines']])
-                break
-        else:
-            return {"error": "OCR timed out"}
-
-        # Route to Azure OpenAI
-        prompt = get_prompt(role, topic, full_text[:5000])
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=500
-        )
-        return {"reply": response.choices[0].message.content, "extracted_text": full_text[:500]}
+        upload = await uploads.receive(file)
+    except uploads.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        return await ocr_jobs.process_document(upload, role, topic, user_id=user_id)
+    except TimeoutError:
+        return {"error": "OCR timed out"}
     except Exception as e:
         return {"error": f"Processing error: {str(e)}"}
+    finally:
+        upload.close()
+
+@app.post("/upload-jobs", status_code=202)
+async def submit_upload_job(file: UploadFile = File(...), role: str = Form(...), topic: str = Form(...), user_id: str = Form(None)):
+    """Queue a document for OCR and summarization and return its job id; with user_id it is also indexed for /chat"""
+    metrics.set_role(role)
+    if not openai_client.is_configured():
+        return {"error": "Azure OpenAI client not configured"}
+
+    if not doc_intelligence.is_configured():
+        return {"error": "Document Intelligence not configured"}
+
+    try:
+        upload = await uploads.receive(file)
+    except uploads.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        job = ocr_jobs.submit_job(upload, role, topic, user_id=user_id)
+    except ocr_jobs.JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/upload-jobs/{job['job_id']}",
+        "result_url": f"/upload-jobs/{job['job_id']}/result"
+    }
+
+@app.get("/upload-jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Current status of an upload job"""
+    job = ocr_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {key: job[key] for key in ("job_id", "status", "filename", "created_at", "updated_at", "error")}
+
+@app.get("/upload-jobs/{job_id}/result")
+async def get_upload_job_result(job_id: str, wait: float = 0):
+    """Result of an upload job; wait=N long-polls up to N seconds for it to finish"""
+    if wait > 0:
+        job = await ocr_jobs.wait_for_job(job_id, min(wait, 60))
+    else:
+        job = ocr_jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] == "failed":
+        return {"job_id": job_id, "status": "failed", "error": job["error"]}
+    if job["status"] != "succeeded":
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"]})
+    return dict(job["result"], job_id=job_id, status="succeeded")
+
+@app.get("/documents/{user_id}")
+async def list_user_documents(user_id: str):
+    """Documents indexed for a user, usable as document_id in /chat"""
+    return {"user_id": user_id, "documents": await document_index.list_documents(user_id)}
 
 # Mount static files for frontend
 if os.path.exists("frontend"):
@@ -179,7 +370,7 @@ async def root():
         return {
             "message": "GAIEF Demo API is running!", 
             "status": "healthy",
-            "azure_openai_configured": client is not None,
+            "azure_openai_configured": openai_client.is_configured(),
             "frontend_available": os.path.exists("frontend")
         }
 
@@ -196,7 +387,7 @@ async def debug_cosmos():
             try:
                 container = get_container(container_name)
                 query = "SELECT TOP 3 * FROM c"
-                items = list(container.query_items(query, enable_cross_partition_query=True))
+                items = [item async for item in container.query_items(query)]
                 results[container_name] = {
                     "count": len(items),
                     "sample_data": items
@@ -223,22 +414,22 @@ async def debug_student(student_id: str):
         
         # Query 1: By userId
         query1 = f"SELECT * FROM c WHERE c.userId = '{student_id}'"
-        items1 = list(container.query_items(query1, enable_cross_partition_query=True))
+        items1 = [item async for item in container.query_items(query1)]
         results["query_by_userId"] = items1
         
         # Query 2: By id
         query2 = f"SELECT * FROM c WHERE c.id = '{student_id}'"
-        items2 = list(container.query_items(query2, enable_cross_partition_query=True))
+        items2 = [item async for item in container.query_items(query2)]
         results["query_by_id"] = items2
         
         # Query 3: Get all students (first 5)
         query3 = "SELECT TOP 5 * FROM c"
-        items3 = list(container.query_items(query3, enable_cross_partition_query=True))
+        items3 = [item async for item in container.query_items(query3)]
         results["all_students_sample"] = items3
         
         # Query 4: Search partial match
         query4 = f"SELECT * FROM c WHERE CONTAINS(c.id, '{student_id}') OR CONTAINS(c.userId, '{student_id}')"
-        items4 = list(container.query_items(query4, enable_cross_partition_query=True))
+        items4 = [item async for item in container.query_items(query4)]
         results["partial_match"] = items4
         
         return {
@@ -250,6 +441,69 @@ async def debug_student(student_id: str):
     except Exception as e:
         return {"error": f"Debug failed: {str(e)}"}
 
+@app.get("/debug/ocr-cache")
+async def debug_ocr_cache():
+    """OCR result cache hit/miss counters"""
+    return ocr_cache.get_stats()
+
+@app.get("/debug/completion-cache")
+async def debug_completion_cache():
+    """Completion cache hit/miss counters"""
+    return completion_cache.get_stats()
+
+@app.get("/debug/conversation-memory")
+async def debug_conversation_memory():
+    """Rolling conversation summary counters"""
+    return conversation_memory.get_stats()
+
+@app.get("/debug/conversation-memory/{user_id}")
+async def debug_conversation_memory_user(user_id: str):
+    """The summary and recent turns the next /chat for this user would see"""
+    memory = await conversation_memory.load(user_id)
+    return dict(memory, prompt_history=conversation_memory.format_history(memory, openai_client.AZURE_OPENAI_DEPLOYMENT))
+
+@app.get("/debug/openai-pool")
+async def debug_openai_pool():
+    """Per-backend latency, error rate and circuit state of the Azure OpenAI pool"""
+    return openai_client.get_stats()
+
+@app.get("/debug/rate-limiter")
+async def debug_rate_limiter():
+    """Azure OpenAI rate limiter queue and bucket levels"""
+    return rate_limiter.get_stats()
+
+@app.get("/debug/semantic-cache")
+async def debug_semantic_cache():
+    """Semantic answer cache hit rate and size"""
+    return semantic_cache.get_stats()
+
+@app.get("/debug/document-index")
+async def debug_document_index():
+    """Document retrieval index counters"""
+    return document_index.get_stats()
+
+@app.get("/debug/http-client")
+async def debug_http_client():
+    """Shared HTTP client request and retry counters"""
+    return http_client.get_stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency, token and RU metrics in Prometheus text format"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/debug/profile-cache")
+async def debug_profile_cache():
+    """Profile cache hit/revalidation counters"""
+    from profile_cache import get_stats
+    return get_stats()
+
+@app.get("/debug/chat-writer")
+async def debug_chat_writer():
+    """Write-behind chat queue depth and drop counters"""
+    return chat_writer.get_stats()
+
 @app.get("/debug/test")
 async def debug_test():
     return {
@@ -269,7 +523,7 @@ async def debug_test_chat_save():
         from cosmos_client import save_chat_to_cosmos
         
         # Test saving for student
-        result = save_chat_to_cosmos(
+        result = await save_chat_to_cosmos(
             user_id="stu_12345",
             user_role="student", 
             question="Test question - what is my math progress?",
@@ -279,7 +533,7 @@ async def debug_test_chat_save():
         return {
             "status": "success" if result else "failed",
             "chat_saved": result,
-            "message": "Check /debug/student/stu_12345 to verify"
+            "message": "Check /debug/chat-history/stu_12345 to verify"
         }
         
     except Exception as e:
@@ -294,7 +548,7 @@ async def debug_chat_history(user_id: str, user_role: str = "student"):
     try:
         from cosmos_client import get_chat_history_from_user
         
-        chat_history = get_chat_history_from_user(user_id, user_role)
+        chat_history = await get_chat_history_from_user(user_id, user_role)
         
         return {
             "user_id": user_id,
@@ -323,7 +577,7 @@ async def test_chat_simple():
         return {
             "test_status": "completed",
             "chat_result": result,
-            "message": "Check /debug/student/stu_12345 to see if chatHistory was updated"
+            "message": "Check /debug/chat-history/stu_12345 to see the saved chat (writes are flushed every few seconds)"
         }
         
     except Exception as e:
@@ -332,39 +586,82 @@ async def test_chat_simple():
             "error": str(e)
         }
 
+def student_summary(student_doc, chat_history):
+    """What a parent sees about one child"""
+    return {
+        "student_info": {
+            "name": student_doc.get("name"),
+            "grade": student_doc.get("grade"),
+            "subjects": student_doc.get("subjects"),
+            "progress": student_doc.get("progress")
+        },
+        "chat_summary": {
+            "total_conversations": len(chat_history),
+            "recent_activity": chat_history[:5] if chat_history else []
+        }
+    }
+
 @app.get("/api/v1/parent-access/{parent_id}/student/{student_id}")
 async def parent_access_student(parent_id: str, student_id: str):
     """Allow parents to access their child's data"""
     try:
-        from cosmos_client import get_container, get_chat_history_from_user
+        from cosmos_client import get_chat_history, chat_history_entries
+        from profile_cache import get_profile, get_children
+        
+        # The authorization lookup, the student read and the chat history
+        # query are independent, so issue them together; nothing is returned
+        # until the parent's access has been checked
+        allowed_students, student_doc, chat_records = await asyncio.gather(
+            get_children(parent_id),
+            get_profile("students", student_id),
+            get_chat_history(student_id, limit=20)
+        )
         
-        # Get parent data to verify relationship
-        parent_container = get_container("parents")
-        parent_doc = parent_container.read_item(item=parent_id, partition_key=parent_id)
+        if allowed_students is None:
+            return {"error": f"Parent {parent_id} not found"}
         
         # Check if this parent has access to this student
-        allowed_students = parent_doc.get("children", [])
         if student_id not in allowed_students:
             return {"error": "Access denied: You are not authorized to view this student's data"}
         
-        # Get student data
-        student_container = get_container("students")
-        student_doc = student_container.read_item(item=student_id, partition_key=student_id)
+        if student_doc is None:
+            return {"error": f"Student {student_id} not found"}
+        
+        # Unmigrated students still carry their history on the fetched document
+        chat_history = chat_history_entries(chat_records, student_doc)
+        
+        return dict(student_summary(student_doc, chat_history), parent_access=True)
+        
+    except Exception as e:
+        return {"error": f"Failed to retrieve student data: {str(e)}"}
+
+@app.get("/api/v1/parent-access/{parent_id}/students")
+async def parent_access_students(parent_id: str):
+    """All of a parent's children in one batched call"""
+    try:
+        from cosmos_client import get_chat_history, chat_history_entries
+        from profile_cache import get_profiles, get_children
+        
+        children = await get_children(parent_id)
+        if children is None:
+            return {"error": f"Parent {parent_id} not found"}
+        
+        student_docs, chat_records = await asyncio.gather(
+            get_profiles("students", children),
+            asyncio.gather(*(get_chat_history(student_id, limit=20) for student_id in children))
+        )
         
-        # Get chat history
-        chat_history = get_chat_history_from_user(student_id, "student")
+        students = []
+        for student_id, records in zip(children, chat_records):
+            student_doc = student_docs.get(student_id)
+            if student_doc is not None:
+                chat_history = chat_history_entries(records, student_doc)
+                students.append(dict(student_summary(student_doc, chat_history), student_id=student_id))
         
         return {
-            "student_info": {
-                "name": student_doc.get("name"),
-                "grade": student_doc.get("grade"),
-                "subjects": student_doc.get("subjects"),
-                "progress": student_doc.get("progress")
-            },
-            "chat_summary": {
-                "total_conversations": len(chat_history),
-                "recent_activity": chat_history[:5] if chat_history else []
-            },
+            "parent_id": parent_id,
+            "students": students,
+            "missing_students": [student_id for student_id in children if student_id not in student_docs],
             "parent_access": True
         }
         
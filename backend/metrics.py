@@ -0,0 +1,106 @@
+import os
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# Per-stage latency and cost metrics, served in Prometheus text format at
+# /metrics. Every series carries the API endpoint (route template) and user
+# role of the request it was recorded for, taken from context variables set
+# by the request middleware and the handlers, so background work started by a
+# request (OCR jobs, memory folds) is attributed to it too.
+#
+# Under gunicorn with several workers, set PROMETHEUS_MULTIPROC_DIR to an
+# empty directory so /metrics aggregates all of them.
+ROLES = {"student", "teacher", "parent"}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+RU_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+current_endpoint = ContextVar("metrics_endpoint", default="background")
+current_role = ContextVar("metrics_role", default="none")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "gaief_http_request_seconds", "API request latency (to response headers for streams)",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS
+)
+PROMPT_BUILD_SECONDS = Histogram(
+    "gaief_prompt_build_seconds", "Time to build and budget a role prompt",
+    ["endpoint", "role"], buckets=LATENCY_BUCKETS
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "gaief_llm_request_seconds", "Azure OpenAI call latency per attempt (to response headers for streams)",
+    ["endpoint", "role", "operation", "backend", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    "gaief_llm_tokens", "Tokens per Azure OpenAI call, from response.usage",
+    ["endpoint", "role", "backend", "kind"], buckets=TOKEN_BUCKETS
+)
+OCR_STAGE_SECONDS = Histogram(
+    "gaief_ocr_stage_seconds", "Document Intelligence submit and poll (submit to result) time",
+    ["endpoint", "role", "stage"], buckets=LATENCY_BUCKETS
+)
+OCR_POLLS = Counter("gaief_ocr_polls_total", "Document Intelligence result polls", ["endpoint", "role"])
+COSMOS_REQUEST_SECONDS = Histogram(
+    "gaief_cosmos_request_seconds", "Cosmos DB request latency per HTTP attempt",
+    ["endpoint", "role", "container", "operation", "status"], buckets=LATENCY_BUCKETS
+)
+COSMOS_REQUEST_UNITS = Histogram(
+    "gaief_cosmos_request_units", "Request units charged per Cosmos DB request (x-ms-request-charge)",
+    ["endpoint", "role", "container", "operation"], buckets=RU_BUCKETS
+)
+
+def role_label(role):
+    """Bound label values: roles come from request bodies"""
+    return role if role in ROLES else "other"
+
+def set_role(role):
+    current_role.set(role_label(role))
+
+def _labels(role=None):
+    return current_endpoint.get(), role_label(role) if role is not None else current_role.get()
+
+def route_template(routes, scope):
+    """Path template of the route a request will match, e.g. /upload-jobs/{job_id}"""
+    from starlette.routing import Match
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "other")
+    return "unmatched"
+
+def observe_request(endpoint, method, status, seconds):
+    HTTP_REQUEST_SECONDS.labels(endpoint, method, str(status)).observe(seconds)
+
+def observe_prompt_build(role, seconds):
+    PROMPT_BUILD_SECONDS.labels(*_labels(role)).observe(seconds)
+
+def observe_llm(role, operation, backend, outcome, seconds):
+    LLM_REQUEST_SECONDS.labels(*_labels(role), operation, backend, outcome).observe(seconds)
+
+def observe_llm_usage(role, backend, usage):
+    if usage is None:
+        return
+    endpoint, role = _labels(role)
+    LLM_TOKENS.labels(endpoint, role, backend, "prompt").observe(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(endpoint, role, backend, "completion").observe(usage.completion_tokens or 0)
+
+def observe_ocr(stage, seconds):
+    OCR_STAGE_SECONDS.labels(*_labels(), stage).observe(seconds)
+
+def count_ocr_poll():
+    OCR_POLLS.labels(*_labels()).inc()
+
+def observe_cosmos(container, operation, status, seconds, request_charge):
+    endpoint, role = _labels()
+    COSMOS_REQUEST_SECONDS.labels(endpoint, role, container, operation, str(status)).observe(seconds)
+    if request_charge is not None:
+        COSMOS_REQUEST_UNITS.labels(endpoint, role, container, operation).observe(request_charge)
+
+def render():
+    """(body, content type) of the /metrics response"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,179 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+
+import metrics
+import ocr_cache
+import embeddings
+import document_index
+import completion_cache
+from doc_intelligence import analyze_document
+from summarizer import summarize_document
+
+# Background OCR + summarization jobs. Uploads are queued and processed by a
+# fixed pool of worker tasks, so a slow document never holds up other requests.
+OCR_JOB_WORKERS = int(os.getenv("OCR_JOB_WORKERS", "4"))
+OCR_JOB_QUEUE_SIZE = int(os.getenv("OCR_JOB_QUEUE_SIZE", "100"))
+OCR_JOB_RETENTION = int(os.getenv("OCR_JOB_RETENTION", "3600"))  # seconds to keep finished jobs
+
+jobs = {}
+_done_events = {}
+_queue = None
+_workers = []
+
+class JobQueueFull(Exception):
+    pass
+
+async def _index_for_user(user_id, document_id, full_text, filename):
+    """Add the document to the user's retrieval index; indexing failures don't fail the upload"""
+    try:
+        await document_index.index_document(user_id, document_id, full_text, filename=filename)
+        return True
+    except Exception as e:
+        logging.warning(f"Could not index document {document_id} for {user_id}: {str(e)}")
+        return False
+
+async def process_document(upload, role, topic, user_id=None):
+    """OCR an uploads.Upload and route the text through the role prompt.
+
+    With a user_id the text is also indexed for follow-up questions in /chat,
+    alongside the summary rather than after it.
+    """
+    # Hashed while the upload was received, so the file isn't read again here
+    document_key = upload.sha256
+    full_text = await ocr_cache.get(document_key)
+    if full_text is None:
+        full_text = await analyze_document(upload)
+        await ocr_cache.put(document_key, full_text)
+    else:
+        logging.info(f"OCR cache hit for document {document_key[:12]}")
+
+    document_id = document_index.make_document_id(document_key)
+    indexing = None
+    if user_id and full_text.strip() and embeddings.is_available():
+        indexing = asyncio.create_task(_index_for_user(user_id, document_id, full_text, upload.filename))
+    try:
+        # Long documents are condensed chunk by chunk instead of being cut off
+        prompt, prompt_info = await summarize_document(full_text, role, topic, max_tokens=500)
+        ai_reply, _ = await completion_cache.cached_completion(role, prompt, temperature=0.7, max_tokens=500)
+    except BaseException:
+        if indexing:
+            indexing.cancel()
+        raise
+    indexed = await indexing if indexing else False
+    return {
+        "reply": ai_reply,
+        "extracted_text": full_text[:500],
+        "prompt_tokens": prompt_info["prompt_tokens"],
+        "context_truncated": prompt_info["context_truncated"],
+        "chunks": prompt_info["chunks"],
+        "document_id": document_id if indexed else None
+    }
+
+def _public_view(job):
+    return {key: value for key, value in job.items() if not key.startswith("_")}
+
+def _prune_finished_jobs():
+    cutoff = time.time() - OCR_JOB_RETENTION
+    expired = [
+        job_id for job_id, job in jobs.items()
+        if job["status"] in ("succeeded", "failed") and job["_finished"] < cutoff
+    ]
+    for job_id in expired:
+        jobs.pop(job_id, None)
+        _done_events.pop(job_id, None)
+
+def _update(job, **fields):
+    job.update(fields)
+    job["updated_at"] = datetime.utcnow().isoformat()
+
+async def _worker(worker_id):
+    while True:
+        job_id, upload = await _queue.get()
+        job = jobs.get(job_id)
+        try:
+            if job is None:
+                continue
+            _update(job, status="running")
+            # Label this job's OCR, LLM and Cosmos metrics like the request that queued it
+            metrics.current_endpoint.set("/upload-jobs")
+            metrics.set_role(job["role"])
+            logging.info(f"OCR worker {worker_id} processing job {job_id}")
+            result = await process_document(upload, job["role"], job["topic"], user_id=job["_user_id"])
+            _update(job, status="succeeded", result=result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"OCR job {job_id} failed: {str(e)}")
+            _update(job, status="failed", error=f"Processing error: {str(e)}")
+        finally:
+            upload.close()
+            if job is not None and job["status"] in ("succeeded", "failed"):
+                job["_finished"] = time.time()
+                _done_events[job_id].set()
+            _queue.task_done()
+
+async def start_workers():
+    """Start the OCR worker pool (called once at startup)"""
+    global _queue
+    if _workers:
+        return
+    _queue = asyncio.Queue(maxsize=OCR_JOB_QUEUE_SIZE)
+    for worker_id in range(OCR_JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker(worker_id)))
+    logging.info(f"Started {OCR_JOB_WORKERS} OCR job workers")
+
+async def stop_workers():
+    """Cancel the OCR worker pool (called at shutdown)"""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+def submit_job(upload, role, topic, user_id=None):
+    """Queue an uploads.Upload for OCR and summarization and return the new job"""
+    _prune_finished_jobs()
+
+    job_id = str(uuid.uuid4())
+    now = datetime.utcnow().isoformat()
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "role": role,
+        "topic": topic,
+        "filename": upload.filename,
+        "created_at": now,
+        "updated_at": now,
+        "result": None,
+        "error": None,
+        "_finished": None,
+        "_user_id": user_id
+    }
+
+    try:
+        _queue.put_nowait((job_id, upload))
+    except asyncio.QueueFull:
+        upload.close()
+        raise JobQueueFull("OCR job queue is full, try again later")
+
+    jobs[job_id] = job
+    _done_events[job_id] = asyncio.Event()
+    return _public_view(job)
+
+def get_job(job_id):
+    job = jobs.get(job_id)
+    return _public_view(job) if job else None
+
+async def wait_for_job(job_id, timeout):
+    """Wait up to timeout seconds for a job to finish, then return its view"""
+    event = _done_events.get(job_id)
+    if event is None:
+        return None
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return get_job(job_id)
@@ -0,0 +1,262 @@
+import os
+import time
+import asyncio
+import logging
+
+import metrics
+import openai_pool
+import rate_limiter
+from prompt_router import count_tokens
+from retry_after import retry_after_seconds
+
+# Shared async Azure OpenAI clients, one per backend in the endpoint pool (see
+# openai_pool). They are created once in the app lifespan and reused by every
+# request, so all handlers share each backend's connection pool.
+try:
+    from openai import AsyncAzureOpenAI, RateLimitError, APIConnectionError, InternalServerError
+except Exception as e:
+    AsyncAzureOpenAI = None
+    logging.error(f"openai package not available: {e}")
+
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
+AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo")
+AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+AZURE_OPENAI_TIMEOUT = float(os.getenv("AZURE_OPENAI_TIMEOUT", "60"))
+AZURE_OPENAI_MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "2"))
+# Hedging: when a non-streaming call outlives its backend's p95 latency, send
+# the same request to the next best backend and take whichever answers first
+AZURE_OPENAI_HEDGE = os.getenv("AZURE_OPENAI_HEDGE", "false").lower() == "true"
+
+backends = []
+stats = {"hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+def init_openai_client():
+    """Create one AsyncAzureOpenAI client per pool backend (called once at startup)"""
+    global backends
+    if backends:
+        return backends
+
+    if AsyncAzureOpenAI is None:
+        logging.error("Azure OpenAI SDK not installed")
+        return []
+
+    configured = openai_pool.load_backends(AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_DEPLOYMENT)
+    if not configured:
+        logging.warning("Azure OpenAI credentials not configured")
+        return []
+
+    for backend in configured:
+        try:
+            backend.client = AsyncAzureOpenAI(
+                api_key=backend.api_key,
+                api_version=AZURE_OPENAI_API_VERSION,
+                azure_endpoint=backend.endpoint,
+                timeout=AZURE_OPENAI_TIMEOUT,
+                # Retries are done in _create so they can fail over and go through the rate limiter
+                max_retries=0
+            )
+        except Exception as e:
+            logging.error(f"Error initializing Azure OpenAI client for {backend.name}: {e}")
+    backends = [backend for backend in configured if backend.client is not None]
+    logging.info(f"Azure OpenAI async clients initialized: {[backend.name for backend in backends]}")
+    return backends
+
+async def close_openai_client():
+    """Close every backend client and its connection pool (called at shutdown)"""
+    global backends
+    for backend in backends:
+        await backend.client.close()
+    if backends:
+        logging.info("Azure OpenAI async clients closed")
+    backends = []
+
+def is_configured():
+    return bool(backends)
+
+def _limiter(backend):
+    return rate_limiter.get_limiter(backend.name, rpm=backend.rpm, tpm=backend.tpm)
+
+async def _attempt(backend, request, reserved_tokens, role, deadline):
+    """One call on one backend through its rate limiter, feeding the backend's routing stats"""
+    if rate_limiter.RATE_LIMIT_ENABLED:
+        await _limiter(backend).acquire(reserved_tokens, role=role, deadline=deadline)
+    else:
+        wait = backend.throttled_until - time.monotonic()
+        if wait > 0:
+            if time.monotonic() + wait > deadline:
+                raise rate_limiter.RateLimitTimeout(f"Azure OpenAI backend {backend.name} is throttled", retry_after=wait)
+            await asyncio.sleep(wait)
+
+    backend.begin()
+    started = time.monotonic()
+    try:
+        raw = await backend.client.chat.completions.with_raw_response.create(model=backend.deployment, **request)
+    except RateLimitError as e:
+        metrics.observe_llm(role, "chat", backend.name, "throttled", time.monotonic() - started)
+        delay = retry_after_seconds(e.response.headers)
+        backend.record_throttle(delay)
+        if rate_limiter.RATE_LIMIT_ENABLED:
+            _limiter(backend).throttled(e.response.headers, reserved_tokens)
+        raise
+    except asyncio.CancelledError:
+        # Lost a hedge race; not the backend's fault. The prompt was sent and
+        # is billed, the completion allowance goes back to the bucket
+        backend.trial_in_flight = False
+        metrics.observe_llm(role, "chat", backend.name, "cancelled", time.monotonic() - started)
+        if rate_limiter.RATE_LIMIT_ENABLED:
+            _limiter(backend).settle(reserved_tokens, reserved_tokens - request["max_tokens"])
+        raise
+    except (APIConnectionError, InternalServerError):
+        # Connection errors, timeouts and 5xx: the backend is failing
+        backend.record_failure()
+        metrics.observe_llm(role, "chat", backend.name, "error", time.monotonic() - started)
+        if rate_limiter.RATE_LIMIT_ENABLED:
+            _limiter(backend).refund(reserved_tokens)
+        raise
+    except Exception:
+        # Other 4xx (bad request, content filter) are the caller's error; the
+        # backend answered, so its routing stats and circuit are left alone
+        backend.trial_in_flight = False
+        metrics.observe_llm(role, "chat", backend.name, "rejected", time.monotonic() - started)
+        if rate_limiter.RATE_LIMIT_ENABLED:
+            _limiter(backend).refund(reserved_tokens)
+        raise
+    # For streams this is time to response headers, which is what routing cares about
+    backend.record_success(time.monotonic() - started)
+    metrics.observe_llm(role, "chat", backend.name, "ok", time.monotonic() - started)
+    if rate_limiter.RATE_LIMIT_ENABLED:
+        _limiter(backend).observe(raw.headers)
+    return raw.parse()
+
+async def _hedged(primary, secondary, request, reserved_tokens, role, deadline):
+    """Run on primary; past its p95 latency, race the same request on secondary"""
+    first = asyncio.create_task(_attempt(primary, request, reserved_tokens, role, deadline))
+    done, _ = await asyncio.wait({first}, timeout=primary.p95_latency())
+    if done:
+        return first.result(), primary
+
+    stats["hedged"] += 1
+    second = asyncio.create_task(_attempt(secondary, request, reserved_tokens, role, deadline))
+    pending = {first: primary, second: secondary}
+    error = None
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                backend = pending.pop(task)
+                if task.exception() is None:
+                    if backend is secondary:
+                        stats["hedge_wins"] += 1
+                    return task.result(), backend
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _create(prompt, temperature, max_tokens, deployment, role, stream=False):
+    """Create a chat completion on the best pool backend, failing over on errors.
+
+    429s park the backend for retry-after and the call moves to the next
+    backend (or waits in the rate limiter) until the caller's deadline;
+    connection and 5xx errors are retried up to AZURE_OPENAI_MAX_RETRIES times
+    per backend. Returns (response, backend, reserved_tokens).
+    """
+    if not backends:
+        raise Exception("Azure OpenAI client not configured")
+
+    request = dict(
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    if stream:
+        request["stream"] = True
+
+    pool = [backend for backend in backends if not deployment or backend.deployment == deployment] or backends
+    reserved_tokens = count_tokens(prompt, AZURE_OPENAI_DEPLOYMENT) + max_tokens
+    deadline = time.monotonic() + rate_limiter.RATE_LIMIT_QUEUE_TIMEOUT
+    failures = 0
+    while True:
+        ranked = openai_pool.rank(pool)
+        backend = ranked[0]
+        try:
+            if AZURE_OPENAI_HEDGE and not stream and len(ranked) > 1 and backend.p95_latency() is not None:
+                response, backend = await _hedged(backend, ranked[1], request, reserved_tokens, role, deadline)
+            else:
+                response = await _attempt(backend, request, reserved_tokens, role, deadline)
+            return response, backend, reserved_tokens
+        except RateLimitError as e:
+            if time.monotonic() >= deadline:
+                raise rate_limiter.RateLimitTimeout(f"Azure OpenAI backend {backend.name} is throttled")
+            logging.warning(f"Azure OpenAI backend {backend.name} throttled, re-routing")
+        except (APIConnectionError, InternalServerError) as e:
+            failures += 1
+            if failures > AZURE_OPENAI_MAX_RETRIES * len(pool):
+                raise
+            logging.warning(f"Azure OpenAI backend {backend.name} failed ({e}), retry {failures}")
+            if len(pool) == 1:
+                await asyncio.sleep(0.5 * 2 ** (failures - 1))
+        if len(pool) > 1:
+            stats["failovers"] += 1
+
+async def complete_chat(prompt, temperature=0.7, max_tokens=500, deployment=None, role=None):
+    """Run a single-prompt chat completion without blocking the event loop"""
+    response, backend, reserved_tokens = await _create(prompt, temperature, max_tokens, deployment, role)
+    metrics.observe_llm_usage(role, backend.name, response.usage)
+    if rate_limiter.RATE_LIMIT_ENABLED and response.usage:
+        _limiter(backend).settle(reserved_tokens, response.usage.total_tokens)
+    return response.choices[0].message.content
+
+async def stream_chat(prompt, temperature=0.7, max_tokens=500, deployment=None, role=None):
+    """Yield completion text deltas as the model emits them"""
+    stream, backend, reserved_tokens = await _create(prompt, temperature, max_tokens, deployment, role, stream=True)
+    parts = []
+    usage = None
+    try:
+        async for chunk in stream:
+            # Only present when the API version reports usage on streams
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+                metrics.observe_llm_usage(role, backend.name, usage)
+            # Azure sends a prompt-filter chunk with no choices first
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    finally:
+        # Also runs when the client disconnects mid-stream; without reported
+        # usage, count what was generated
+        if rate_limiter.RATE_LIMIT_ENABLED:
+            if usage is not None:
+                used_tokens = usage.total_tokens
+            else:
+                used_tokens = reserved_tokens - max_tokens + count_tokens("".join(parts), AZURE_OPENAI_DEPLOYMENT)
+            _limiter(backend).settle(reserved_tokens, used_tokens)
+
+async def embed(texts):
+    """Embedding vectors for texts from AZURE_OPENAI_EMBEDDING_DEPLOYMENT, trying each backend in turn"""
+    if not backends or not AZURE_OPENAI_EMBEDDING_DEPLOYMENT:
+        raise Exception("Azure OpenAI embeddings not configured")
+
+    error = None
+    # Embedding calls are not fed into the chat routing stats or rate limiter,
+    # they run against the deployment's separate quota
+    for backend in openai_pool.rank(backends):
+        started = time.monotonic()
+        try:
+            response = await backend.client.embeddings.create(model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT, input=texts)
+            metrics.observe_llm(None, "embedding", backend.name, "ok", time.monotonic() - started)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            metrics.observe_llm(None, "embedding", backend.name, "error", time.monotonic() - started)
+            logging.warning(f"Embedding call on {backend.name} failed: {e}")
+            error = e
+    raise error
+
+def get_stats():
+    return dict(stats, hedging=AZURE_OPENAI_HEDGE, backends=[backend.get_stats() for backend in backends])
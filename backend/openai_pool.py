@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import logging
+from collections import deque
+
+# Routing state for a pool of Azure OpenAI endpoints/deployments. Each backend
+# tracks an EWMA of its latency and error rate plus a circuit breaker; callers
+# ask for the backends ranked best first and report every outcome back.
+#
+# AZURE_OPENAI_POOL is a JSON list of backends serving the same model, e.g.
+#   [{"name": "eastus", "endpoint": "https://...", "api_key": "...", "deployment": "gpt-35-turbo", "rpm": 720, "tpm": 120000},
+#    {"name": "westeurope", "endpoint": "https://...", "api_key": "...", "deployment": "gpt-35-turbo"}]
+# Without it the pool is the single AZURE_OPENAI_ENDPOINT/AZURE_OPENAI_DEPLOYMENT pair.
+AZURE_OPENAI_POOL = os.getenv("AZURE_OPENAI_POOL", "")
+POOL_EWMA_ALPHA = float(os.getenv("AZURE_OPENAI_EWMA_ALPHA", "0.3"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("AZURE_OPENAI_CIRCUIT_FAILURES", "3"))
+CIRCUIT_COOLDOWN = float(os.getenv("AZURE_OPENAI_CIRCUIT_COOLDOWN", "30"))  # seconds before a half-open trial
+ERROR_RATE_PENALTY = 4.0  # a backend failing half its calls ranks as if 3x slower
+LATENCY_WINDOW = 200  # samples kept for the p95 used by hedging
+
+class Backend:
+    def __init__(self, name, endpoint, api_key, deployment, rpm=None, tpm=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.deployment = deployment
+        self.rpm = rpm
+        self.tpm = tpm
+        self.client = None
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.throttled_until = 0.0
+        self.trial_in_flight = False
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.failures = 0
+        self.throttles = 0
+
+    def available(self, now):
+        """Closed circuit, or open circuit whose cooldown allows one trial call"""
+        if self.consecutive_failures < CIRCUIT_FAILURE_THRESHOLD:
+            return True
+        return now >= self.open_until and not self.trial_in_flight
+
+    def score(self):
+        # Untried backends go first so every backend gets measured, unless
+        # they have only ever failed
+        if self.ewma_latency is None:
+            return 0.0 if self.failures == 0 else float("inf")
+        return self.ewma_latency * (1 + ERROR_RATE_PENALTY * self.error_rate)
+
+    def begin(self):
+        if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self.trial_in_flight = True
+
+    def record_success(self, latency):
+        self.calls += 1
+        self.latencies.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += POOL_EWMA_ALPHA * (latency - self.ewma_latency)
+        self.error_rate *= 1 - POOL_EWMA_ALPHA
+        if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            logging.info(f"Azure OpenAI backend {self.name} recovered, closing circuit")
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.calls += 1
+        self.failures += 1
+        self.error_rate += POOL_EWMA_ALPHA * (1 - self.error_rate)
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + CIRCUIT_COOLDOWN
+            logging.warning(f"Azure OpenAI backend {self.name} failing, circuit open for {CIRCUIT_COOLDOWN}s")
+
+    def record_throttle(self, delay):
+        """A 429 parks the backend for retry-after; it is out of quota, not failing, so
+        the error rate and circuit breaker are left alone"""
+        self.throttles += 1
+        self.trial_in_flight = False
+        self.throttled_until = max(self.throttled_until, time.monotonic() + delay)
+
+    def p95_latency(self, min_samples=20):
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def get_stats(self):
+        return {
+            "name": self.name,
+            "deployment": self.deployment,
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "p95_latency": round(self.p95_latency(), 3) if self.p95_latency() is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "circuit_open": self.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD,
+            "throttled_for": round(max(0.0, self.throttled_until - time.monotonic()), 2),
+            "calls": self.calls,
+            "failures": self.failures,
+            "throttles": self.throttles
+        }
+
+def load_backends(default_endpoint, default_api_key, default_deployment):
+    """Backends from AZURE_OPENAI_POOL, or the single default endpoint"""
+    if not AZURE_OPENAI_POOL:
+        if not (default_endpoint and default_api_key):
+            return []
+        return [Backend(default_deployment, default_endpoint, default_api_key, default_deployment)]
+
+    try:
+        entries = json.loads(AZURE_OPENAI_POOL)
+    except json.JSONDecodeError as e:
+        logging.error(f"AZURE_OPENAI_POOL is not valid JSON: {e}")
+        return []
+
+    backends = []
+    for index, entry in enumerate(entries):
+        endpoint = entry.get("endpoint")
+        api_key = entry.get("api_key") or default_api_key
+        if not (endpoint and api_key):
+            logging.error(f"AZURE_OPENAI_POOL entry {index} needs an endpoint and api_key, skipping it")
+            continue
+        deployment = entry.get("deployment") or default_deployment
+        backends.append(Backend(
+            entry.get("name") or f"{deployment}-{index}", endpoint, api_key, deployment,
+            rpm=entry.get("rpm"), tpm=entry.get("tpm")
+        ))
+    return backends
+
+def rank(backends):
+    """Backends best first: closed circuits before trials, unthrottled before throttled, then by score"""
+    now = time.monotonic()
+    candidates = [backend for backend in backends if backend.available(now)]
+    if not candidates:
+        # Everything is tripped: try the one that will recover soonest rather than fail outright
+        candidates = sorted(backends, key=lambda backend: backend.open_until)[:1]
+    return sorted(candidates, key=lambda backend: (
+        backend.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD,
+        backend.throttled_until > now,
+        backend.score()
+    ))
@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+from cosmos_client import read_profile, read_profiles, NOT_MODIFIED
+
+# Read-through cache of profile documents keyed by (container, id).
+# Fresh entries are served from memory; once an entry is older than
+# PROFILE_CACHE_TTL it is revalidated with If-None-Match on its _etag, which
+# returns a cheap 304 when the document has not changed.
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "2000"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "30"))
+PARENT_CHILDREN_TTL = float(os.getenv("PARENT_CHILDREN_TTL", "300"))
+
+_entries = OrderedDict()  # (container, id) -> {"doc", "etag", "checked_at"}
+_inflight = {}  # (container, id) -> Future, so concurrent misses share one read
+_children = {}  # parent id -> (checked_at, list of student ids)
+stats = {"hits": 0, "revalidated": 0, "misses": 0, "evictions": 0}
+
+def _store(key, doc):
+    _entries[key] = {"doc": doc, "etag": doc.get("_etag"), "checked_at": time.monotonic()}
+    _entries.move_to_end(key)
+    while len(_entries) > PROFILE_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+        stats["evictions"] += 1
+
+async def _fetch(key, entry):
+    container_name, item_id = key
+    if entry and entry["etag"]:
+        doc = await read_profile(container_name, item_id, if_none_match=entry["etag"])
+        if doc is NOT_MODIFIED:
+            entry["checked_at"] = time.monotonic()
+            _entries.move_to_end(key)
+            stats["revalidated"] += 1
+            return entry["doc"]
+    else:
+        doc = await read_profile(container_name, item_id)
+
+    stats["misses"] += 1
+    if doc is None:
+        _entries.pop(key, None)
+        return None
+    _store(key, doc)
+    return doc
+
+async def get_profile(container_name, item_id):
+    """Return a profile document (or None if it does not exist) through the cache"""
+    key = (container_name, item_id)
+    entry = _entries.get(key)
+    if entry and time.monotonic() - entry["checked_at"] < PROFILE_CACHE_TTL:
+        _entries.move_to_end(key)
+        stats["hits"] += 1
+        return entry["doc"]
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.ensure_future(_fetch(key, entry))
+    _inflight[key] = future
+    try:
+        return await asyncio.shield(future)
+    finally:
+        _inflight.pop(key, None)
+
+async def get_profiles(container_name, item_ids):
+    """Return {id: doc} for the ids that exist, batch-reading whatever is not fresh in cache"""
+    found = {}
+    missing = []
+    now = time.monotonic()
+    for item_id in dict.fromkeys(item_ids):
+        entry = _entries.get((container_name, item_id))
+        if entry and now - entry["checked_at"] < PROFILE_CACHE_TTL:
+            _entries.move_to_end((container_name, item_id))
+            stats["hits"] += 1
+            found[item_id] = entry["doc"]
+        else:
+            missing.append(item_id)
+
+    if missing:
+        stats["misses"] += len(missing)
+        docs = await read_profiles(container_name, missing)
+        for item_id, doc in docs.items():
+            _store((container_name, item_id), doc)
+            found[item_id] = doc
+    return found
+
+async def get_children(parent_id):
+    """Student ids a parent may access (None if the parent does not exist), cached per parent"""
+    entry = _children.get(parent_id)
+    if entry and time.monotonic() - entry[0] < PARENT_CHILDREN_TTL:
+        return entry[1]
+
+    parent_doc = await get_profile("parents", parent_id)
+    if parent_doc is None:
+        _children.pop(parent_id, None)
+        return None
+    children = list(parent_doc.get("children", []))
+    _children[parent_id] = (time.monotonic(), children)
+    return children
+
+def get_stats():
+    lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+    return dict(
+        stats,
+        entries=len(_entries),
+        hit_rate=round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+    )
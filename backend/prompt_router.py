@@ -1,3 +1,38 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+
+import metrics
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+    logging.warning("tiktoken not installed, estimating prompt tokens from character counts")
+
+# Context windows (prompt + completion tokens) by model family. Deployment
+# names are free-form, so a deployment matches the longest family name it contains.
+CONTEXT_WINDOWS = {
+    "gpt-35-turbo-16k": 16384,
+    "gpt-35-turbo": 4096,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("AZURE_OPENAI_CONTEXT_WINDOW", "4096"))
+# Cap on context tokens even for large windows: input tokens cost latency and money
+PROMPT_MAX_CONTEXT_TOKENS = int(os.getenv("PROMPT_MAX_CONTEXT_TOKENS", "2000"))
+PROMPT_SAFETY_MARGIN = 64  # chat message framing and tokenizer drift
+
+ENCODING_NAMES = ("cl100k_base", "o200k_base")
+
+_encodings = {}
+
 def get_prompt(user_role, topic, context):
     if user_role == "student":
         return f"You are a friendly tutor. Help the student learn about {topic}. Use the following material: {context}"
@@ -7,3 +42,186 @@ def get_prompt(user_role, topic, context):
         return f"You are a progress tracker. Summarize the student's learning journey on the topic '{topic}' in simple language. Use: {context}"
     else:
         return "Unrecognized role. Cannot generate a prompt."
+
+def context_window(deployment):
+    if os.getenv("AZURE_OPENAI_CONTEXT_WINDOW") or not deployment:
+        return DEFAULT_CONTEXT_WINDOW
+    name = deployment.lower()
+    for family in sorted(CONTEXT_WINDOWS, key=len, reverse=True):
+        if family in name:
+            return CONTEXT_WINDOWS[family]
+    return DEFAULT_CONTEXT_WINDOW
+
+def _encoding(deployment):
+    """tiktoken encoding for a deployment, or None to fall back to estimates"""
+    if tiktoken is None:
+        return None
+    encoding_name = "o200k_base" if deployment and "gpt-4o" in deployment.lower() else "cl100k_base"
+    if encoding_name not in _encodings:
+        _load_encoding(encoding_name)
+    return _encodings[encoding_name]
+
+def _load_encoding(encoding_name):
+    try:
+        # tiktoken downloads the encoding on first use unless it is cached locally
+        _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logging.warning(f"Could not load tiktoken encoding {encoding_name}, estimating tokens instead: {e}")
+        _encodings[encoding_name] = None
+
+def load_encodings():
+    """Load the tiktoken encodings before the first request needs them.
+
+    Called once at startup in a worker thread: a first load can mean a
+    download, which would otherwise stall the first /chat (and hang offline).
+    """
+    if tiktoken is not None:
+        for encoding_name in ENCODING_NAMES:
+            if encoding_name not in _encodings:
+                _load_encoding(encoding_name)
+    loaded = [name for name in ENCODING_NAMES if _encodings.get(name) is not None]
+    if loaded:
+        logging.info(f"Counting prompt tokens with tiktoken ({', '.join(loaded)})")
+    else:
+        logging.warning("Estimating prompt tokens from character counts (characters / 4)")
+    return loaded
+
+def count_tokens(text, deployment=None):
+    if not text:
+        return 0
+    encoding = _encoding(deployment)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+def compact_context(context):
+    """Drop whitespace and JSON formatting that cost tokens but carry no meaning"""
+    if not context:
+        return ""
+    try:
+        parsed = json.loads(context)
+        if isinstance(parsed, (dict, list)):
+            return json.dumps(parsed, separators=(",", ":"), ensure_ascii=False)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    context = re.sub(r"[ \t]+", " ", context)
+    context = re.sub(r"\n\s*\n\s*", "\n\n", context)
+    return context.strip()
+
+def _split_sentences(paragraph):
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", paragraph) if sentence]
+
+def trim_to_budget(text, max_tokens, deployment=None):
+    """Keep as much of text as fits in max_tokens, cutting on paragraph and then sentence boundaries"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, deployment) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        cost = count_tokens(paragraph, deployment) + 1
+        if used + cost <= max_tokens:
+            kept.append(paragraph)
+            used += cost
+            continue
+
+        # The paragraph does not fit whole: take the sentences that do
+        sentences = []
+        for sentence in _split_sentences(paragraph):
+            cost = count_tokens(sentence, deployment) + 1
+            if used + cost > max_tokens:
+                break
+            sentences.append(sentence)
+            used += cost
+        if sentences:
+            kept.append(" ".join(sentences))
+        break
+
+    if kept:
+        return "\n\n".join(kept)
+
+    # Not even one sentence fits (e.g. one long line of OCR or JSON): hard cut
+    encoding = _encoding(deployment)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+def _token_windows(text, max_tokens, deployment=None):
+    """Cut text into consecutive pieces of at most max_tokens, dropping none of it"""
+    encoding = _encoding(deployment)
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        windows = [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+    else:
+        # Estimated tokens: cut every max_tokens * 4 characters, on a space when there is one
+        size = max(1, max_tokens * 4)
+        windows = []
+        start = 0
+        while start < len(text):
+            end = start + size
+            if end < len(text):
+                space = text.rfind(" ", start + size // 2, end)
+                if space != -1:
+                    end = space
+            windows.append(text[start:end])
+            start = end
+    return [window.strip() for window in windows if window.strip()]
+
+def chunk_text(text, max_tokens, deployment=None):
+    """Split text into chunks of at most max_tokens, breaking between sentences.
+
+    A sentence longer than a chunk (e.g. OCR text, which has no sentence
+    breaks) is split into consecutive token windows rather than trimmed.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for sentence in _split_sentences(compact_context(text)):
+        cost = count_tokens(sentence, deployment) + 1
+        if cost > max_tokens:
+            if current:
+                chunks.append(" ".join(current))
+                current, used = [], 0
+            chunks.extend(_token_windows(sentence, max_tokens, deployment))
+            continue
+        if used + cost > max_tokens and current:
+            chunks.append(" ".join(current))
+            current, used = [], 0
+        current.append(sentence)
+        used += cost
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def build_prompt(user_role, topic, context, deployment=None, max_completion_tokens=500, history=""):
+    """Role prompt with the context trimmed to the deployment's token budget.
+
+    history (conversation memory) goes in front of the role prompt and comes
+    out of the same budget. Returns (prompt, info) where info reports
+    prompt_tokens, context_tokens, history_tokens, context_budget and whether
+    the context was truncated.
+    """
+    started = time.perf_counter()
+    context = compact_context(context)
+    history_tokens = count_tokens(history, deployment)
+    fixed_tokens = count_tokens(get_prompt(user_role, topic, ""), deployment) + history_tokens
+    available = context_window(deployment) - max_completion_tokens - fixed_tokens - PROMPT_SAFETY_MARGIN
+    budget = max(0, min(PROMPT_MAX_CONTEXT_TOKENS, available))
+
+    trimmed = trim_to_budget(context, budget, deployment)
+    prompt = get_prompt(user_role, topic, trimmed)
+    if history:
+        prompt = f"{history}\n\n{prompt}"
+    info = {
+        "prompt_tokens": count_tokens(prompt, deployment),
+        "context_tokens": count_tokens(trimmed, deployment),
+        "history_tokens": history_tokens,
+        "context_budget": budget,
+        "context_truncated": trimmed != context
+    }
+    if info["context_truncated"]:
+        logging.info(f"Context trimmed to {info['context_tokens']} of {budget} budgeted tokens for {deployment}")
+    metrics.observe_prompt_build(user_role, time.perf_counter() - started)
+    return prompt, info
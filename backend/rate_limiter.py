@@ -0,0 +1,175 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+
+from retry_after import retry_after_seconds
+
+# Client-side rate limiting for Azure OpenAI. Each deployment gets a pair of
+# token buckets (requests per minute and tokens per minute) refilled
+# continuously. Callers wait in a priority queue instead of firing requests the
+# deployment would reject with 429, and the buckets are corrected from the
+# x-ratelimit-remaining-* and retry-after headers the service sends back.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+AZURE_OPENAI_RPM = int(os.getenv("AZURE_OPENAI_RPM", "720"))
+AZURE_OPENAI_TPM = int(os.getenv("AZURE_OPENAI_TPM", "120000"))
+RATE_LIMIT_QUEUE_TIMEOUT = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT", "30"))  # seconds a caller may wait
+
+# Queue order is arrival time plus a per-role handicap, so interactive student
+# chats go ahead of bulk teacher quiz generation, but a waiting teacher request
+# still gets served once it has waited out its handicap.
+ROLE_PRIORITY_DELAY = {
+    "student": 0.0,
+    "parent": 2.0,
+    "teacher": 5.0,
+}
+DEFAULT_PRIORITY_DELAY = 2.0
+
+_limiters = {}
+_sequence = itertools.count()
+stats = {"granted": 0, "timeouts": 0, "throttled": 0, "wait_seconds": 0.0}
+
+class RateLimitTimeout(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _Bucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # A request bigger than the whole bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+class DeploymentLimiter:
+    def __init__(self, deployment, rpm=AZURE_OPENAI_RPM, tpm=AZURE_OPENAI_TPM):
+        self.deployment = deployment
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.blocked_until = 0.0
+        self._waiters = []  # (rank, sequence, tokens, future)
+        self._timer = None
+
+    def _grant_ready(self):
+        """Hand out capacity to queued callers in rank order; re-arm a timer for the rest"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(self.blocked_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._grant_ready)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.level -= 1
+            self.tokens.level -= min(tokens, self.tokens.capacity)
+            future.set_result(None)
+
+    async def acquire(self, tokens, role=None, deadline=None):
+        """Wait for capacity for one request of about `tokens` tokens, or raise RateLimitTimeout"""
+        queued_at = time.monotonic()
+        deadline = deadline or queued_at + RATE_LIMIT_QUEUE_TIMEOUT
+        future = asyncio.get_running_loop().create_future()
+        rank = queued_at + ROLE_PRIORITY_DELAY.get(role, DEFAULT_PRIORITY_DELAY)
+        heapq.heappush(self._waiters, (rank, next(_sequence), tokens, future))
+        self._grant_ready()
+
+        try:
+            await asyncio.wait_for(future, max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise RateLimitTimeout(
+                f"Timed out waiting for Azure OpenAI capacity on {self.deployment}",
+                retry_after=max(1.0, self.blocked_until - time.monotonic())
+            )
+        stats["granted"] += 1
+        stats["wait_seconds"] += time.monotonic() - queued_at
+
+    def settle(self, reserved_tokens, used_tokens):
+        """Return the unused part of a token reservation once actual usage is known"""
+        if used_tokens is None:
+            return
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved_tokens - used_tokens)
+        self._grant_ready()
+
+    def observe(self, headers):
+        """Never believe we have more left than the service says we do"""
+        if headers is None:
+            return
+        for name, bucket in (("x-ratelimit-remaining-requests", self.requests),
+                             ("x-ratelimit-remaining-tokens", self.tokens)):
+            value = headers.get(name)
+            if value is None:
+                continue
+            try:
+                bucket.level = min(bucket.level, float(value))
+            except ValueError:
+                pass
+
+    def refund(self, reserved_tokens):
+        """Return a whole token reservation for a call that generated nothing"""
+        self.settle(reserved_tokens, 0)
+
+    def throttled(self, headers, reserved_tokens=0):
+        """Record a 429: hold every caller for this deployment until retry-after passes.
+
+        The rejected call's token reservation is returned, then capped by the
+        remaining tokens the service reports.
+        """
+        delay = retry_after_seconds(headers)
+        stats["throttled"] += 1
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved_tokens)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        self.observe(headers)
+        logging.warning(f"Azure OpenAI deployment {self.deployment} throttled, pausing for {delay:.2f}s")
+        return delay
+
+    def queue_length(self):
+        return sum(1 for waiter in self._waiters if not waiter[3].done())
+
+def get_limiter(deployment, rpm=None, tpm=None):
+    limiter = _limiters.get(deployment)
+    if limiter is None:
+        limiter = _limiters[deployment] = DeploymentLimiter(
+            deployment, rpm=rpm or AZURE_OPENAI_RPM, tpm=tpm or AZURE_OPENAI_TPM
+        )
+    return limiter
+
+def get_stats():
+    granted = stats["granted"]
+    return dict(
+        stats,
+        wait_seconds=round(stats["wait_seconds"], 3),
+        average_wait=round(stats["wait_seconds"] / granted, 3) if granted else 0.0,
+        enabled=RATE_LIMIT_ENABLED,
+        deployments={
+            name: {
+                "queued": limiter.queue_length(),
+                "requests_available": round(limiter.requests.level, 1),
+                "tokens_available": round(limiter.tokens.level),
+                "blocked_for": round(max(0.0, limiter.blocked_until - time.monotonic()), 2)
+            }
+            for name, limiter in _limiters.items()
+        }
+    )
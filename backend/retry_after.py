@@ -0,0 +1,14 @@
+# Retry-After parsing shared by the rate limiter and the REST clients.
+
+def retry_after_seconds(headers, default=1.0):
+    """Delay a response asks for (Azure sends retry-after-ms as well as retry-after)"""
+    if headers is None:
+        return default
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    return default
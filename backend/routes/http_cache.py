@@ -0,0 +1,22 @@
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def profile_response(request: Request, doc):
+    """Return a profile as JSON with its Cosmos _etag as the HTTP ETag.
+
+    Answers 304 Not Modified when the browser's If-None-Match already names
+    the current version, so unchanged dashboards skip the response body.
+    """
+    headers = {"Cache-Control": "private, no-cache"}
+    etag = doc.get("_etag")  # Cosmos etags are already quoted strings
+    if etag:
+        headers["ETag"] = etag
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+    return JSONResponse(content=doc, headers=headers)
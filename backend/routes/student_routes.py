@@ -1,34 +1,42 @@
-from fastapi import APIRouter, HTTPException
-from cosmos_client import get_container
+from typing import List
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from profile_cache import get_profile, get_profiles
+from routes.http_cache import profile_response
 
 router = APIRouter()
 
 @router.get("/students/{student_id}")
-async def get_student(student_id: str):
+async def get_student(student_id: str, request: Request):
     try:
-        container = get_container("students")
-        
-        # Try read_item first (faster if partition key matches)
-        try:
-            # First attempt: partition key = /id
-            item = container.read_item(item=student_id, partition_key=student_id)
-            return item
-        except Exception:
-            try:
-                # Second attempt: partition key = /userId (common scenario)
-                item = container.read_item(item=student_id, partition_key=student_id)
-                return item
-            except Exception:
-                # Fallback: use query approach (works across all partition keys)
-                query = f"SELECT * FROM c WHERE c.id = '{student_id}' OR c.userId = '{student_id}'"
-                items = list(container.query_items(query, enable_cross_partition_query=True))
-                
-                if items:
-                    return items[0]
-                else:
-                    raise HTTPException(status_code=404, detail=f"Student {student_id} not found")
-                    
-    except HTTPException:
-        raise  # Re-raise HTTP exceptions
+        # Cached single point read on the container's partition key
+        item = await get_profile("students", student_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Student {student_id} not found")
+    return profile_response(request, item)
+
+class StudentBatchRequest(BaseModel):
+    ids: List[str]
+
+MAX_BATCH_IDS = 100
+
+@router.post("/students/batch")
+async def get_students_batch(req: StudentBatchRequest):
+    """Resolve many students in one call (e.g. a teacher's class view)"""
+    if len(req.ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+
+    try:
+        # Fresh profiles come from the cache, the rest from one batched read
+        docs = await get_profiles("students", req.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    requested = list(dict.fromkeys(req.ids))
+    return {
+        "students": [docs[student_id] for student_id in requested if student_id in docs],
+        "missing_ids": [student_id for student_id in requested if student_id not in docs]
+    }
@@ -0,0 +1,132 @@
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+import embeddings
+from completion_cache import ttl_for_role
+
+# Semantic answer cache: paraphrased questions ("what is photosynthesis",
+# "explain photosynthesis pls") reuse an earlier answer when their embeddings
+# are close enough. Each namespace holds a compact float32 matrix of question
+# embeddings searched with one matrix-vector product.
+#
+# Namespaces are per role and request context. The frontend sends the user's
+# own profile as context, so "what is my math grade?" is only ever answered
+# from an entry cached for the same profile. Turns with conversation history
+# are not cached: a follow-up like "give me another example" means something
+# different in every conversation. Questions about an uploaded document are
+# also scoped to the document.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))  # per namespace
+SEMANTIC_CACHE_MAX_NAMESPACES = int(os.getenv("SEMANTIC_CACHE_MAX_NAMESPACES", "1000"))
+
+_namespaces = OrderedDict()  # namespace key -> _Namespace, least recently used first
+stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+class _Namespace:
+    def __init__(self, dim):
+        self.vectors = np.zeros((1, dim), dtype=np.float32)
+        self.last_used = np.zeros(1, dtype=np.float64)
+        self.expires_at = np.zeros(1, dtype=np.float64)
+        self.answers = []
+        self.questions = []
+
+    def __len__(self):
+        return len(self.answers)
+
+    def search(self, vector):
+        """(row, similarity) of the closest live entry, or (None, 0.0)"""
+        count = len(self)
+        if count == 0:
+            return None, 0.0
+        similarities = self.vectors[:count] @ vector
+        similarities[self.expires_at[:count] < time.time()] = -1.0
+        row = int(np.argmax(similarities))
+        return row, float(similarities[row])
+
+    def add(self, vector, question, answer, ttl):
+        count = len(self)
+        if count >= SEMANTIC_CACHE_MAX_ENTRIES:
+            # Overwrite the least recently used row in place
+            row = int(np.argmin(self.last_used[:count]))
+            self.answers[row] = answer
+            self.questions[row] = question
+            stats["evictions"] += 1
+        else:
+            if count == len(self.vectors):
+                grow = min(len(self.vectors) * 2, SEMANTIC_CACHE_MAX_ENTRIES)
+                self.vectors = np.resize(self.vectors, (grow, self.vectors.shape[1]))
+                self.last_used = np.resize(self.last_used, grow)
+                self.expires_at = np.resize(self.expires_at, grow)
+            row = count
+            self.answers.append(answer)
+            self.questions.append(question)
+        self.vectors[row] = vector
+        self.last_used[row] = time.time()
+        self.expires_at[row] = time.time() + ttl
+
+def is_enabled():
+    return SEMANTIC_CACHE_ENABLED and embeddings.is_available()
+
+def namespace_key(role, context="", history="", document_id=None):
+    """Cache namespace for a request, or None when it should not use the semantic cache"""
+    if history:
+        return None
+    scope = f"{context or ''}|{document_id or ''}"
+    return f"{role}:{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:16]}"
+
+async def lookup(namespace, question):
+    """Return (embedding, cached_answer_or_None); the embedding is reused by store()"""
+    if namespace is None:
+        return None, None
+    try:
+        vector = await embeddings.embed_one(question)
+    except Exception as e:
+        stats["errors"] += 1
+        logging.warning(f"Semantic cache embedding failed: {str(e)}")
+        return None, None
+
+    entries = _namespaces.get(namespace)
+    if entries is not None:
+        _namespaces.move_to_end(namespace)
+        row, similarity = entries.search(vector)
+        if row is not None and similarity >= SEMANTIC_CACHE_THRESHOLD:
+            entries.last_used[row] = time.time()
+            stats["hits"] += 1
+            logging.info(f"Semantic cache hit ({similarity:.3f}) for '{question[:60]}' ~ '{entries.questions[row][:60]}'")
+            return vector, entries.answers[row]
+
+    stats["misses"] += 1
+    return vector, None
+
+def store(namespace, role, vector, question, answer):
+    ttl = ttl_for_role(role)
+    if namespace is None or vector is None or not answer or ttl <= 0:
+        return
+    entries = _namespaces.get(namespace)
+    if entries is None:
+        entries = _namespaces[namespace] = _Namespace(len(vector))
+        while len(_namespaces) > SEMANTIC_CACHE_MAX_NAMESPACES:
+            _, evicted = _namespaces.popitem(last=False)
+            stats["evictions"] += len(evicted)
+    _namespaces.move_to_end(namespace)
+    entries.add(vector, question, answer, ttl)
+    stats["stores"] += 1
+
+def get_stats():
+    lookups = stats["hits"] + stats["misses"]
+    return dict(
+        stats,
+        hit_rate=round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        namespaces=len(_namespaces),
+        entries=sum(len(entries) for entries in _namespaces.values()),
+        matrix_bytes=sum(entries.vectors.nbytes for entries in _namespaces.values()),
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        enabled=is_enabled(),
+        provider=embeddings.EMBEDDING_PROVIDER
+    )
@@ -0,0 +1,61 @@
+import os
+import asyncio
+import logging
+
+import openai_client
+from prompt_router import build_prompt, chunk_text, count_tokens, PROMPT_MAX_CONTEXT_TOKENS
+
+# Map-reduce condensing for documents longer than one prompt's context budget.
+# Chunks are summarized concurrently (map), and the notes are merged the same
+# way until they fit, so wall time grows with the number of rounds, not pages.
+SUMMARY_MAP_REDUCE = os.getenv("SUMMARY_MAP_REDUCE", "true").lower() == "true"
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "5"))
+SUMMARY_NOTE_TOKENS = int(os.getenv("SUMMARY_NOTE_TOKENS", "300"))
+SUMMARY_MAX_ROUNDS = 3
+
+MAP_PROMPT = (
+    "You are preparing study notes about {topic}. Extract the key facts, definitions, "
+    "examples and any questions from this part of a document. Be concise and do not "
+    "add information that is not in the text.\n\n{chunk}"
+)
+
+async def _summarize_chunks(chunks, topic, role, semaphore):
+    async def summarize(chunk):
+        async with semaphore:
+            return await openai_client.complete_chat(
+                MAP_PROMPT.format(topic=topic, chunk=chunk), temperature=0.2,
+                max_tokens=SUMMARY_NOTE_TOKENS, role=role
+            )
+    return await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+
+async def condense(text, topic, role=None, budget_tokens=PROMPT_MAX_CONTEXT_TOKENS, deployment=None):
+    """Reduce text to notes that fit in budget_tokens. Returns (notes, chunk_count)"""
+    deployment = deployment or openai_client.AZURE_OPENAI_DEPLOYMENT
+    semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+    chunk_count = 0
+
+    for round_number in range(SUMMARY_MAX_ROUNDS):
+        if count_tokens(text, deployment) <= budget_tokens:
+            break
+        chunks = chunk_text(text, SUMMARY_CHUNK_TOKENS, deployment)
+        if round_number == 0:
+            chunk_count = len(chunks)
+        logging.info(f"Map-reduce round {round_number + 1}: summarizing {len(chunks)} chunks")
+        notes = await _summarize_chunks(chunks, topic, role, semaphore)
+        text = "\n\n".join(note for note in notes if note)
+
+    return text, chunk_count
+
+async def summarize_document(full_text, role, topic, max_tokens=500):
+    """Role reply over a whole document, map-reducing it first if it is too long.
+
+    Returns (prompt, prompt_info); prompt_info gains a "chunks" count.
+    """
+    deployment = openai_client.AZURE_OPENAI_DEPLOYMENT
+    chunk_count = 0
+    if SUMMARY_MAP_REDUCE:
+        full_text, chunk_count = await condense(full_text, topic, role=role, deployment=deployment)
+    prompt, prompt_info = build_prompt(role, topic, full_text, deployment=deployment, max_completion_tokens=max_tokens)
+    prompt_info["chunks"] = chunk_count
+    return prompt, prompt_info
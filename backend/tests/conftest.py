@@ -0,0 +1,58 @@
+import os
+import sys
+import socket
+import subprocess
+import time
+import types
+import importlib
+import urllib.request
+
+import pytest
+
+# Backend modules import each other by bare name (import openai_client), and
+# read their settings from the environment at import time
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTION_APP_DIR = os.path.join(BACKEND_DIR, "gaief-function-app")
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("EMBEDDING_PROVIDER", "local")
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def fake_openai():
+    """Start tools/fake_openai_server.py with the given FAKE_OPENAI_* settings; returns its URL"""
+    servers = []
+
+    def start(**settings):
+        port = _free_port()
+        env = dict(os.environ, **{name: str(value) for name, value in settings.items()})
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "tools.fake_openai_server:app", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env
+        )
+        servers.append(process)
+        url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{url}/stats", timeout=1)
+                return url
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("fake OpenAI server did not start")
+
+    yield start
+    for process in servers:
+        process.terminate()
+        process.wait()
+
+@pytest.fixture
+def function_app():
+    """Import a function app module the way the Functions host does (as __app__.<name>)"""
+    if "__app__" not in sys.modules:
+        package = types.ModuleType("__app__")
+        package.__path__ = [FUNCTION_APP_DIR]
+        sys.modules["__app__"] = package
+    return lambda name: importlib.import_module(f"__app__.{name}")
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+import openai_client
+import openai_pool
+
+LATENCY = 0.5
+CONCURRENCY = 10
+
+@pytest.fixture
+def chat_app(fake_openai, monkeypatch):
+    """main.app with its Azure OpenAI client pointed at a fake with a fixed latency"""
+    url = fake_openai(FAKE_OPENAI_LATENCY=LATENCY)
+    monkeypatch.setattr(openai_pool, "AZURE_OPENAI_POOL", "")
+    monkeypatch.setattr(openai_client, "AZURE_OPENAI_ENDPOINT", url)
+    monkeypatch.setattr(openai_client, "AZURE_OPENAI_API_KEY", "test")
+    monkeypatch.setattr(openai_client, "backends", [])
+    return main.app
+
+async def concurrent_chats(app):
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=30) as http:
+            async def chat(i):
+                return await http.post("/chat", json={
+                    "user_role": "student",
+                    "topic": f"fractions #{i}",
+                    "context": f'{{"userId": "stu_load_{i}"}}',
+                    "bypass_cache": True
+                })
+
+            started = time.monotonic()
+            responses = await asyncio.gather(*(chat(i) for i in range(CONCURRENCY)))
+            return time.monotonic() - started, responses
+
+def test_concurrent_chats_overlap(chat_app):
+    elapsed, responses = asyncio.run(concurrent_chats(chat_app))
+
+    bodies = [response.json() for response in responses]
+    assert all(body.get("reply", "").startswith("Fake answer for:") for body in bodies), bodies
+    # Serialized calls would take CONCURRENCY * LATENCY (5s); overlapping ones about one latency
+    assert elapsed < 2 * LATENCY
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+import chat_writer
+import cosmos_client
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Capture chat_history batches; the first one times out after Cosmos committed it"""
+    batches = []
+
+    async def save_chat_records(user_id, records, upsert=False):
+        batches.append((records, upsert))
+        if len(batches) == 1:
+            raise TimeoutError("Cosmos timed out after committing the batch")
+
+    monkeypatch.setattr(cosmos_client, "save_chat_records", save_chat_records)
+    monkeypatch.setattr(chat_writer, "stats", dict.fromkeys(chat_writer.stats, 0))
+    return batches
+
+def test_retried_write_reuses_the_record_ids(writes):
+    async def run():
+        await chat_writer.start()
+        chat_writer.enqueue("stu_1", "student", "What is gravity?", "A force.")
+        chat_writer.enqueue("stu_1", "student", "And mass?", "Amount of matter.")
+        await chat_writer.stop()
+
+    asyncio.run(run())
+
+    assert len(writes) == 2
+    (first, _), (retry, upsert) = writes
+    assert [record["id"] for record in retry] == [record["id"] for record in first]
+    assert upsert
+    assert chat_writer.stats["retried_entries"] == 2 and chat_writer.stats["written_entries"] == 2
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import conversation_memory
+import cosmos_client
+import openai_client
+
+WINDOW = conversation_memory.MEMORY_RECENT_TURNS + conversation_memory.MEMORY_FOLD_BATCH
+
+def turn(number):
+    return {"question": f"Question {number}?", "answer": f"Answer {number}.", "timestamp": f"2026-10-17T10:{number:02d}:00"}
+
+@pytest.fixture
+def cosmos(monkeypatch):
+    """Count Cosmos reads and capture saved summaries"""
+    calls = {"reads": 0, "saved": [], "prompts": []}
+
+    async def read(*args, **kwargs):
+        calls["reads"] += 1
+        return []
+
+    async def save_conversation_summary(user_id, summary, summarized_through, turns_summarized):
+        calls["saved"].append((summary, summarized_through, turns_summarized))
+
+    async def complete_chat(prompt, **kwargs):
+        calls["prompts"].append(prompt)
+        return "Folded summary"
+
+    monkeypatch.setattr(cosmos_client, "database", object())
+    monkeypatch.setattr(conversation_memory, "get_chat_history", read)
+    monkeypatch.setattr(conversation_memory, "read_conversation_summary", read)
+    monkeypatch.setattr(conversation_memory, "save_conversation_summary", save_conversation_summary)
+    monkeypatch.setattr(openai_client, "complete_chat", complete_chat)
+    return calls
+
+def schedule(memory, answered):
+    async def run():
+        conversation_memory.schedule_fold("stu_1", "student", memory, answered)
+        await asyncio.gather(*conversation_memory._tasks)
+    asyncio.run(run())
+
+def test_fold_uses_the_loaded_turns_and_the_one_just_answered(cosmos):
+    memory = dict(conversation_memory._empty(), summary="Earlier summary", turns_summarized=8,
+                  turns=[turn(number) for number in range(1, WINDOW)])
+
+    schedule(memory, turn(WINDOW))
+
+    folded = WINDOW - conversation_memory.MEMORY_RECENT_TURNS
+    assert cosmos["reads"] == 0
+    assert cosmos["saved"] == [("Folded summary", turn(folded)["timestamp"], 8 + folded)]
+    assert "Earlier summary" in cosmos["prompts"][0] and f"Question {folded}?" in cosmos["prompts"][0]
+    assert f"Question {folded + 1}?" not in cosmos["prompts"][0]
+
+def test_no_fold_task_until_a_batch_is_due(cosmos):
+    memory = dict(conversation_memory._empty(), turns=[turn(number) for number in range(1, WINDOW - 1)])
+
+    schedule(memory, turn(WINDOW - 1))
+
+    assert cosmos["saved"] == [] and cosmos["reads"] == 0
+    assert not conversation_memory._folding
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from azure.cosmos.partition_key import NonePartitionKeyValue
+
+import cosmos_client
+
+class FakeContainer:
+    """A container partitioned by /userId, holding current and legacy profile documents"""
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+        self.point_reads = 0
+
+    def _partition_key(self, doc):
+        return doc.get("userId", NonePartitionKeyValue)
+
+    async def read(self):
+        return {"partitionKey": {"paths": ["/userId"]}}
+
+    async def query_items(self, query, parameters=None):
+        # Only the startup scan queries: documents a point read by id cannot address
+        self.queries += 1
+        for doc in self.docs:
+            if "userId" not in doc or doc["userId"] != doc["id"]:
+                row = {"id": doc["id"]}
+                if "userId" in doc:
+                    row.update(userId=doc["userId"], pk=doc["userId"])
+                yield row
+
+    async def read_item(self, item, partition_key, **kwargs):
+        self.point_reads += 1
+        for doc in self.docs:
+            if doc["id"] == item and self._partition_key(doc) == partition_key:
+                return doc
+        raise CosmosResourceNotFoundError(message="Not found")
+
+    async def read_items(self, items, max_concurrency=None):
+        return [doc for doc in self.docs if (doc["id"], self._partition_key(doc)) in items]
+
+DOCS = [
+    {"id": "stu_1", "userId": "stu_1", "name": "Current"},
+    {"id": "legacy-doc", "userId": "stu_2", "name": "Stored under another id"},
+    {"id": "stu_3", "name": "No partition key field"},
+]
+
+@pytest.fixture
+def container(monkeypatch):
+    container = FakeContainer(DOCS)
+    monkeypatch.setattr(cosmos_client, "database", object())
+    monkeypatch.setattr(cosmos_client, "_containers", {"students": container})
+    monkeypatch.setattr(cosmos_client, "_partition_key_paths", {})
+    monkeypatch.setattr(cosmos_client, "_legacy_partition_keys", {})
+    monkeypatch.setattr(cosmos_client, "_legacy_user_ids", {})
+    return container
+
+def read(item_id):
+    return asyncio.run(cosmos_client.read_profile("students", item_id))
+
+def test_legacy_documents_are_indexed_once_at_startup(container):
+    asyncio.run(cosmos_client.load_partition_keys(("students",)))
+
+    assert read("stu_1")["name"] == "Current"
+    assert read("stu_2")["name"] == "Stored under another id"
+    assert read("stu_3")["name"] == "No partition key field"
+    assert container.queries == 1
+
+def test_unknown_ids_cost_one_point_read_and_no_query(container):
+    asyncio.run(cosmos_client.load_partition_keys(("students",)))
+
+    assert read("stu_404") is None
+    assert (container.queries, container.point_reads) == (1, 1)
+
+def test_batch_read_maps_legacy_documents_back_to_the_requested_ids(container):
+    asyncio.run(cosmos_client.load_partition_keys(("students",)))
+
+    found = asyncio.run(cosmos_client.read_profiles("students", ["stu_1", "stu_2", "stu_3", "stu_404"]))
+
+    assert {item_id: doc["name"] for item_id, doc in found.items()} == {
+        "stu_1": "Current", "stu_2": "Stored under another id", "stu_3": "No partition key field"
+    }
+    assert container.queries == 1
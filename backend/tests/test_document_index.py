@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import document_index
+import embeddings
+
+DOCUMENT_ID = "0123456789abcdef0123456789abcdef"
+TEXT = (
+    "Photosynthesis turns sunlight into chemical energy in plant leaves. "
+    "The French Revolution began in 1789 with the storming of the Bastille. "
+    "Fractions describe parts of a whole, like three quarters of a pizza. "
+    "Volcanoes erupt when magma pushes up through the crust."
+)
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(embeddings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(document_index, "DOCUMENT_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(document_index, "DOCUMENT_CHUNK_TOKENS", 25)  # one sentence per chunk
+    monkeypatch.setattr(document_index, "_loaded", document_index.OrderedDict())
+
+def indexed():
+    return asyncio.run(document_index.index_document("stu_1", DOCUMENT_ID, TEXT, filename="notes.pdf"))
+
+def search(query, top_k):
+    return asyncio.run(document_index.search("stu_1", DOCUMENT_ID, query, top_k=top_k))
+
+def test_top_k_is_best_first():
+    assert indexed() == 4
+    results = search("When did the French Revolution start?", top_k=2)
+
+    assert len(results) == 2
+    assert "French Revolution" in results[0][2]
+    assert results[0][1] >= results[1][1]
+
+def test_top_k_larger_than_the_document_returns_every_chunk_ranked():
+    indexed()
+    results = search("magma and volcanoes", top_k=10)
+
+    assert sorted(row for row, _, _ in results) == [0, 1, 2, 3]
+    assert "Volcanoes" in results[0][2]
+    similarities = [similarity for _, similarity, _ in results]
+    assert similarities == sorted(similarities, reverse=True)
+
+def test_search_survives_reload_from_disk_and_reports_missing_documents():
+    indexed()
+    document_index._loaded.clear()
+    assert "Photosynthesis" in search("how do plants use sunlight", top_k=1)[0][2]
+    assert [document["document_id"] for document in asyncio.run(document_index.list_documents("stu_1"))] == [DOCUMENT_ID]
+
+    with pytest.raises(document_index.DocumentNotFound):
+        asyncio.run(document_index.search("stu_2", DOCUMENT_ID, "plants"))
+
+def test_unpunctuated_text_is_indexed_to_the_end(monkeypatch):
+    # OCR text: lines joined with spaces and no sentence breaks
+    monkeypatch.setattr(document_index, "DOCUMENT_CHUNK_TOKENS", 100)
+    filler = " ".join(f"page {number} of the fractions worksheet" for number in range(120))
+    text = f"{filler} volcanoes erupt when magma pushes up through the crust"
+
+    chunk_count = asyncio.run(document_index.index_document("stu_1", DOCUMENT_ID, text))
+    results = search("magma and volcanoes", top_k=1)
+
+    assert chunk_count > 10
+    assert "magma pushes up through the crust" in results[0][2]
+    assert results[0][0] == chunk_count - 1
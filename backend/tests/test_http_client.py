@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+
+def run(method, handler, monkeypatch):
+    """Send one request through http_client.request against a mock transport, returning it and the call count"""
+    calls = []
+
+    def transport(request):
+        calls.append(request)
+        return handler(len(calls))
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(transport)) as client:
+            monkeypatch.setattr(http_client, "client", client)
+            return await http_client.request(method, "https://example.test/analyze", document=b"%PDF-", retries=2)
+
+    monkeypatch.setattr(http_client, "RETRY_BACKOFF", 0)
+    return asyncio.run(send()), len(calls)
+
+def test_get_retries_server_errors(monkeypatch):
+    response, calls = run("GET", lambda n: httpx.Response(503 if n < 3 else 200), monkeypatch)
+    assert (response.status_code, calls) == (200, 3)
+
+def test_post_is_not_retried_once_it_may_have_been_accepted(monkeypatch):
+    response, calls = run("POST", lambda n: httpx.Response(503), monkeypatch)
+    assert (response.status_code, calls) == (503, 1)
+
+    def read_timeout(n):
+        raise httpx.ReadTimeout("no response")
+    with pytest.raises(httpx.ReadTimeout):
+        run("POST", read_timeout, monkeypatch)
+
+def test_post_retries_throttling_and_unsent_requests(monkeypatch):
+    throttled = lambda n: httpx.Response(429, headers={"retry-after-ms": "0"}) if n == 1 else httpx.Response(202)
+    response, calls = run("POST", throttled, monkeypatch)
+    assert (response.status_code, calls) == (202, 2)
+
+    def refused(n):
+        if n == 1:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(202)
+    response, calls = run("POST", refused, monkeypatch)
+    assert (response.status_code, calls) == (202, 2)
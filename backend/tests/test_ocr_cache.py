@@ -0,0 +1,45 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+import ocr_cache
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_cache, "OCR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ocr_cache, "OCR_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(ocr_cache, "OCR_CACHE_ENABLED", True)
+    monkeypatch.setattr(ocr_cache, "_index", None)
+    return tmp_path
+
+def put(key, text):
+    asyncio.run(ocr_cache.put(key, text))
+    time.sleep(0.01)  # distinct mtimes
+
+def get(key):
+    return asyncio.run(ocr_cache.get(key))
+
+def test_lru_order_survives_a_restart_without_atime(cache_dir):
+    put("a", "first")
+    put("b", "second")
+    assert get("a") == "first"
+    # Reading may not move atime (noatime mounts); the hit is recorded in the mtime
+    os.utime(cache_dir / "a.json", (0, os.stat(cache_dir / "a.json").st_mtime))
+
+    ocr_cache._index = None  # restart
+    put("c", "third")
+
+    assert get("b") is None
+    assert (get("a"), get("c")) == ("first", "third")
+
+def test_expiry_uses_the_stored_creation_time(cache_dir, monkeypatch):
+    put("a", "first")
+    entry = json.loads((cache_dir / "a.json").read_text())
+    entry["created_at"] -= ocr_cache.OCR_CACHE_TTL + 1
+    (cache_dir / "a.json").write_text(json.dumps(entry))
+
+    assert get("a") is None
+    assert not (cache_dir / "a.json").exists()
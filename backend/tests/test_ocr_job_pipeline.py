@@ -0,0 +1,119 @@
+import json
+import socket
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+azure_functions = pytest.importorskip("azure.functions")
+
+def azurite_running():
+    for port in (10000, 10002):  # blob, table
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+        except OSError:
+            return False
+    return True
+
+pytestmark = pytest.mark.skipif(not azurite_running(), reason="Azurite is not running (npx azurite)")
+
+class Output:
+    """Stands in for the queue output binding (func.Out)"""
+    def set(self, value):
+        self.value = value
+
+def queue_message(body, dequeue_count):
+    # func.QueueMessage can't be built with a dequeue count
+    return SimpleNamespace(get_json=lambda: json.loads(body), dequeue_count=dequeue_count)
+
+def multipart_request(files):
+    boundary = uuid.uuid4().hex
+    body = b""
+    for filename, content in files:
+        body += (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/pdf\r\n\r\n"
+        ).encode("utf-8") + content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode("utf-8")
+    return azure_functions.HttpRequest(
+        method="POST",
+        url="http://localhost/api/ocr-jobs",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}", "Content-Length": str(len(body))},
+        body=body
+    )
+
+@pytest.fixture
+def pipeline(function_app, monkeypatch):
+    """submitOcrJob, ocrJobWorker and ocrJobStatus on a fresh Azurite container and table"""
+    monkeypatch.setenv("AzureWebJobsStorage", "UseDevelopmentStorage=true")
+    job_store = function_app("shared_code.job_store")
+    suffix = uuid.uuid4().hex[:8]
+    monkeypatch.setattr(job_store, "OCR_JOB_CONTAINER", f"ocr-uploads-{suffix}")
+    monkeypatch.setattr(job_store, "OCR_JOB_TABLE", f"ocrjobs{suffix}")
+    monkeypatch.setattr(job_store, "_container", None)
+    monkeypatch.setattr(job_store, "_table", None)
+
+    worker = function_app("ocrJobWorker")
+    # OCR and summarization are stubbed: the pipeline plumbing is under test
+    monkeypatch.setattr(worker, "iter_text_ranges", lambda upload: [upload.open().read()])
+    monkeypatch.setattr(worker, "summarize_ranges", lambda ranges: (
+        " ".join(part.decode("latin-1") for part in ranges), "summary"
+    ))
+    yield SimpleNamespace(
+        submit=function_app("submitOcrJob"), worker=worker, status=function_app("ocrJobStatus"), job_store=job_store
+    )
+    job_store._get_container().delete_container()
+    job_store._get_table().delete_table()
+
+def job_status(pipeline, job_id):
+    request = azure_functions.HttpRequest(
+        method="GET", url=f"http://localhost/api/ocr-jobs/{job_id}", body=b"", route_params={"job_id": job_id}
+    )
+    response = pipeline.status.main(request)
+    return response.status_code, json.loads(response.get_body())
+
+def submit(pipeline, files):
+    queue = Output()
+    response = pipeline.submit.main(multipart_request(files), queue)
+    assert response.status_code == 202, response.get_body()
+    return json.loads(response.get_body())["job_id"], queue.value
+
+def test_submit_queue_worker_status(pipeline):
+    job_id, messages = submit(pipeline, [("a.pdf", b"%PDF-first file"), ("b.pdf", b"%PDF-second file")])
+
+    assert len(messages) == 2
+    assert job_status(pipeline, job_id)[1]["status"] == "queued"
+
+    for message in messages:
+        pipeline.worker.main(queue_message(message, dequeue_count=1))
+
+    status_code, job = job_status(pipeline, job_id)
+    assert status_code == 200
+    assert job["status"] == "succeeded" and job["completed"] == 2
+    assert [file["extracted_text_preview"] for file in job["files"]] == ["%PDF-first file", "%PDF-second file"]
+    assert all(file["summary"] == "summary" and file["attempts"] == 1 for file in job["files"])
+    # Processed uploads are removed from blob storage
+    assert list(pipeline.job_store._get_container().list_blobs()) == []
+
+def test_file_is_marked_failed_after_the_last_attempt(pipeline, monkeypatch):
+    job_id, messages = submit(pipeline, [("good.pdf", b"%PDF-good"), ("bad.pdf", b"%PDF-bad")])
+    good, bad = messages
+    pipeline.worker.main(queue_message(good, dequeue_count=1))
+
+    def broken(ranges):
+        raise RuntimeError("Document Intelligence unavailable")
+    monkeypatch.setattr(pipeline.worker, "summarize_ranges", broken)
+
+    # The host redelivers the message until maxDequeueCount (3)
+    for attempt in (1, 2):
+        with pytest.raises(RuntimeError):
+            pipeline.worker.main(queue_message(bad, dequeue_count=attempt))
+        assert job_status(pipeline, job_id)[1]["files"][1]["status"] == "queued"
+    pipeline.worker.main(queue_message(bad, dequeue_count=3))
+
+    job = job_status(pipeline, job_id)[1]
+    assert job["status"] == "partially_failed" and job["completed"] == 2
+    assert job["files"][1]["status"] == "failed"
+    assert "Document Intelligence unavailable" in job["files"][1]["error"]
+    assert job_status(pipeline, "no-such-job")[0] == 404
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import types
+
+import httpx
+import openai
+import pytest
+
+import openai_client
+import openai_pool
+import prompt_router
+import rate_limiter
+
+TPM = 6000  # small, so a 500-token reservation is far more than a few seconds of refill
+
+@pytest.fixture
+def pool(fake_openai, monkeypatch):
+    """A throttled backend (every call is a 429) ahead of a healthy one"""
+    throttled = fake_openai(FAKE_OPENAI_429_RATE=1, FAKE_OPENAI_LATENCY=0.05, FAKE_OPENAI_TPM=TPM)
+    healthy = fake_openai(FAKE_OPENAI_429_RATE=0, FAKE_OPENAI_LATENCY=0.05, FAKE_OPENAI_TPM=TPM,
+                          FAKE_OPENAI_STREAM_CHUNKS=4)
+    monkeypatch.setattr(openai_pool, "AZURE_OPENAI_POOL", json.dumps([
+        {"name": "throttled", "endpoint": throttled, "api_key": "test", "tpm": TPM},
+        {"name": "healthy", "endpoint": healthy, "api_key": "test", "tpm": TPM},
+    ]))
+    monkeypatch.setattr(openai_client, "backends", [])
+    monkeypatch.setattr(openai_client, "stats", dict.fromkeys(openai_client.stats, 0))
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+
+async def run(calls):
+    openai_client.init_openai_client()
+    try:
+        return await calls()
+    finally:
+        await openai_client.close_openai_client()
+
+def test_throttled_backend_fails_over_without_tripping_circuit(pool):
+    async def calls():
+        replies = [await openai_client.complete_chat("What is gravity?", max_tokens=500, role="student") for _ in range(5)]
+        backends = {backend.name: backend for backend in openai_client.backends}
+        return replies, backends
+
+    replies, backends = asyncio.run(run(calls))
+
+    assert all(reply.startswith("Fake answer for: What is gravity?") for reply in replies)
+    throttled, healthy = backends["throttled"], backends["healthy"]
+    assert throttled.throttles >= 1
+    assert throttled.consecutive_failures == 0 and throttled.error_rate == 0.0
+    assert not throttled.get_stats()["circuit_open"]
+    assert healthy.calls == 5 and healthy.failures == 0
+    assert openai_client.stats["failovers"] >= 1
+
+    # The 429 gave its reservation back; the healthy backend was charged the
+    # reported usage (20 tokens per call), not the 500+ token reservations
+    assert rate_limiter._limiters["throttled"].tokens.level == pytest.approx(TPM, abs=50)
+    assert rate_limiter._limiters["healthy"].tokens.level >= TPM - 5 * 20 - 50
+
+def test_stream_settles_its_reservation(pool):
+    async def calls():
+        return "".join([delta async for delta in openai_client.stream_chat("What is gravity?", max_tokens=500)])
+
+    reply = asyncio.run(run(calls))
+
+    assert reply.startswith("Fake streamed answer for: What is gravity?")
+    assert rate_limiter._limiters["throttled"].tokens.level == pytest.approx(TPM, abs=50)
+    assert rate_limiter._limiters["healthy"].tokens.level >= TPM - 100
+
+@pytest.fixture
+def function_pool(function_app, monkeypatch):
+    pool = function_app("shared_code.openai_pool")
+    for name in ("AZURE_OPENAI_POOL", "AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_KEY", "AZURE_OPENAI_DEPLOYMENT"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(pool, "_configs", None)
+    monkeypatch.setattr(pool, "_backends", None)
+    return pool
+
+def test_function_app_throttled_backend_fails_over_without_tripping_circuit(function_pool, fake_openai, monkeypatch):
+    throttled = fake_openai(FAKE_OPENAI_429_RATE=1, FAKE_OPENAI_LATENCY=0.05)
+    healthy = fake_openai(FAKE_OPENAI_429_RATE=0, FAKE_OPENAI_LATENCY=0.05)
+    monkeypatch.setenv("AZURE_OPENAI_POOL", json.dumps([
+        {"name": "throttled", "endpoint": throttled, "api_key": "test", "deployment": "gpt-35-turbo"},
+        {"name": "healthy", "endpoint": healthy, "api_key": "test", "deployment": "gpt-35-turbo"},
+    ]))
+
+    replies = [function_pool.complete([{"role": "user", "content": "What is gravity?"}]) for _ in range(5)]
+
+    assert all(reply.startswith("Fake answer for: What is gravity?") for reply in replies)
+    backends = {backend.name: backend for backend in function_pool.get_backends()}
+    assert backends["throttled"].throttles >= 1
+    assert backends["throttled"].consecutive_failures == 0 and backends["throttled"].error_rate == 0.0
+    assert backends["healthy"].failures == 0
+
+@pytest.mark.parametrize("pool", ["not json", '{"endpoint": "https://x"}', '[{"name": "no-endpoint"}, "eastus"]'])
+def test_function_app_unusable_pool_falls_back_to_the_single_endpoint(function_pool, monkeypatch, pool):
+    monkeypatch.setenv("AZURE_OPENAI_POOL", pool)
+    assert not function_pool.is_configured()
+
+    monkeypatch.setattr(function_pool, "_configs", None)
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://single.openai.azure.com")
+    monkeypatch.setenv("AZURE_OPENAI_KEY", "test")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo")
+    assert function_pool.is_configured()
+    assert [backend.name for backend in function_pool.get_backends()] == ["gpt-35-turbo"]
+
+class FakeCompletions:
+    """Stands in for client.chat.completions.with_raw_response"""
+    def __init__(self, create):
+        self.create = create
+
+def fake_backend(name, create):
+    backend = openai_pool.Backend(name, f"https://{name}.example", "test", "gpt-35-turbo", tpm=TPM)
+    backend.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(
+        with_raw_response=FakeCompletions(create)
+    )))
+    return backend
+
+def raw_response(content, total_tokens=20):
+    response = types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+        usage=types.SimpleNamespace(prompt_tokens=10, completion_tokens=total_tokens - 10, total_tokens=total_tokens)
+    )
+    return types.SimpleNamespace(headers={}, parse=lambda: response)
+
+@pytest.fixture
+def limiters(monkeypatch):
+    monkeypatch.setattr(openai_client, "stats", dict.fromkeys(openai_client.stats, 0))
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_ENABLED", True)
+
+def test_caller_errors_do_not_count_against_the_backend(limiters, monkeypatch):
+    async def create(**request):
+        response = httpx.Response(400, request=httpx.Request("POST", "https://bad.example"))
+        raise openai.BadRequestError("content filter", response=response, body=None)
+    backend = fake_backend("bad-request", create)
+    monkeypatch.setattr(openai_client, "backends", [backend])
+
+    for _ in range(openai_pool.CIRCUIT_FAILURE_THRESHOLD + 1):
+        with pytest.raises(openai.BadRequestError):
+            asyncio.run(openai_client.complete_chat("Something the filter rejects", max_tokens=500))
+
+    assert backend.failures == 0 and backend.consecutive_failures == 0 and backend.error_rate == 0.0
+    assert not backend.get_stats()["circuit_open"]
+    assert rate_limiter._limiters["bad-request"].tokens.level == pytest.approx(TPM, abs=5)
+
+def test_hedge_loser_settles_its_reservation(limiters, monkeypatch):
+    async def slow(**request):
+        await asyncio.sleep(10)
+    async def fast(**request):
+        return raw_response("Fast answer")
+    primary, secondary = fake_backend("slow", slow), fake_backend("fast", fast)
+    primary.latencies.extend([0.01] * 20)
+    primary.ewma_latency, secondary.ewma_latency = 0.01, 0.02
+    monkeypatch.setattr(openai_client, "backends", [primary, secondary])
+    monkeypatch.setattr(openai_client, "AZURE_OPENAI_HEDGE", True)
+
+    reply = asyncio.run(openai_client.complete_chat("What is gravity?", max_tokens=500))
+
+    assert reply == "Fast answer"
+    assert openai_client.stats["hedge_wins"] == 1
+    # The cancelled call keeps only its prompt tokens, not the 500-token completion allowance
+    prompt_tokens = prompt_router.count_tokens("What is gravity?", openai_client.AZURE_OPENAI_DEPLOYMENT)
+    assert rate_limiter._limiters["slow"].tokens.level == pytest.approx(TPM - prompt_tokens, abs=5)
+    assert primary.failures == 0
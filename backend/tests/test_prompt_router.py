@@ -0,0 +1,83 @@
+import pytest
+
+import prompt_router
+from prompt_router import build_prompt, chunk_text, count_tokens, trim_to_budget
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Deterministic counts (characters / 4) whether or not tiktoken can load
+    monkeypatch.setattr(prompt_router, "tiktoken", None)
+
+def sentence(word, tokens):
+    """A sentence of about `tokens` estimated tokens"""
+    return (word + " ") * (tokens * 4 // (len(word) + 1) - 1) + word[:-1] + "."
+
+def test_short_text_is_untouched():
+    assert trim_to_budget("Plants need light.", 100) == "Plants need light."
+    assert trim_to_budget("Plants need light.", 0) == ""
+
+def test_trim_keeps_whole_paragraphs_then_sentences():
+    first = "Photosynthesis happens in leaves. Chlorophyll absorbs light."
+    second = "Water comes up from the roots. Carbon dioxide enters through stomata. Oxygen is released."
+    text = f"{first}\n\n{second}"
+    budget = count_tokens(first) + 1 + count_tokens("Water comes up from the roots.") + 2
+
+    trimmed = trim_to_budget(text, budget)
+
+    assert trimmed == f"{first}\n\nWater comes up from the roots."
+    assert count_tokens(trimmed) <= budget
+
+def test_trim_hard_cuts_a_single_long_line():
+    text = "x" * 400
+    trimmed = trim_to_budget(text, 10)
+    assert trimmed == "x" * 40
+    assert count_tokens(trimmed) <= 10
+
+def test_chunks_respect_the_budget_and_keep_sentence_order():
+    sentences = [sentence(word, 6) for word in ("alpha", "bravo", "charlie", "delta", "echo")]
+    chunks = chunk_text(" ".join(sentences), 15)
+
+    assert len(chunks) == 3
+    assert all(count_tokens(chunk) <= 15 for chunk in chunks)
+    assert " ".join(chunks) == " ".join(sentences)
+
+def test_sentence_longer_than_a_chunk_is_split_into_windows():
+    long_sentence = "word " * 100 + "end."
+    chunks = chunk_text(f"Short one. {long_sentence} Short two.", 20)
+
+    assert chunks[0] == "Short one."
+    assert chunks[-1] == "Short two."
+    assert all(count_tokens(chunk) <= 20 for chunk in chunks)
+    assert " ".join(chunks[1:-1]) == long_sentence
+
+def test_unpunctuated_text_is_chunked_without_loss():
+    # OCR output: lines joined with spaces, no sentence breaks
+    words = [f"line{number}" for number in range(1500)]
+    chunks = chunk_text(" ".join(words), 300)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+    assert " ".join(chunks).split() == words
+
+def test_build_prompt_fits_context_window(monkeypatch):
+    monkeypatch.setattr(prompt_router, "DEFAULT_CONTEXT_WINDOW", 1000)
+    context = "\n\n".join(sentence("grade", 50) for _ in range(40))
+
+    prompt, info = build_prompt("student", "fractions", context, max_completion_tokens=500, history="User: hi\nAssistant: hello")
+
+    assert info["context_truncated"]
+    assert info["context_tokens"] <= info["context_budget"]
+    assert info["prompt_tokens"] + 500 + prompt_router.PROMPT_SAFETY_MARGIN <= 1000
+    assert prompt.startswith("User: hi")
+
+def test_function_app_chunks_unpunctuated_text_without_loss(function_app, monkeypatch):
+    text_budget = function_app("shared_code.text_budget")
+    monkeypatch.setattr(text_budget, "_encoding_loaded", True)
+    monkeypatch.setattr(text_budget, "_encoding", None)
+    words = [f"line{number}" for number in range(1500)]
+
+    chunks = text_budget.chunk_text(" ".join(words), 300)
+
+    assert len(chunks) > 1
+    assert all(text_budget.count_tokens(chunk) <= 300 for chunk in chunks)
+    assert " ".join(chunks).split() == words
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+import rate_limiter
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "stats", dict.fromkeys(rate_limiter.stats, 0))
+
+class Clock:
+    """time module stand-in whose monotonic() can be moved forward"""
+    def __init__(self):
+        self.offset = 0.0
+
+    def monotonic(self):
+        return time.monotonic() + self.offset
+
+async def granted_order(limiter, callers, before_release=None):
+    """Queue (role, tokens) callers while the limiter is blocked, then release it; returns roles in grant order"""
+    limiter.blocked_until = float("inf")
+    order = []
+
+    async def call(role, tokens):
+        await limiter.acquire(tokens, role=role)
+        order.append(role)
+
+    tasks = []
+    for role, tokens in callers:
+        if before_release:
+            before_release(role)
+        tasks.append(asyncio.create_task(call(role, tokens)))
+        await asyncio.sleep(0)  # queued in this order
+    limiter.blocked_until = 0.0
+    limiter._grant_ready()
+    await asyncio.gather(*tasks)
+    return order
+
+def test_queue_serves_students_before_parents_before_teachers():
+    limiter = rate_limiter.DeploymentLimiter("gpt", rpm=100, tpm=100000)
+    order = asyncio.run(granted_order(limiter, [("teacher", 10), ("parent", 10), ("student", 10)]))
+    assert order == ["student", "parent", "teacher"]
+
+def test_teacher_waiting_longer_than_its_handicap_goes_first(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    limiter = rate_limiter.DeploymentLimiter("gpt", rpm=100, tpm=100000)
+
+    def arrive(role):
+        # The student turns up after the teacher has waited out its 5s handicap
+        if role == "student":
+            clock.offset += rate_limiter.ROLE_PRIORITY_DELAY["teacher"] + 1
+
+    order = asyncio.run(granted_order(limiter, [("teacher", 10), ("student", 10)], before_release=arrive))
+    assert order == ["teacher", "student"]
+
+def test_caller_past_its_deadline_gets_a_timeout_and_leaves_the_queue():
+    limiter = rate_limiter.DeploymentLimiter("gpt", rpm=100, tpm=100000)
+
+    async def run():
+        limiter.blocked_until = time.monotonic() + 30
+        with pytest.raises(rate_limiter.RateLimitTimeout) as timeout:
+            await limiter.acquire(10, role="student", deadline=time.monotonic() + 0.05)
+        return timeout.value
+
+    error = asyncio.run(run())
+    assert error.retry_after >= 29
+    assert limiter.queue_length() == 0
+    assert rate_limiter.stats["timeouts"] == 1 and rate_limiter.stats["granted"] == 0
+
+def test_refund_settle_and_throttle_return_reserved_tokens():
+    limiter = rate_limiter.DeploymentLimiter("gpt", rpm=100, tpm=1000)
+
+    async def run():
+        await limiter.acquire(600, role="student")
+        after_acquire = limiter.tokens.level
+        limiter.refund(600)
+        after_refund = limiter.tokens.level
+
+        await limiter.acquire(600, role="student")
+        limiter.settle(600, 100)  # used 100 of the 600 reserved
+        after_settle = limiter.tokens.level
+
+        await limiter.acquire(600, role="student")
+        delay = limiter.throttled({"retry-after-ms": "1500", "x-ratelimit-remaining-tokens": "700"}, reserved_tokens=600)
+        return after_acquire, after_refund, after_settle, delay
+
+    after_acquire, after_refund, after_settle, delay = asyncio.run(run())
+    assert after_acquire == pytest.approx(400, abs=5)
+    assert after_refund == pytest.approx(1000, abs=5)
+    assert after_settle == pytest.approx(900, abs=5)
+    # The 429's reservation comes back, capped by what the service says is left
+    assert limiter.tokens.level == pytest.approx(700, abs=5)
+    assert delay == 1.5 and limiter.blocked_until > time.monotonic() + 1
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+
+import embeddings
+import semantic_cache
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(embeddings, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(semantic_cache, "_namespaces", semantic_cache.OrderedDict())
+    monkeypatch.setattr(semantic_cache, "stats", dict.fromkeys(semantic_cache.stats, 0))
+
+def ask(namespace, question):
+    return asyncio.run(semantic_cache.lookup(namespace, question))
+
+def unit(*values):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+def test_paraphrase_hits_with_local_embedding():
+    namespace = semantic_cache.namespace_key("student", "{}")
+    vector, answer = ask(namespace, "What is photosynthesis?")
+    assert answer is None
+    semantic_cache.store(namespace, "student", vector, "What is photosynthesis?", "Plants make food from light.")
+
+    _, answer = ask(namespace, "explain photosynthesis pls")
+    assert answer == "Plants make food from light."
+
+def test_same_question_with_other_context_misses():
+    alice = json.dumps({"userId": "stu_a", "name": "Alice", "grades": {"math": "A"}})
+    bob = json.dumps({"userId": "stu_b", "name": "Bob", "grades": {"math": "C"}})
+    namespace_a = semantic_cache.namespace_key("student", alice)
+    vector, _ = ask(namespace_a, "What is my math grade?")
+    semantic_cache.store(namespace_a, "student", vector, "What is my math grade?", "Alice, your math grade is A.")
+
+    namespace_b = semantic_cache.namespace_key("student", bob)
+    assert namespace_b != namespace_a
+    _, answer = ask(namespace_b, "What is my math grade?")
+    assert answer is None
+    assert ask(namespace_a, "What is my math grade?")[1] == "Alice, your math grade is A."
+
+def test_namespaces_isolate_roles_documents_and_history():
+    keys = {
+        semantic_cache.namespace_key("student", "{}"),
+        semantic_cache.namespace_key("teacher", "{}"),
+        semantic_cache.namespace_key("student", "{}", document_id="doc1"),
+        semantic_cache.namespace_key("student", "{}", document_id="doc2"),
+    }
+    assert len(keys) == 4
+    assert semantic_cache.namespace_key("student", "{}", history="Earlier: hi") is None
+    assert ask(None, "anything") == (None, None)
+
+def test_threshold(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_THRESHOLD", 0.92)
+    namespace = semantic_cache.namespace_key("student", "{}")
+    semantic_cache.store(namespace, "student", unit(1.0), "stored", "answer")
+
+    # cos(angle) of unit(1, t) with unit(1) is 1 / sqrt(1 + t^2)
+    for similarity, expected in ((0.93, "answer"), (0.91, None)):
+        query = unit(1.0, np.sqrt(1 / similarity ** 2 - 1))
+        monkeypatch.setattr(embeddings, "embed_one", lambda text, query=query: asyncio.sleep(0, query))
+        assert ask(namespace, "query")[1] == expected
+
+def test_expired_entries_miss(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    namespace = semantic_cache.namespace_key("student", "{}")
+    vector, _ = ask(namespace, "What is gravity?")
+    semantic_cache.store(namespace, "student", vector, "What is gravity?", "A force.")
+    assert ask(namespace, "What is gravity?")[1] == "A force."
+
+    ttl = semantic_cache.ttl_for_role("student")
+    monkeypatch.setattr(time, "time", lambda: now + ttl + 1)
+    assert ask(namespace, "What is gravity?")[1] is None
+
+def test_full_namespace_evicts_least_recently_used_row(monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SEMANTIC_CACHE_MAX_ENTRIES", 2)
+    clock = iter(range(1_000_000, 2_000_000))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    namespace = semantic_cache.namespace_key("student", "{}")
+    for question in ("What is gravity?", "What is friction?"):
+        vector, _ = ask(namespace, question)
+        semantic_cache.store(namespace, "student", vector, question, question.upper())
+
+    assert ask(namespace, "What is gravity?")[1] == "WHAT IS GRAVITY?"  # now the most recently used
+    vector, _ = ask(namespace, "What is magnetism?")
+    semantic_cache.store(namespace, "student", vector, "What is magnetism?", "WHAT IS MAGNETISM?")
+
+    assert semantic_cache.stats["evictions"] == 1
+    assert len(semantic_cache._namespaces[namespace]) == 2
+    assert ask(namespace, "What is friction?")[1] is None
+    assert ask(namespace, "What is gravity?")[1] == "WHAT IS GRAVITY?"
+    assert ask(namespace, "What is magnetism?")[1] == "WHAT IS MAGNETISM?"
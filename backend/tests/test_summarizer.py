@@ -0,0 +1,35 @@
+import pytest
+
+@pytest.fixture
+def upload_ocr_summary(function_app, monkeypatch):
+    module = function_app("uploadOcrSummary")
+    text_budget = function_app("shared_code.text_budget")
+    # Deterministic counts (characters / 4) whether or not tiktoken can load
+    monkeypatch.setattr(text_budget, "_encoding_loaded", True)
+    monkeypatch.setattr(text_budget, "_encoding", None)
+    monkeypatch.setattr(module, "SUMMARY_MAX_INPUT_TOKENS", 100)
+    monkeypatch.setattr(module, "SUMMARY_CHUNK_TOKENS", 50)
+    return module
+
+def test_reduce_repeats_rounds_until_the_notes_fit(upload_ocr_summary, monkeypatch):
+    # OCR text with no sentence breaks, about 1,500 tokens
+    text = " ".join(f"line{number:04d}" for number in range(600))
+    calls = []
+
+    def complete(system_prompt, chunk, max_tokens=300):
+        calls.append(chunk)
+        words = chunk.split()
+        return f"{words[0]} {words[-1]}"
+    monkeypatch.setattr(upload_ocr_summary, "_complete", complete)
+
+    notes = upload_ocr_summary._reduce_to_budget(text)
+
+    assert upload_ocr_summary.count_tokens(notes) <= 100
+    assert notes.split()[0] == "line0000" and notes.split()[-1] == "line0599"
+    assert len(calls) > 30  # more than one round
+
+def test_reduce_fails_cleanly_when_every_chunk_summary_is_empty(upload_ocr_summary, monkeypatch):
+    monkeypatch.setattr(upload_ocr_summary, "_complete", lambda system_prompt, chunk, max_tokens=300: "")
+
+    with pytest.raises(Exception, match="empty"):
+        upload_ocr_summary._reduce_to_budget("word " * 1000)
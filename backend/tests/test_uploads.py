@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import tempfile
+
+import azure.functions as func
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile as StarletteUploadFile
+
+import uploads
+
+PDF = b"%PDF-1.7\n" + b"x" * 1000
+
+def upload_file(content, filename="notes.pdf"):
+    spool = tempfile.SpooledTemporaryFile()
+    spool.write(content)
+    spool.seek(0)
+    return StarletteUploadFile(spool, size=len(content), filename=filename)
+
+def receive(content, **kwargs):
+    return asyncio.run(uploads.receive(upload_file(content, **kwargs)))
+
+def test_receive_hashes_without_copying(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_BYTES", 64)  # several chunks
+    source = upload_file(PDF)
+    spool = source.file
+
+    upload = asyncio.run(uploads.receive(source))
+
+    assert upload.sha256 == hashlib.sha256(PDF).hexdigest()
+    assert len(upload) == len(PDF) and upload.filename == "notes.pdf"
+    assert upload._file is spool  # taken over, not copied
+    assert b"".join(upload.chunks()) == PDF
+    assert b"".join(upload.chunks()) == PDF  # re-streamable for retries
+    upload.close()
+
+@pytest.mark.parametrize("content", [b"PK\x03\x04 a zip file", b"%PD", b"", b"<html>%PDF-</html>"])
+def test_non_pdf_is_rejected(content):
+    with pytest.raises(uploads.UploadRejected) as rejected:
+        receive(content)
+    assert rejected.value.status_code == 415
+
+def test_oversize_is_rejected(monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_MAX_BYTES", 500)
+    with pytest.raises(uploads.UploadRejected) as rejected:
+        receive(PDF)
+    assert rejected.value.status_code == 413
+
+    # Also when the size is not known up front and only the read shows it
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_BYTES", 100)
+    source = upload_file(PDF)
+    source.size = None
+    with pytest.raises(uploads.UploadRejected) as rejected:
+        asyncio.run(uploads.receive(source))
+    assert rejected.value.status_code == 413
+
+def test_declared_too_large():
+    assert uploads.declared_too_large({"content-length": str(uploads.UPLOAD_MAX_BYTES * 2)})
+    assert not uploads.declared_too_large({"content-length": "1024"})
+    assert not uploads.declared_too_large({"content-length": "not a number"})
+
+def test_upload_outlives_the_request():
+    # Queued jobs read the file after the response, when the form has been closed
+    app = FastAPI()
+    received = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        received.append(await uploads.receive(file))
+        return {"size": received[-1].size}
+
+    with TestClient(app) as client:
+        response = client.post("/upload", files={"file": ("notes.pdf", PDF, "application/pdf")})
+
+    assert response.json() == {"size": len(PDF)}
+    assert b"".join(received[0].chunks()) == PDF
+    received[0].close()
+
+def test_function_app_uploads(function_app, monkeypatch):
+    function_uploads = function_app("shared_code.uploads")
+    monkeypatch.setattr(function_uploads, "UPLOAD_CHUNK_BYTES", 64)
+
+    upload = function_uploads.receive_chunks([PDF[:3], PDF[3:]], filename="notes.pdf")
+    assert upload.sha256 == hashlib.sha256(PDF).hexdigest() and upload.size == len(PDF)
+    assert b"".join(upload.chunks()) == PDF
+    upload.close()
+
+    for content, status_code in ((b"GIF89a", 415), (b"", 415)):
+        with pytest.raises(function_uploads.UploadRejected) as rejected:
+            function_uploads.receive_chunks([content])
+        assert rejected.value.status_code == status_code
+
+    monkeypatch.setattr(function_uploads, "UPLOAD_MAX_BYTES", 500)
+    with pytest.raises(function_uploads.UploadRejected) as rejected:
+        function_uploads.receive_chunks([PDF[:400], PDF[400:]])
+    assert rejected.value.status_code == 413
+
+    class Request:
+        headers = {"content-length": str(3 * (500 + function_uploads.MULTIPART_OVERHEAD))}
+    function_uploads.check_content_length(Request, max_files=3)
+    with pytest.raises(function_uploads.UploadRejected):
+        function_uploads.check_content_length(Request, max_files=2)
+
+def test_function_app_sync_upload_rejects_several_files(function_app):
+    upload_ocr_summary = function_app("uploadOcrSummary")
+    boundary = "gaief-test"
+    body = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n".encode() + PDF + b"\r\n"
+        for name in ("one.pdf", "two.pdf")
+    ) + f"--{boundary}--\r\n".encode()
+    request = func.HttpRequest(
+        "POST", "/api/uploadOcrSummary", body=body,
+        headers={"content-type": f"multipart/form-data; boundary={boundary}", "content-length": str(len(body))}
+    )
+
+    response = upload_ocr_summary.main(request)
+
+    assert response.status_code == 400
+    assert "one file per request" in json.loads(response.get_body())["error"]
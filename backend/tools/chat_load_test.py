@@ -0,0 +1,116 @@
+"""Concurrent /chat load test against a single uvicorn worker.
+
+Starts the fake completion server and one worker of main:app pointed at it,
+fires CONCURRENCY chats at once and compares the wall time with the fake
+per-request latency. With a non-blocking completion path the requests overlap
+and the wall time stays close to one latency; a blocking path serializes them.
+
+    cd backend && python tools/chat_load_test.py --concurrency 20 --latency 1
+
+With --stream the chats go to /chat/stream and the report adds time to first
+byte, which should be a fraction of the full generation time.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def start_server(module, port, env):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+async def wait_until_up(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.monotonic() < deadline:
+            try:
+                await http.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+async def run_load(app_url, concurrency, stream=False):
+    payload = {"user_role": "student", "topic": "fractions", "context": '{"userId": "stu_load"}'}
+    async with httpx.AsyncClient(timeout=120) as http:
+        async def one(i):
+            started = time.monotonic()
+            if not stream:
+                response = await http.post(f"{app_url}/chat", json=dict(payload, topic=f"fractions #{i}"))
+                elapsed = time.monotonic() - started
+                return elapsed, elapsed, response.json()
+
+            first_byte = None
+            body = {}
+            async with http.stream("POST", f"{app_url}/chat/stream", json=dict(payload, topic=f"fractions #{i}")) as response:
+                async for line in response.aiter_lines():
+                    if first_byte is None:
+                        first_byte = time.monotonic() - started
+                    if line.startswith("event: error"):
+                        body = {"error": "stream error"}
+                    elif line.startswith("event: done"):
+                        body = {"reply": "streamed"}
+            return first_byte, time.monotonic() - started, body
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        return time.monotonic() - started, results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and report time to first byte")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["FAKE_OPENAI_LATENCY"] = str(args.latency)
+    env["AZURE_OPENAI_ENDPOINT"] = f"http://127.0.0.1:{args.fake_port}"
+    env["AZURE_OPENAI_API_KEY"] = "fake-key"
+    # Keep the run self-contained: no real Cosmos writes
+    for name in ("COSMOS_ENDPOINT", "COSMOS_KEY", "COSMOS_DB_NAME"):
+        env.pop(name, None)
+
+    fake = start_server("tools.fake_openai_server:app", args.fake_port, env)
+    backend = start_server("main:app", args.app_port, env)
+    try:
+        app_url = f"http://127.0.0.1:{args.app_port}"
+        asyncio.run(wait_until_up(f"http://127.0.0.1:{args.fake_port}/docs"))
+        asyncio.run(wait_until_up(f"{app_url}/health"))
+
+        wall, results = asyncio.run(run_load(app_url, args.concurrency, stream=args.stream))
+        errors = [body for _, _, body in results if "reply" not in body]
+        latencies = sorted(elapsed for _, elapsed, _ in results)
+        first_bytes = sorted(first_byte for first_byte, _, _ in results if first_byte is not None)
+        serialized = args.concurrency * args.latency
+
+        print(f"requests:        {args.concurrency}")
+        print(f"errors:          {len(errors)}")
+        print(f"fake latency:    {args.latency:.2f}s")
+        print(f"wall time:       {wall:.2f}s (serialized would be ~{serialized:.2f}s)")
+        print(f"p50 / max:       {latencies[len(latencies) // 2]:.2f}s / {latencies[-1]:.2f}s")
+        print(f"overlap factor:  {serialized / wall:.1f}x")
+        if args.stream and first_bytes:
+            print(f"TTFB p50 / max:  {first_bytes[len(first_bytes) // 2]:.2f}s / {first_bytes[-1]:.2f}s")
+        if errors:
+            print(f"first error:     {errors[0]}")
+            sys.exit(1)
+    finally:
+        backend.terminate()
+        fake.terminate()
+        backend.wait()
+        fake.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Local stand-in for an Azure OpenAI chat completions deployment.
+
+Every completion sleeps for FAKE_OPENAI_LATENCY seconds before answering, so
+load tests can tell overlapping requests from serialized ones. Streaming
+requests spread the same latency over FAKE_OPENAI_STREAM_CHUNKS chunks.
+
+Throttling can be simulated the way Azure does it: FAKE_OPENAI_RPM caps
+requests per rolling minute and FAKE_OPENAI_429_RATE rejects that fraction of
+requests at random. Rejections are 429s with retry-after/retry-after-ms, and
+every response carries x-ratelimit-remaining-requests/-tokens.
+FAKE_OPENAI_SLOW_RATE makes that fraction of completions take
+FAKE_OPENAI_SLOW_FACTOR times longer, to give the latency a tail.
+
+    uvicorn tools.fake_openai_server:app --port 9100
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+import random
+from collections import deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+
+FAKE_OPENAI_LATENCY = float(os.getenv("FAKE_OPENAI_LATENCY", "1.0"))
+FAKE_OPENAI_STREAM_CHUNKS = int(os.getenv("FAKE_OPENAI_STREAM_CHUNKS", "10"))
+FAKE_OPENAI_RPM = int(os.getenv("FAKE_OPENAI_RPM", "0"))  # 0 = unlimited
+FAKE_OPENAI_TPM = int(os.getenv("FAKE_OPENAI_TPM", "120000"))
+FAKE_OPENAI_429_RATE = float(os.getenv("FAKE_OPENAI_429_RATE", "0"))
+FAKE_OPENAI_SLOW_RATE = float(os.getenv("FAKE_OPENAI_SLOW_RATE", "0"))
+FAKE_OPENAI_SLOW_FACTOR = float(os.getenv("FAKE_OPENAI_SLOW_FACTOR", "10"))
+
+app = FastAPI()
+_recent_requests = deque()  # arrival times of accepted requests in the last minute
+throttled_count = 0
+
+def _rate_limit_headers():
+    remaining = FAKE_OPENAI_RPM - len(_recent_requests) if FAKE_OPENAI_RPM else 1000
+    return {
+        "x-ratelimit-remaining-requests": str(max(0, remaining)),
+        "x-ratelimit-remaining-tokens": str(FAKE_OPENAI_TPM)
+    }
+
+def _throttle():
+    """Return a 429 response if this request should be rejected, else record it"""
+    global throttled_count
+    now = time.time()
+    while _recent_requests and _recent_requests[0] < now - 60:
+        _recent_requests.popleft()
+
+    retry_after = None
+    if FAKE_OPENAI_RPM and len(_recent_requests) >= FAKE_OPENAI_RPM:
+        retry_after = _recent_requests[0] + 60 - now
+    elif random.random() < FAKE_OPENAI_429_RATE:
+        retry_after = 1.0
+    if retry_after is None:
+        _recent_requests.append(now)
+        return None
+
+    throttled_count += 1
+    headers = _rate_limit_headers()
+    headers.update({"retry-after": str(max(1, round(retry_after))), "retry-after-ms": str(int(retry_after * 1000))})
+    return JSONResponse(
+        {"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit."}},
+        status_code=429,
+        headers=headers
+    )
+
+def _completion_body(deployment, content):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20}
+    }
+
+def _chunk_body(completion_id, deployment, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "finish_reason": finish_reason, "delta": delta}]
+    }
+
+async def _stream_completion(deployment, content):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    words = content.split(" ")
+    per_chunk = max(1, len(words) // FAKE_OPENAI_STREAM_CHUNKS)
+    pieces = [" ".join(words[i:i + per_chunk]) + " " for i in range(0, len(words), per_chunk)]
+    delay = FAKE_OPENAI_LATENCY / len(pieces)
+
+    yield f"data: {json.dumps(_chunk_body(completion_id, deployment, {'role': 'assistant', 'content': ''}))}\n\n"
+    for piece in pieces:
+        await asyncio.sleep(delay)
+        yield f"data: {json.dumps(_chunk_body(completion_id, deployment, {'content': piece}))}\n\n"
+    yield f"data: {json.dumps(_chunk_body(completion_id, deployment, {}, finish_reason='stop'))}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    rejection = _throttle()
+    if rejection is not None:
+        return rejection
+
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    if body.get("stream"):
+        content = f"Fake streamed answer for: {prompt[:60]} " + "lorem ipsum " * FAKE_OPENAI_STREAM_CHUNKS
+        return StreamingResponse(
+            _stream_completion(deployment, content), media_type="text/event-stream", headers=_rate_limit_headers()
+        )
+    slow = random.random() < FAKE_OPENAI_SLOW_RATE
+    await asyncio.sleep(FAKE_OPENAI_LATENCY * (FAKE_OPENAI_SLOW_FACTOR if slow else 1))
+    return JSONResponse(_completion_body(deployment, f"Fake answer for: {prompt[:60]}"), headers=_rate_limit_headers())
+
+@app.get("/stats")
+async def fake_stats():
+    return {"throttled": throttled_count, "requests_last_minute": len(_recent_requests)}
@@ -0,0 +1,127 @@
+"""Cold-start and warm-path timings for the uploadOcrSummary function.
+
+Every run starts a fresh Python process, the way a consumption-plan worker
+starts, loads the function package as the Functions host does
+(__app__.uploadOcrSummary) and invokes main() in-process:
+
+    import     loading the function module
+    get        first GET; also lists which SDKs were loaded by then (none expected)
+    post       first POST with --file (OCR and OpenAI clients get created here)
+    warm       further POSTs on the same process (--warm), reusing the clients
+
+    cd backend && pip install -r gaief-function-app/requirements.txt
+    python tools/function_cold_start_benchmark.py --runs 5
+    python tools/function_cold_start_benchmark.py --runs 3 --file sample.pdf --warm 5
+
+POSTs call the Document Intelligence and Azure OpenAI endpoints configured in
+the environment (AZURE_OPENAI_ENDPOINT can point at tools/fake_openai_server.py).
+Warm POSTs of the same file hit the OCR cache unless OCR_CACHE_ENABLED=false.
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import types
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTION_APP_DIR = os.path.join(BACKEND_DIR, "gaief-function-app")
+HEAVY_MODULES = ["azure.ai.formrecognizer", "openai", "tiktoken"]
+
+def multipart_request(func, path):
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        content = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return func.HttpRequest(
+        method="POST",
+        url="http://localhost/api/uploadOcrSummary",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        body=body
+    )
+
+def timed(call):
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+def child(file_path, warm):
+    """One cold worker: import, GET, then POSTs; prints the timings as JSON"""
+    # The host imports function folders as subpackages of __app__
+    package = types.ModuleType("__app__")
+    package.__path__ = [FUNCTION_APP_DIR]
+    sys.modules["__app__"] = package
+
+    timings = {}
+    function, timings["import"] = timed(lambda: importlib.import_module("__app__.uploadOcrSummary"))
+    import azure.functions as func
+
+    get_request = func.HttpRequest(method="GET", url="http://localhost/api/uploadOcrSummary", body=b"")
+    response, timings["get"] = timed(lambda: function.main(get_request))
+    timings["get_status"] = response.status_code
+    timings["loaded_after_get"] = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    if file_path:
+        response, timings["post"] = timed(lambda: function.main(multipart_request(func, file_path)))
+        timings["post_status"] = response.status_code
+        timings["warm"] = []
+        for _ in range(warm):
+            response, elapsed = timed(lambda: function.main(multipart_request(func, file_path)))
+            timings["warm"].append(elapsed)
+    print(json.dumps(timings))
+
+def summarize(name, values):
+    if not values:
+        return
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(0.95 * len(values)))]
+    print(f"{name:>8}: median {statistics.median(values) * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms  "
+          f"min {values[0] * 1000:8.1f} ms  max {values[-1] * 1000:8.1f} ms  (n={len(values)})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold worker processes to start")
+    parser.add_argument("--file", help="document to POST; without it only import and GET are timed")
+    parser.add_argument("--warm", type=int, default=3, help="POSTs after the first one, per process")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.file, args.warm)
+        return
+
+    results = []
+    process_times = []
+    for run in range(args.runs):
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--warm", str(args.warm)]
+        if args.file:
+            command += ["--file", os.path.abspath(args.file)]
+        started = time.perf_counter()
+        output = subprocess.run(command, cwd=FUNCTION_APP_DIR, capture_output=True, text=True)
+        process_times.append(time.perf_counter() - started)
+        if output.returncode != 0:
+            sys.exit(f"Run {run + 1} failed:\n{output.stderr}")
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"{args.runs} cold starts of uploadOcrSummary")
+    summarize("process", process_times)
+    summarize("import", [result["import"] for result in results])
+    summarize("get", [result["get"] for result in results])
+    summarize("post", [result["post"] for result in results if "post" in result])
+    summarize("warm", [elapsed for result in results for elapsed in result.get("warm", [])])
+    loaded = sorted({name for result in results for name in result["loaded_after_get"]})
+    print(f"SDKs loaded by a GET: {', '.join(loaded) if loaded else 'none'}")
+    statuses = sorted({result.get("post_status") for result in results if "post_status" in result})
+    if statuses:
+        print(f"POST status codes: {statuses}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Copy embedded chatHistory arrays into the chat_history container.
+
+Walks the students/teachers/parents containers in id order and writes every
+embedded chatHistory entry to chat_history as its own record. Record ids are
+derived from the entry contents, so re-running is idempotent: entries are
+upserted, never duplicated.
+
+Progress (last processed id per container) is saved to a checkpoint file
+after every page, so an interrupted run resumes where it stopped.
+
+With --strip, the chatHistory array is removed from the profile document once
+its entries are copied. The replace is conditional on the document's _etag,
+so a profile changed in the meantime is skipped and picked up on the next run.
+
+    cd backend && python tools/migrate_chat_history.py --dry-run
+    cd backend && python tools/migrate_chat_history.py --strip
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cosmos_client  # noqa: E402
+
+ROLES = {"students": "student", "teachers": "teacher", "parents": "parent"}
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def migrated_record_id(user_id, entry, index):
+    raw = json.dumps([user_id, entry.get("timestamp"), entry.get("question"), index], ensure_ascii=False)
+    return f"{user_id}-{hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]}"
+
+def records_for(doc, user_role):
+    user_id = doc.get("userId") or doc["id"]
+    records = []
+    for index, entry in enumerate(doc.get("chatHistory", [])):
+        records.append(cosmos_client.build_chat_record(
+            user_id,
+            user_role,
+            entry.get("question") or entry.get("message"),
+            entry.get("answer") or entry.get("response"),
+            timestamp=entry.get("timestamp"),
+            record_id=migrated_record_id(user_id, entry, index)
+        ))
+    return user_id, records
+
+async def migrate_container(container_name, checkpoint, args):
+    state = checkpoint.setdefault(container_name, {"last_id": "", "done": False, "documents": 0, "records": 0})
+    if state["done"]:
+        print(f"{container_name}: already migrated, skipping")
+        return
+
+    container = cosmos_client.get_container(container_name)
+    query = (
+        "SELECT TOP @pageSize * FROM c "
+        "WHERE c.id > @lastId AND IS_DEFINED(c.chatHistory) AND ARRAY_LENGTH(c.chatHistory) > 0 "
+        "ORDER BY c.id"
+    )
+
+    while True:
+        parameters = [
+            {"name": "@pageSize", "value": args.page_size},
+            {"name": "@lastId", "value": state["last_id"]}
+        ]
+        page = [doc async for doc in container.query_items(query, parameters=parameters)]
+        if not page:
+            break
+
+        for doc in page:
+            user_id, records = records_for(doc, ROLES[container_name])
+            if not args.dry_run:
+                await cosmos_client.save_chat_records(user_id, records, upsert=True)
+                if args.strip:
+                    doc.pop("chatHistory", None)
+                    try:
+                        await container.replace_item(
+                            item=doc["id"],
+                            body=doc,
+                            etag=doc["_etag"],
+                            match_condition=MatchConditions.IfNotModified
+                        )
+                    except CosmosAccessConditionFailedError:
+                        logging.warning(f"{container_name}/{doc['id']} changed during migration, not stripped")
+            state["documents"] += 1
+            state["records"] += len(records)
+            state["last_id"] = doc["id"]
+
+        if not args.dry_run:
+            save_checkpoint(args.checkpoint, checkpoint)
+        print(f"{container_name}: {state['documents']} documents, {state['records']} records (last id {state['last_id']})")
+
+    state["done"] = not args.dry_run
+    if not args.dry_run:
+        save_checkpoint(args.checkpoint, checkpoint)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--containers", nargs="+", default=list(ROLES), choices=list(ROLES))
+    parser.add_argument("--checkpoint", default="chat_history_migration.json")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--strip", action="store_true", help="remove embedded chatHistory after copying")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be migrated without writing")
+    args = parser.parse_args()
+
+    if not await cosmos_client.init_cosmos():
+        sys.exit("Cosmos DB not configured: set COSMOS_ENDPOINT, COSMOS_KEY and COSMOS_DB_NAME")
+    try:
+        if not args.dry_run:
+            await cosmos_client.create_chat_container_if_not_exists()
+        checkpoint = load_checkpoint(args.checkpoint)
+        for container_name in args.containers:
+            await migrate_container(container_name, checkpoint, args)
+    finally:
+        await cosmos_client.close_cosmos()
+
+if __name__ == "__main__":
+    asyncio.run(main())
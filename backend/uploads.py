@@ -0,0 +1,95 @@
+import os
+import io
+import hashlib
+
+# Uploaded documents are validated and hashed in UPLOAD_CHUNK_BYTES pieces
+# straight from the spooled file the multipart parser already wrote (in
+# memory up to 1 MB, on disk after that), and that file is then taken over
+# rather than copied, so a worker holds about one chunk per upload however
+# big the file is. Oversize and non-PDF files are rejected, and requests
+# whose Content-Length is already too big are refused before the body is
+# read at all.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+UPLOAD_PATHS = ("/upload-test", "/upload-jobs")
+MULTIPART_OVERHEAD = 64 * 1024  # form fields and part headers around the file
+PDF_MAGIC = b"%PDF-"
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+class Upload:
+    """A received file: the parser's spooled file plus its size and SHA-256.
+
+    File-like (read/seek/tell/len), so it can be passed as a request body and
+    is streamed from the spool rather than loaded into memory.
+    """
+    def __init__(self, file, filename, size, sha256):
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self._file = file
+
+    def __len__(self):
+        return self.size
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def chunks(self):
+        """The contents from the start, UPLOAD_CHUNK_BYTES at a time"""
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._file.close()
+
+def declared_too_large(headers):
+    """True when a request's Content-Length alone rules out an acceptable upload"""
+    try:
+        return int(headers.get("content-length", 0)) > UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+    except ValueError:
+        return False
+
+async def receive(upload_file):
+    """Validate and hash a FastAPI UploadFile, then take over its spooled file as an Upload"""
+    if upload_file.size is not None and upload_file.size > UPLOAD_MAX_BYTES:
+        raise UploadRejected(f"File is larger than {UPLOAD_MAX_BYTES} bytes", 413)
+
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+    await upload_file.seek(0)
+    while True:
+        chunk = await upload_file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        if len(header) < len(PDF_MAGIC):
+            header += chunk[:len(PDF_MAGIC) - len(header)]
+            if not PDF_MAGIC.startswith(header):
+                raise UploadRejected("Only PDF documents are accepted", 415)
+        size += len(chunk)
+        if size > UPLOAD_MAX_BYTES:
+            raise UploadRejected(f"File is larger than {UPLOAD_MAX_BYTES} bytes", 413)
+        digest.update(chunk)
+    if header != PDF_MAGIC:
+        raise UploadRejected("Only PDF documents are accepted", 415)
+    await upload_file.seek(0)
+
+    # The form closes its files once the response is sent, but a queued job
+    # reads the file later: hand the form an empty placeholder to close instead
+    upload = Upload(upload_file.file, upload_file.filename, size, digest.hexdigest())
+    upload_file.file = io.BytesIO()
+    return upload